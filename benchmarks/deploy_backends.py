@@ -0,0 +1,69 @@
+"""Compare CPU-seconds and wall time per deploy for the CLI and SDK backends.
+
+Requires real Modal credentials in MODAL_TOKEN_ID / MODAL_TOKEN_SECRET; every
+iteration deploys a tiny app to the current workspace and stops it at the end.
+
+    python benchmarks/deploy_backends.py --deploys 5
+"""
+
+import argparse
+import asyncio
+import os
+import resource
+import time
+
+from modal_operator.deployer import DEPLOY_BACKENDS, ModalDeployer
+
+SOURCE = """
+import modal
+
+app = modal.App("{name}")
+
+
+@app.function()
+def ping():
+    return "pong"
+"""
+
+
+def _cpu_seconds() -> float:
+    total = 0.0
+    for who in (resource.RUSAGE_SELF, resource.RUSAGE_CHILDREN):
+        usage = resource.getrusage(who)
+        total += usage.ru_utime + usage.ru_stime
+    return total
+
+
+async def bench(backend: str, deploys: int) -> tuple[float, float]:
+    deployer = ModalDeployer(os.environ["MODAL_TOKEN_ID"], os.environ["MODAL_TOKEN_SECRET"], backend=backend)
+    name = f"modal-operator-bench-{backend}"
+    cpu_start = _cpu_seconds()
+    wall_start = time.monotonic()
+    try:
+        for _ in range(deploys):
+            result = await deployer.deploy_app(name, SOURCE.format(name=name))
+            if not result.success:
+                raise SystemExit(f"{backend} deploy failed: {result.error}")
+    finally:
+        # Worker processes only show up in RUSAGE_CHILDREN once they have exited.
+        deployer.close()
+    wall = time.monotonic() - wall_start
+    cpu = _cpu_seconds() - cpu_start
+    await deployer.stop_app(name)
+    return cpu / deploys, wall / deploys
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--deploys", type=int, default=5)
+    parser.add_argument("--backend", choices=DEPLOY_BACKENDS, action="append")
+    args = parser.parse_args()
+
+    print(f"{'backend':<8} {'cpu-s/deploy':>14} {'wall-s/deploy':>14}")
+    for backend in args.backend or DEPLOY_BACKENDS:
+        cpu, wall = await bench(backend, args.deploys)
+        print(f"{backend:<8} {cpu:>14.2f} {wall:>14.2f}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
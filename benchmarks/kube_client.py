@@ -0,0 +1,151 @@
+"""Measure Kubernetes API calls and latency per reconcile for the Service path.
+
+Runs ``ResourceManager.reconcile_services`` against the current kube context
+(a kind/minikube cluster is enough) for a throwaway app with three endpoints,
+first as a create and then as steady-state no-op reconciles, and reports API
+calls per reconcile plus p50/p99 latency. ``--baseline`` runs the previous
+release's Service path instead: a blocking ``CoreV1Api`` called from the
+event loop, creating each Service and falling back to read-and-replace on a
+conflict.
+
+    python benchmarks/kube_client.py --namespace default --reconciles 200 --concurrency 20
+    python benchmarks/kube_client.py --namespace default --reconciles 200 --concurrency 20 --baseline
+"""
+
+import argparse
+import asyncio
+import statistics
+import time
+
+from kubernetes import client, config
+from kubernetes.client.exceptions import ApiException
+
+from modal_operator.deploy_output import Endpoint
+from modal_operator.kube import KubeClient
+from modal_operator.metrics import kube_api_latency
+from modal_operator.resources import ResourceManager
+
+ENDPOINTS = [
+    Endpoint(function="serve", url="https://ws--bench-serve.modal.run"),
+    Endpoint(function="health", url="https://ws--bench-health.modal.run"),
+    Endpoint(function="Model.generate", url="https://ws--bench-model-generate.modal.run"),
+]
+
+
+def _api_calls() -> float:
+    return sum(
+        sample.value
+        for metric in kube_api_latency.collect()
+        for sample in metric.samples
+        if sample.name.endswith("_count")
+    )
+
+
+class BaselineManager:
+    """The previous release's Service handling: blocking calls, create then read-and-replace on 409."""
+
+    def __init__(self):
+        self.core_api = client.CoreV1Api()
+        self.calls = 0
+
+    def _call(self, method, *args, **kwargs):
+        self.calls += 1
+        return getattr(self.core_api, method)(*args, **kwargs)
+
+    async def reconcile_services(self, name, namespace, endpoints, service_port, owner_ref):
+        for i, endpoint in enumerate(endpoints):
+            svc_name = name if i == 0 else f"{name}-{i}"
+            hostname = endpoint.url.partition("://")[2]
+            service = client.V1Service(
+                metadata=client.V1ObjectMeta(
+                    name=svc_name,
+                    labels={"modal.internal.io/app": name},
+                    annotations={"modal.internal.io/url": endpoint.url},
+                    owner_references=[owner_ref],
+                ),
+                spec=client.V1ServiceSpec(
+                    type="ExternalName",
+                    external_name=hostname,
+                    ports=[client.V1ServicePort(port=service_port, target_port=443, protocol="TCP")],
+                ),
+            )
+            try:
+                self._call("create_namespaced_service", namespace, service)
+            except ApiException as e:
+                if e.status != 409:
+                    raise
+                current = self._call("read_namespaced_service", svc_name, namespace)
+                current.spec.external_name = hostname
+                self._call("replace_namespaced_service", svc_name, namespace, current)
+
+    async def delete_services(self, name, namespace):
+        for svc_name in [name] + [f"{name}-{i}" for i in range(1, len(ENDPOINTS))]:
+            try:
+                self._call("delete_namespaced_service", svc_name, namespace)
+            except ApiException as e:
+                if e.status != 404:
+                    raise
+
+
+def _percentile(values, q):
+    return statistics.quantiles(values, n=100, method="inclusive")[q - 1]
+
+
+async def bench(manager, namespace: str, reconciles: int, concurrency: int, api_calls=_api_calls):
+    owner = client.V1OwnerReference(api_version="v1", kind="ConfigMap", name="bench", uid="bench")
+    names = [f"kube-bench-{i}" for i in range(concurrency)]
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+
+    async def reconcile(name):
+        async with semaphore:
+            start = time.monotonic()
+            await manager.reconcile_services(name, namespace, ENDPOINTS, 80, owner)
+            latencies.append(time.monotonic() - start)
+
+    await asyncio.gather(*(reconcile(name) for name in names))
+    latencies.clear()
+    calls_before = api_calls()
+    wall_start = time.monotonic()
+    try:
+        await asyncio.gather(*(reconcile(names[i % concurrency]) for i in range(reconciles)))
+    finally:
+        wall = time.monotonic() - wall_start
+        await asyncio.gather(*(manager.delete_services(name, namespace) for name in names))
+    return (api_calls() - calls_before) / reconciles, latencies, wall
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--namespace", default="default")
+    parser.add_argument("--reconciles", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--qps", type=float, default=0, help="client-side QPS limit, 0 to disable")
+    parser.add_argument("--pool-size", type=int, default=10)
+    parser.add_argument("--baseline", action="store_true", help="measure the previous release's blocking client")
+    args = parser.parse_args()
+
+    config.load_kube_config()
+    if args.baseline:
+        manager = BaselineManager()
+        calls, latencies, wall = await bench(
+            manager, args.namespace, args.reconciles, args.concurrency, api_calls=lambda: manager.calls
+        )
+    else:
+        kube = KubeClient(qps=args.qps, burst=max(1, int(args.qps * 2)), pool_size=args.pool_size)
+        try:
+            calls, latencies, wall = await bench(
+                ResourceManager(kube), args.namespace, args.reconciles, args.concurrency
+            )
+        finally:
+            kube.close()
+
+    print(f"{'calls/reconcile':>16} {'p50 ms':>8} {'p99 ms':>8} {'reconciles/s':>13}")
+    print(
+        f"{calls:>16.1f} {_percentile(latencies, 50) * 1000:>8.1f} "
+        f"{_percentile(latencies, 99) * 1000:>8.1f} {args.reconciles / wall:>13.1f}"
+    )
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,130 @@
+"""Measure the time-to-first-token and inter-token latency modal-proxy adds to streamed responses.
+
+Streams server-sent events directly and through an in-process modal-proxy
+and reports p50/p99 TTFT and inter-token gaps for both, plus the difference.
+By default the upstream is a local server that emits ``--tokens`` events
+``--interval-ms`` apart; pass ``--url`` (and ``--body``) to stream from a
+real endpoint instead, e.g. the vLLM app in examples/gpu-llm.yaml, using
+a proxy auth token from PROXY_AUTH_TOKEN_ID / PROXY_AUTH_TOKEN_SECRET for both paths.
+
+    python benchmarks/proxy_streaming.py --requests 50 --tokens 200 --interval-ms 20
+    python benchmarks/proxy_streaming.py --url https://ws--llm-devstral-small-serve.modal.run/v1/completions \\
+        --body '{"model": "mistralai/Devstral-Small-2505", "prompt": "Hi", "max_tokens": 128, "stream": true}'
+"""
+
+import argparse
+import asyncio
+import os
+import statistics
+import time
+
+import aiohttp
+from aiohttp import web
+
+from modal_operator.proxy.cache import RouteTable
+from modal_operator.proxy.server import ModalProxy
+
+
+def _percentile(values, q):
+    return statistics.quantiles(values, n=100, method="inclusive")[q - 1]
+
+
+async def _local_upstream(tokens: int, interval: float) -> web.AppRunner:
+    async def stream(request):
+        response = web.StreamResponse(headers={"Content-Type": "text/event-stream"})
+        await response.prepare(request)
+        for i in range(tokens):
+            await asyncio.sleep(interval)
+            await response.write(f"data: token-{i}\n\n".encode())
+        await response.write(b"data: [DONE]\n\n")
+        await response.write_eof()
+        return response
+
+    app = web.Application()
+    app.router.add_route("*", "/{path:.*}", stream)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    await web.TCPSite(runner, "127.0.0.1", 0).start()
+    return runner
+
+
+async def _stream(session: aiohttp.ClientSession, url: str, headers: dict, body: str):
+    """TTFT and the gaps between events for one streamed request."""
+    start = time.monotonic()
+    method = "POST" if body else "GET"
+    async with session.request(method, url, headers=headers, data=body or None) as response:
+        response.raise_for_status()
+        arrivals = []
+        while not response.content.at_eof():
+            event = await response.content.readuntil(b"\n\n")
+            if event.strip():
+                arrivals.append(time.monotonic())
+    return arrivals[0] - start, [b - a for a, b in zip(arrivals, arrivals[1:])]
+
+
+async def bench(url: str, headers: dict, body: str, requests: int):
+    ttfts, gaps = [], []
+    async with aiohttp.ClientSession() as session:
+        await _stream(session, url, headers, body)
+        for _ in range(requests):
+            ttft, request_gaps = await _stream(session, url, headers, body)
+            ttfts.append(ttft)
+            gaps.extend(request_gaps)
+    return ttfts, gaps
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--url", help="streaming endpoint to use instead of the local simulated one")
+    parser.add_argument("--body", default="", help="JSON request body; sends a POST when set")
+    parser.add_argument("--requests", type=int, default=50)
+    parser.add_argument("--tokens", type=int, default=200)
+    parser.add_argument("--interval-ms", type=float, default=20)
+    args = parser.parse_args()
+
+    token_id, token_secret = os.environ.get("PROXY_AUTH_TOKEN_ID", ""), os.environ.get("PROXY_AUTH_TOKEN_SECRET", "")
+    headers = {"Content-Type": "application/json"} if args.body else {}
+    upstream = None
+    url = args.url
+    if url is None:
+        upstream = await _local_upstream(args.tokens, args.interval_ms / 1000)
+        url = f"http://127.0.0.1:{upstream.addresses[0][1]}/v1/completions"
+    origin, _, path = url.partition("://")[2].partition("/")
+    scheme = url.partition("://")[0]
+
+    routes = RouteTable()
+    routes.replace([{"metadata": {"name": "bench", "namespace": "bench"}, "status": {"url": f"{scheme}://{origin}"}}])
+    proxy = ModalProxy(routes, token_id, token_secret)
+    await proxy.start()
+    proxy_runner = web.AppRunner(proxy.app(), access_log=None)
+    await proxy_runner.setup()
+    await web.TCPSite(proxy_runner, "127.0.0.1", 0).start()
+    proxied_url = f"http://127.0.0.1:{proxy_runner.addresses[0][1]}/{path}"
+
+    try:
+        direct = await bench(
+            url, {**headers, "Modal-Key": token_id, "Modal-Secret": token_secret}, args.body, args.requests
+        )
+        proxied = await bench(proxied_url, {**headers, "Host": "bench.bench"}, args.body, args.requests)
+    finally:
+        await proxy_runner.cleanup()
+        await proxy.close()
+        if upstream is not None:
+            await upstream.cleanup()
+
+    print(f"{'path':>8} {'ttft p50':>9} {'ttft p99':>9} {'itl p50':>8} {'itl p99':>8}  (ms)")
+    for name, (ttfts, gaps) in (("direct", direct), ("proxied", proxied)):
+        print(
+            f"{name:>8} {_percentile(ttfts, 50) * 1000:>9.2f} {_percentile(ttfts, 99) * 1000:>9.2f} "
+            f"{_percentile(gaps, 50) * 1000:>8.2f} {_percentile(gaps, 99) * 1000:>8.2f}"
+        )
+    print(
+        f"{'added':>8} {(_percentile(proxied[0], 50) - _percentile(direct[0], 50)) * 1000:>9.2f} "
+        f"{(_percentile(proxied[0], 99) - _percentile(direct[0], 99)) * 1000:>9.2f} "
+        f"{(_percentile(proxied[1], 50) - _percentile(direct[1], 50)) * 1000:>8.2f} "
+        f"{(_percentile(proxied[1], 99) - _percentile(direct[1], 99)) * 1000:>8.2f}"
+    )
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -48,6 +48,14 @@ app.kubernetes.io/name: {{ include "modal-operator.name" . }}
 app.kubernetes.io/instance: {{ .Release.Name }}
 {{- end }}
 
+{{/*
+Selector labels for modal-proxy, distinct from the operator's so neither selects the other's pods
+*/}}
+{{- define "modal-operator.proxySelectorLabels" -}}
+app.kubernetes.io/name: {{ include "modal-operator.name" . }}-proxy
+app.kubernetes.io/instance: {{ .Release.Name }}
+{{- end }}
+
 {{/*
 Create the name of the service account to use
 */}}
@@ -58,3 +66,14 @@ Create the name of the service account to use
 {{- default "default" .Values.serviceAccount.name }}
 {{- end }}
 {{- end }}
+
+{{/*
+Create the name of the service account modal-proxy uses
+*/}}
+{{- define "modal-operator.proxyServiceAccountName" -}}
+{{- if .Values.proxy.serviceAccount.create }}
+{{- default (printf "%s-proxy" (include "modal-operator.fullname" .)) .Values.proxy.serviceAccount.name }}
+{{- else }}
+{{- default "default" .Values.proxy.serviceAccount.name }}
+{{- end }}
+{{- end }}
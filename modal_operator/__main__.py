@@ -3,7 +3,9 @@ import sys
 
 import structlog
 
-import modal_operator.operator  # noqa: F401
+from modal_operator.config import OperatorConfig
+
+logger = structlog.get_logger(__name__)
 
 
 def configure_logging():
@@ -27,11 +29,39 @@ def configure_logging():
     logging.basicConfig(format="%(message)s", stream=sys.stdout, level=logging.INFO)
 
 
+def watch_namespaces(operator_config: OperatorConfig) -> list[str]:
+    """Namespaces from WATCH_NAMESPACES plus those matching WATCH_NAMESPACE_SELECTOR.
+
+    kopf cannot select namespaces by label, so the selector is resolved once
+    at startup; namespaces labelled later are picked up on the next restart.
+    """
+    namespaces = list(operator_config.watch_namespaces)
+    if operator_config.watch_namespace_selector:
+        from kubernetes import client
+
+        from modal_operator.kube import load_config
+
+        load_config()
+        listed = client.CoreV1Api().list_namespace(label_selector=operator_config.watch_namespace_selector)
+        namespaces += [ns.metadata.name for ns in listed.items if ns.metadata.name not in namespaces]
+        if not namespaces:
+            raise SystemExit(f"No namespaces match WATCH_NAMESPACE_SELECTOR={operator_config.watch_namespace_selector}")
+    return namespaces
+
+
 def main():
     import kopf
 
+    import modal_operator.operator
+
     configure_logging()
-    kopf.run(clusterwide=True)
+    namespaces = watch_namespaces(OperatorConfig.from_env())
+    if not namespaces:
+        kopf.run(clusterwide=True)
+        return
+    logger.info("watching namespaces", namespaces=namespaces)
+    modal_operator.operator.watched_namespaces = namespaces
+    kopf.run(namespaces=namespaces)
 
 
 if __name__ == "__main__":
@@ -6,12 +6,116 @@ from dataclasses import dataclass, field
 class OperatorConfig:
     modal_token_id: str = ""
     modal_token_secret: str = ""
+    deploy_hash_key: str = ""
     watch_namespaces: list[str] = field(default_factory=list)
+    watch_namespace_selector: str = ""
+    deploy_timeout: float = 300.0
+    stop_timeout: float = 60.0
+    max_concurrent_deploys: int = 8
+    namespace_weights: dict[str, float] = field(default_factory=dict)
+    deploy_backend: str = "cli"
+    deploy_workers: int = 4
+    deploy_worker_max_jobs: int = 50
+    deploy_worker_max_rss_mb: int = 1024
+    inventory_ttl: float = 30.0
+    resume_mode: str = "verify"
+    resume_rate: float = 1.0
+    resume_jitter: float = 5.0
+    env_auto_redeploy: bool = True
+    env_redeploy_debounce: float = 10.0
+    kube_api_qps: float = 20.0
+    kube_api_burst: int = 40
+    kube_api_pool_size: int = 10
+    kube_api_verb_qps: dict[str, float] = field(default_factory=dict)
+    kube_api_max_retries: int = 5
+    kube_api_retry_ratio: float = 0.2
+    status_patch_window: float = 0.2
+    pod_name: str = ""
+    pod_namespace: str = "default"
+    sharding_enabled: bool = False
+    shard_lease_duration: float = 15.0
+    leader_election_enabled: bool = False
+    leader_lease_duration: float = 15.0
+    proxy_service: str = ""
 
     @classmethod
     def from_env(cls) -> "OperatorConfig":
         return cls(
             modal_token_id=os.environ.get("MODAL_TOKEN_ID", ""),
             modal_token_secret=os.environ.get("MODAL_TOKEN_SECRET", ""),
+            # Keys the deploy hash; falls back to the Modal token secret, which is never published either
+            deploy_hash_key=os.getenv("DEPLOY_HASH_KEY") or os.environ.get("MODAL_TOKEN_SECRET", ""),
             watch_namespaces=[ns.strip() for ns in os.getenv("WATCH_NAMESPACES", "").split(",") if ns.strip()],
+            watch_namespace_selector=os.getenv("WATCH_NAMESPACE_SELECTOR", ""),
+            deploy_timeout=float(os.getenv("DEPLOY_TIMEOUT_SECONDS", "300")),
+            stop_timeout=float(os.getenv("STOP_TIMEOUT_SECONDS", "60")),
+            max_concurrent_deploys=int(os.getenv("MAX_CONCURRENT_DEPLOYS", "8")),
+            namespace_weights=_parse_weights(os.getenv("DEPLOY_NAMESPACE_WEIGHTS", "")),
+            deploy_backend=os.getenv("DEPLOY_BACKEND", "cli"),
+            deploy_workers=int(os.getenv("DEPLOY_WORKERS", "4")),
+            deploy_worker_max_jobs=int(os.getenv("DEPLOY_WORKER_MAX_JOBS", "50")),
+            deploy_worker_max_rss_mb=int(os.getenv("DEPLOY_WORKER_MAX_RSS_MB", "1024")),
+            inventory_ttl=float(os.getenv("INVENTORY_TTL_SECONDS", "30")),
+            resume_mode=os.getenv("RESUME_MODE", "verify"),
+            resume_rate=float(os.getenv("RESUME_RATE", "1")),
+            resume_jitter=float(os.getenv("RESUME_JITTER_SECONDS", "5")),
+            env_auto_redeploy=os.getenv("ENV_AUTO_REDEPLOY", "true").lower() in ("1", "true", "yes"),
+            env_redeploy_debounce=float(os.getenv("ENV_REDEPLOY_DEBOUNCE_SECONDS", "10")),
+            kube_api_qps=float(os.getenv("KUBE_API_QPS", "20")),
+            kube_api_burst=int(os.getenv("KUBE_API_BURST", "40")),
+            kube_api_pool_size=int(os.getenv("KUBE_API_POOL_SIZE", "10")),
+            kube_api_verb_qps=_parse_weights(os.getenv("KUBE_API_VERB_QPS", "")),
+            kube_api_max_retries=int(os.getenv("KUBE_API_MAX_RETRIES", "5")),
+            kube_api_retry_ratio=float(os.getenv("KUBE_API_RETRY_RATIO", "0.2")),
+            status_patch_window=float(os.getenv("STATUS_PATCH_WINDOW_SECONDS", "0.2")),
+            pod_name=os.getenv("POD_NAME", ""),
+            pod_namespace=os.getenv("POD_NAMESPACE", "default"),
+            sharding_enabled=os.getenv("SHARDING_ENABLED", "false").lower() in ("1", "true", "yes"),
+            shard_lease_duration=float(os.getenv("SHARD_LEASE_SECONDS", "15")),
+            leader_election_enabled=os.getenv("LEADER_ELECTION_ENABLED", "false").lower() in ("1", "true", "yes"),
+            leader_lease_duration=float(os.getenv("LEADER_LEASE_SECONDS", "15")),
+            proxy_service=os.getenv("PROXY_SERVICE", ""),
         )
+
+
+@dataclass
+class ProxyConfig:
+    auth_token_id: str = ""
+    auth_token_secret: str = ""
+    auth_hosts: list[str] = field(default_factory=lambda: ["*.modal.run"])
+    watch_namespaces: list[str] = field(default_factory=list)
+    port: int = 8000
+    cluster_domain: str = "cluster.local"
+    connect_timeout: float = 10.0
+    upstream_pool_size: int = 200
+    upstream_pool_per_host: int = 50
+    upstream_idle_timeout: float = 60.0
+    cache_max_bytes: int = 64 * 1024 * 1024
+    cache_max_entry_bytes: int = 1024 * 1024
+
+    @classmethod
+    def from_env(cls) -> "ProxyConfig":
+        return cls(
+            auth_token_id=os.environ.get("PROXY_AUTH_TOKEN_ID", ""),
+            auth_token_secret=os.environ.get("PROXY_AUTH_TOKEN_SECRET", ""),
+            auth_hosts=[h.strip() for h in os.getenv("PROXY_AUTH_HOSTS", "*.modal.run").split(",") if h.strip()],
+            watch_namespaces=[ns.strip() for ns in os.getenv("WATCH_NAMESPACES", "").split(",") if ns.strip()],
+            port=int(os.getenv("PROXY_PORT", "8000")),
+            cluster_domain=os.getenv("CLUSTER_DOMAIN", "cluster.local"),
+            connect_timeout=float(os.getenv("PROXY_CONNECT_TIMEOUT_SECONDS", "10")),
+            upstream_pool_size=int(os.getenv("PROXY_UPSTREAM_POOL_SIZE", "200")),
+            upstream_pool_per_host=int(os.getenv("PROXY_UPSTREAM_POOL_PER_HOST", "50")),
+            upstream_idle_timeout=float(os.getenv("PROXY_UPSTREAM_IDLE_SECONDS", "60")),
+            cache_max_bytes=int(os.getenv("PROXY_CACHE_MAX_BYTES", str(64 * 1024 * 1024))),
+            cache_max_entry_bytes=int(os.getenv("PROXY_CACHE_MAX_ENTRY_BYTES", str(1024 * 1024))),
+        )
+
+
+def _parse_weights(value: str) -> dict[str, float]:
+    weights = {}
+    for item in value.split(","):
+        if "=" not in item:
+            continue
+        ns, weight = item.split("=", 1)
+        weights[ns.strip()] = float(weight)
+    return weights
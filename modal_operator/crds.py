@@ -14,12 +14,22 @@ class ModalAppSpec(BaseModel):
     envFrom: List[EnvFromSource] = Field(default_factory=list)
     env: Dict[str, str] = Field(default_factory=dict)
     servicePort: int = Field(default=80)
+    proxyCache: bool = Field(default=False, description="Cache and coalesce GET responses in modal-proxy")
+
+
+class EndpointStatus(BaseModel):
+    function: str
+    url: str
+    service: Optional[str] = None
+    services: List[str] = Field(default_factory=list)
 
 
 class ModalAppStatus(BaseModel):
     phase: str = Field(default="Pending")
     url: Optional[str] = None
+    endpoints: List[EndpointStatus] = Field(default_factory=list)
     appId: Optional[str] = None
+    deployHash: Optional[str] = None
     lastDeployed: Optional[str] = None
     message: Optional[str] = None
 
@@ -67,6 +77,7 @@ MODAL_APP_CRD = {
                                         "additionalProperties": {"type": "string"},
                                     },
                                     "servicePort": {"type": "integer", "default": 80},
+                                    "proxyCache": {"type": "boolean", "default": False},
                                 },
                             },
                             "status": {
@@ -74,7 +85,20 @@ MODAL_APP_CRD = {
                                 "properties": {
                                     "phase": {"type": "string"},
                                     "url": {"type": "string"},
+                                    "endpoints": {
+                                        "type": "array",
+                                        "items": {
+                                            "type": "object",
+                                            "properties": {
+                                                "function": {"type": "string"},
+                                                "url": {"type": "string"},
+                                                "service": {"type": "string"},
+                                                "services": {"type": "array", "items": {"type": "string"}},
+                                            },
+                                        },
+                                    },
                                     "appId": {"type": "string"},
+                                    "deployHash": {"type": "string"},
                                     "lastDeployed": {"type": "string"},
                                     "message": {"type": "string"},
                                 },
@@ -0,0 +1,86 @@
+import re
+from dataclasses import dataclass, field
+from typing import List, Optional
+
+_ANSI = re.compile(r"\x1b\[[0-9;?]*[A-Za-z]")
+_CREATED = re.compile(r"Created (?:web )?(?:function|Function|Server) (?P<rest>.+)$")
+_URL = re.compile(r"https?://[^\s\]\)]+")
+# Only the app ID modal prints itself: at the end of the run/deployment page URL or on an "App ID" line.
+# Anything else that looks like one may come from user code or an image build.
+_APP_ID = re.compile(
+    r"^\W*(?:Initialized\.\s*)?(?:View (?:run at|Deployment:)\s*https://modal\.com/\S*/|App ID:?\s*)"
+    r"(?P<id>ap-[A-Za-z0-9]+)\b"
+)
+_APP_PAGE = re.compile(r"View Deployment:\s*(?P<url>https?://\S+)")
+
+
+@dataclass
+class Endpoint:
+    function: str
+    url: str
+
+
+@dataclass
+class ParsedDeploy:
+    app_id: Optional[str] = None
+    app_page_url: Optional[str] = None
+    functions: List[str] = field(default_factory=list)
+    endpoints: List[Endpoint] = field(default_factory=list)
+
+    @property
+    def ok(self) -> bool:
+        return bool(self.functions)
+
+
+def parse_deploy_output(output: str) -> ParsedDeploy:
+    """Extract functions, web endpoints and the app ID from ``modal deploy`` output.
+
+    Handles both the ``Created web function f => url`` form and the tree form
+    where the URL sits on the detail line under its function, including
+    ``method -> url`` lines for class-based apps. Custom domain lines are
+    ignored; the ``*.modal.run`` URL is the one the operator routes to.
+    """
+    parsed = ParsedDeploy()
+    current: Optional[str] = None
+
+    for raw in output.splitlines():
+        line = _ANSI.sub("", raw).strip()
+        if not line:
+            continue
+
+        if parsed.app_id is None:
+            app_id = _APP_ID.search(line)
+            if app_id:
+                parsed.app_id = app_id.group("id")
+
+        page = _APP_PAGE.search(line)
+        if page:
+            parsed.app_page_url = page.group("url")
+            continue
+
+        created = _CREATED.search(line)
+        if created:
+            rest = created.group("rest")
+            name, _, url_part = rest.partition(" => ")
+            current = name.strip().removesuffix(".")
+            parsed.functions.append(current)
+            url = _URL.search(url_part)
+            if url:
+                parsed.endpoints.append(Endpoint(function=current, url=url.group(0)))
+            continue
+
+        url = _URL.search(line)
+        if url is None or current is None or "Custom domain" in line:
+            continue
+        prefix = line[: url.start()]
+        if "->" in prefix:
+            method = prefix.split("->", 1)[0].strip(" │├└─")
+            if not method:
+                continue
+            function = f"{current.removesuffix('.*')}.{method}"
+        else:
+            function = current
+        if not any(e.function == function for e in parsed.endpoints):
+            parsed.endpoints.append(Endpoint(function=function, url=url.group(0)))
+
+    return parsed
@@ -1,12 +1,30 @@
+import asyncio
+import codecs
+import hashlib
+import hmac
+import importlib.util
+import json
 import logging
 import os
-import subprocess
+import re
+import signal
+import sys
 import tempfile
-from dataclasses import dataclass
-from typing import Dict, Optional
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Sequence
+
+from modal_operator.deploy_output import Endpoint, ParsedDeploy, parse_deploy_output
+from modal_operator.inventory import DeploymentInventory
+from modal_operator.workers import WorkerPool
 
 logger = logging.getLogger(__name__)
 
+DEFAULT_DEPLOY_TIMEOUT = 300.0
+DEFAULT_STOP_TIMEOUT = 60.0
+DEFAULT_PROFILE_TIMEOUT = 30.0
+
+DEPLOY_BACKENDS = ("cli", "sdk")
+
 
 @dataclass
 class DeployResult:
@@ -14,110 +32,359 @@ class DeployResult:
     url: Optional[str] = None
     app_id: Optional[str] = None
     error: Optional[str] = None
+    endpoints: List[Endpoint] = field(default_factory=list)
+    functions: List[str] = field(default_factory=list)
+
+
+@dataclass
+class CommandResult:
+    returncode: int
+    stdout: str
+    stderr: str
+
+
+class CommandTimeout(Exception):
+    def __init__(self, args: Sequence[str], timeout: float):
+        super().__init__(f"{' '.join(args)} timed out after {timeout:g}s")
+        self.timeout = timeout
+
+
+async def run_command(
+    args: Sequence[str],
+    env: Optional[Dict[str, str]] = None,
+    timeout: Optional[float] = None,
+    log_name: Optional[str] = None,
+) -> CommandResult:
+    """Run a command without blocking the event loop.
+
+    The child is started in its own session so that a timeout or a cancelled
+    handler kills the whole process group, including anything it spawned.
+    """
+    proc = await asyncio.create_subprocess_exec(
+        *args,
+        env=env,
+        stdin=asyncio.subprocess.DEVNULL,
+        stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.PIPE,
+        start_new_session=True,
+    )
+    stdout: List[str] = []
+    stderr: List[str] = []
+    prefix = log_name or args[0]
+
+    try:
+        await asyncio.wait_for(
+            asyncio.gather(
+                _stream(proc.stdout, stdout, f"{prefix} stdout"),
+                _stream(proc.stderr, stderr, f"{prefix} stderr"),
+                proc.wait(),
+            ),
+            timeout=timeout,
+        )
+    except asyncio.TimeoutError:
+        await _kill(proc)
+        raise CommandTimeout(args, timeout) from None
+    except BaseException:
+        await _kill(proc)
+        raise
+
+    return CommandResult(returncode=proc.returncode, stdout="".join(stdout), stderr="".join(stderr))
+
+
+async def _stream(reader: asyncio.StreamReader, sink: List[str], label: str):
+    """Collect a child's output and log it line by line.
+
+    Output is read in fixed-size chunks rather than lines, so a line longer
+    than the reader's buffer limit (e.g. ``\\r`` progress bars in image build
+    logs) cannot fail the command.
+    """
+    decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+    pending = ""
+    while True:
+        chunk = await reader.read(64 * 1024)
+        text = decoder.decode(chunk, final=not chunk)
+        sink.append(text)
+        *lines, pending = (pending + text).split("\n")
+        for line in lines:
+            logger.debug(f"{label}: {line.rstrip()}")
+        if not chunk:
+            break
+    if pending:
+        logger.debug(f"{label}: {pending.rstrip()}")
+
+
+async def _kill(proc: asyncio.subprocess.Process):
+    if proc.returncode is not None:
+        return
+    try:
+        os.killpg(proc.pid, signal.SIGKILL)
+    except ProcessLookupError:
+        pass
+    try:
+        await asyncio.shield(proc.wait())
+    except asyncio.CancelledError:
+        pass
+
+
+def compute_deploy_hash(name: str, source: str, env_vars: Optional[Dict[str, str]] = None, key: str = "") -> str:
+    """Content hash of everything that goes into a deploy.
+
+    Two calls with equal hashes would deploy byte-identical apps, so the second
+    deploy can be skipped. The hash ends up in ModalApp status and annotations
+    and covers secret env values, so it is an HMAC under ``key``: without the
+    key, low-entropy secrets cannot be guessed offline from it.
+    """
+    payload = json.dumps({"appName": name, "source": source, "env": env_vars or {}}, sort_keys=True)
+    return hmac.new(key.encode(), payload.encode(), hashlib.sha256).hexdigest()
+
+
+def _warm_worker():
+    import modal
+
+    try:
+        modal.Client.from_env()
+    except Exception as e:
+        logger.warning(f"Deploy worker could not authenticate with Modal: {e}")
+
+
+def sdk_deploy(name: str, source: str, env_vars: Dict[str, str]) -> ParsedDeploy:
+    """Load ``source`` as a module and deploy its App with the modal SDK.
+
+    Runs inside a warm worker process that has already imported ``modal``.
+    ``env_vars`` are visible to the source while it is imported and deployed,
+    as they would be for ``modal deploy``.
+    """
+    import modal
+
+    module_name = "modal_app_" + re.sub(r"\W", "_", name)
+    saved_env = os.environ.copy()
+    with tempfile.TemporaryDirectory(prefix="modal-") as tmp_dir:
+        path = os.path.join(tmp_dir, f"{module_name}.py")
+        with open(path, "w") as f:
+            f.write(source)
+
+        os.environ.update(env_vars)
+        sys.path.insert(0, tmp_dir)
+        try:
+            spec = importlib.util.spec_from_file_location(module_name, path)
+            module = importlib.util.module_from_spec(spec)
+            sys.modules[module_name] = module
+            spec.loader.exec_module(module)
+
+            app = _find_app(module, modal.App)
+            app.deploy(name=app.name or name)
+            parsed = ParsedDeploy(app_id=app.app_id)
+            for tag, function in app.registered_functions.items():
+                parsed.functions.append(tag)
+                url = function.get_web_url()
+                if url:
+                    parsed.endpoints.append(Endpoint(function=tag, url=url))
+            return parsed
+        finally:
+            sys.modules.pop(module_name, None)
+            sys.path.remove(tmp_dir)
+            os.environ.clear()
+            os.environ.update(saved_env)
+
+
+def _find_app(module, app_type):
+    app = getattr(module, "app", None)
+    if isinstance(app, app_type):
+        return app
+    apps = [value for value in vars(module).values() if isinstance(value, app_type)]
+    if len(apps) != 1:
+        raise ValueError(f"Expected exactly one modal.App in source, found {len(apps)}")
+    return apps[0]
 
 
 class ModalDeployer:
-    def __init__(self, modal_token_id: str, modal_token_secret: str):
+    def __init__(
+        self,
+        modal_token_id: str,
+        modal_token_secret: str,
+        deploy_timeout: float = DEFAULT_DEPLOY_TIMEOUT,
+        stop_timeout: float = DEFAULT_STOP_TIMEOUT,
+        backend: str = "cli",
+        workers: int = 4,
+        worker_max_jobs: int = 50,
+        worker_max_rss_mb: Optional[int] = None,
+        inventory_ttl: float = 30.0,
+    ):
+        if backend not in DEPLOY_BACKENDS:
+            raise ValueError(f"Unknown deploy backend {backend!r}, expected one of {DEPLOY_BACKENDS}")
         self.modal_token_id = modal_token_id
         self.modal_token_secret = modal_token_secret
+        self.deploy_timeout = deploy_timeout
+        self.stop_timeout = stop_timeout
+        self.backend = backend
+        self.workers = workers
+        self.worker_max_jobs = worker_max_jobs
+        self.worker_max_rss_mb = worker_max_rss_mb
+        self._pool: Optional[WorkerPool] = None
+        self.inventory = DeploymentInventory(self.list_deployed_apps, ttl=inventory_ttl)
+        self._workspaces: Dict[str, str] = {}
+        self._workspace_lookups: Dict[str, asyncio.Task] = {}
+
+    def _base_env(self) -> Dict[str, str]:
+        env = os.environ.copy()
+        env["MODAL_TOKEN_ID"] = self.modal_token_id
+        env["MODAL_TOKEN_SECRET"] = self.modal_token_secret
+        return env
 
     async def deploy_app(
         self,
         name: str,
         source: str,
         env_vars: Optional[Dict[str, str]] = None,
+        timeout: Optional[float] = None,
     ) -> DeployResult:
+        timeout = timeout or self.deploy_timeout
+        logger.info(f"Deploying Modal app {name} via {self.backend}")
+        try:
+            if self.backend == "sdk":
+                result = await self._deploy_sdk(name, source, env_vars or {}, timeout)
+            else:
+                result = await self._deploy_cli(name, source, env_vars or {}, timeout)
+        except (CommandTimeout, asyncio.TimeoutError):
+            return DeployResult(success=False, error=f"modal deploy timed out after {timeout:g}s")
+        except Exception as e:
+            logger.error(f"Failed to deploy {name}: {e}")
+            return DeployResult(success=False, error=str(e))
+
+        if result.success:
+            logger.info(f"Deployed {name}: url={result.url} app_id={result.app_id}")
+        return result
+
+    async def _deploy_cli(self, name: str, source: str, env_vars: Dict[str, str], timeout: float) -> DeployResult:
         temp_file = None
         try:
             with tempfile.NamedTemporaryFile(mode="w", suffix=".py", prefix=f"modal-{name}-", delete=False) as f:
                 f.write(source)
                 temp_file = f.name
 
-            env = os.environ.copy()
-            env["MODAL_TOKEN_ID"] = self.modal_token_id
-            env["MODAL_TOKEN_SECRET"] = self.modal_token_secret
-            if env_vars:
-                env.update(env_vars)
-
-            logger.info(f"Deploying Modal app {name}")
-            result = subprocess.run(
-                ["modal", "deploy", temp_file],
-                env=env,
-                capture_output=True,
-                text=True,
-                timeout=300,
-            )
+            env = self._base_env()
+            env.update(env_vars)
+            # Keep rich from wrapping long endpoint URLs in the output we parse.
+            env.setdefault("COLUMNS", "1000")
+
+            result = await run_command(["modal", "deploy", temp_file], env=env, timeout=timeout, log_name=name)
 
             if result.returncode != 0:
                 logger.error(f"modal deploy failed for {name}: {result.stderr}")
                 return DeployResult(success=False, error=result.stderr)
 
-            url, app_id = await self._query_deployment(name, env)
-
-            logger.info(f"Deployed {name}: url={url} app_id={app_id}")
-            return DeployResult(success=True, url=url, app_id=app_id)
-
-        except subprocess.TimeoutExpired:
-            return DeployResult(success=False, error="modal deploy timed out after 300s")
-        except Exception as e:
-            logger.error(f"Failed to deploy {name}: {e}")
-            return DeployResult(success=False, error=str(e))
+            return await self._deploy_result(name, parse_deploy_output(result.stdout), env)
         finally:
             if temp_file and os.path.exists(temp_file):
                 os.unlink(temp_file)
 
+    async def _deploy_sdk(self, name: str, source: str, env_vars: Dict[str, str], timeout: float) -> DeployResult:
+        env = {"MODAL_TOKEN_ID": self.modal_token_id, "MODAL_TOKEN_SECRET": self.modal_token_secret, **env_vars}
+        deployed = await self._get_pool().run(sdk_deploy, name, source, env, timeout=timeout)
+
+        return await self._deploy_result(name, deployed, {**self._base_env(), **env_vars})
+
+    async def _deploy_result(self, name: str, parsed: ParsedDeploy, env: dict) -> DeployResult:
+        if not parsed.ok:
+            logger.warning(f"Could not parse deploy output for {name}, querying the deployment inventory")
+            if name not in self.inventory:
+                self.inventory.invalidate()
+            url, app_id = await self._query_deployment(name, env)
+            endpoints = [Endpoint(function="serve", url=url)] if url else []
+            return DeployResult(success=True, url=url, app_id=app_id, endpoints=endpoints)
+
+        if parsed.app_id:
+            self.inventory.record(name, parsed.app_id)
+        return DeployResult(
+            success=True,
+            url=parsed.endpoints[0].url if parsed.endpoints else None,
+            app_id=parsed.app_id or self.inventory.peek(name),
+            endpoints=parsed.endpoints,
+            functions=parsed.functions,
+        )
+
+    def _get_pool(self) -> WorkerPool:
+        if self._pool is None:
+            self._pool = WorkerPool(
+                size=self.workers,
+                max_jobs=self.worker_max_jobs,
+                max_rss_bytes=self.worker_max_rss_mb * 1024 * 1024 if self.worker_max_rss_mb else None,
+                env={"MODAL_TOKEN_ID": self.modal_token_id, "MODAL_TOKEN_SECRET": self.modal_token_secret},
+                initializer=_warm_worker,
+            )
+        return self._pool
+
+    def start(self):
+        """Pre-fork the SDK worker pool so the first deploy does not pay for it."""
+        if self.backend == "sdk":
+            self._get_pool().start()
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.close()
+            self._pool = None
+
     async def _query_deployment(self, name: str, env: dict) -> tuple[Optional[str], Optional[str]]:
-        url = None
         app_id = None
         try:
-            from modal.experimental import list_deployed_apps
-
-            deployed = await list_deployed_apps.aio()
-            for app_info in deployed:
-                if app_info.name == name:
-                    url = getattr(app_info, "web_url", None)
-                    app_id = getattr(app_info, "app_id", None)
-                    break
+            app_id = await self.inventory.get(name)
         except Exception as e:
             logger.warning(f"Failed to query deployment info for {name}: {e}")
 
-        if not url:
-            workspace = env.get("MODAL_WORKSPACE") or self._get_workspace(env)
-            if workspace:
-                url = f"https://{workspace}--{name}-serve.modal.run"
+        url = None
+        workspace = env.get("MODAL_WORKSPACE") or await self.workspace()
+        if workspace:
+            url = f"https://{workspace}--{name}-serve.modal.run"
 
         return url, app_id
 
-    def _get_workspace(self, env: dict) -> Optional[str]:
+    async def list_deployed_apps(self) -> Dict[str, str]:
+        from modal.experimental import list_deployed_apps
+
+        deployed = await list_deployed_apps.aio()
+        return {app_info.name: app_info.app_id for app_info in deployed}
+
+    def _credentials_key(self) -> str:
+        return hashlib.sha256(f"{self.modal_token_id}:{self.modal_token_secret}".encode()).hexdigest()
+
+    async def workspace(self) -> Optional[str]:
+        """Workspace for the current credentials, resolved once and then cached."""
+        key = self._credentials_key()
+        if key in self._workspaces:
+            return self._workspaces[key]
+
+        lookup = self._workspace_lookups.get(key)
+        if lookup is None:
+            lookup = asyncio.create_task(self._get_workspace(self._base_env()))
+            self._workspace_lookups[key] = lookup
         try:
-            result = subprocess.run(
-                ["modal", "profile", "current"],
-                env=env,
-                capture_output=True,
-                text=True,
-                timeout=30,
-            )
+            workspace = await asyncio.shield(lookup)
+        finally:
+            if lookup.done():
+                self._workspace_lookups.pop(key, None)
+
+        if workspace:
+            self._workspaces[key] = workspace
+        return workspace
+
+    async def _get_workspace(self, env: dict) -> Optional[str]:
+        try:
+            result = await run_command(["modal", "profile", "current"], env=env, timeout=DEFAULT_PROFILE_TIMEOUT)
             if result.returncode == 0:
                 return result.stdout.strip()
         except Exception as e:
             logger.warning(f"Failed to get workspace: {e}")
         return None
 
-    async def stop_app(self, app_name: str) -> bool:
+    async def stop_app(self, app_name: str, timeout: Optional[float] = None) -> bool:
+        timeout = timeout or self.stop_timeout
         try:
-            env = os.environ.copy()
-            env["MODAL_TOKEN_ID"] = self.modal_token_id
-            env["MODAL_TOKEN_SECRET"] = self.modal_token_secret
-
-            result = subprocess.run(
-                ["modal", "app", "stop", app_name],
-                env=env,
-                capture_output=True,
-                text=True,
-                timeout=60,
+            result = await run_command(
+                ["modal", "app", "stop", app_name], env=self._base_env(), timeout=timeout, log_name=app_name
             )
 
             if result.returncode == 0:
+                self.inventory.discard(app_name)
                 logger.info(f"Stopped Modal app {app_name}")
                 return True
 
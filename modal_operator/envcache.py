@@ -0,0 +1,168 @@
+import base64
+import json
+from typing import Any, Awaitable, Callable, Dict, Iterable, Optional, Sequence, Set, Tuple
+
+import structlog
+from kubernetes import client
+
+from modal_operator.crds import EnvFromSource
+from modal_operator.kube import KubeClient, ListWatcher
+from modal_operator.metrics import env_cache_lookups
+
+logger = structlog.get_logger(__name__)
+
+SECRET = "Secret"
+CONFIG_MAP = "ConfigMap"
+# Secrets and ConfigMaps carrying this label are watched, cached and trigger redeploys when they change.
+ENV_SOURCE_LABEL = "modal.internal.io/env-source"
+
+# (kind, namespace, name) of a Secret or ConfigMap
+SourceRef = Tuple[str, str, str]
+# (namespace, name) of a ModalApp
+AppKey = Tuple[str, str]
+
+
+def decode_secret_data(data: Optional[Dict[str, str]]) -> Dict[str, str]:
+    return {key: base64.b64decode(value).decode() for key, value in (data or {}).items()}
+
+
+def source_refs(namespace: str, env_from: Iterable[EnvFromSource]) -> list[SourceRef]:
+    refs = []
+    for source in env_from:
+        if source.secretRef:
+            refs.append((SECRET, namespace, source.secretRef["name"]))
+        if source.configMapRef:
+            refs.append((CONFIG_MAP, namespace, source.configMapRef["name"]))
+    return refs
+
+
+class EnvSourceCache:
+    """Watch-fed cache of the Secrets and ConfigMaps that ModalApps reference in ``envFrom``.
+
+    Only objects labelled with ``ENV_SOURCE_LABEL`` are watched, so only
+    they are held here, kept current by watch events. Lookups of anything
+    else go to ``fetch`` every time. A reverse index maps each object to the
+    ModalApps that consume it; only changes to consumed objects count.
+    """
+
+    def __init__(self, fetch: Callable[[str, str, str], Awaitable[Dict[str, str]]]):
+        self._fetch = fetch
+        self._data: Dict[SourceRef, Dict[str, str]] = {}
+        self._refs: Dict[AppKey, Set[SourceRef]] = {}
+        self._consumers: Dict[SourceRef, Set[AppKey]] = {}
+
+    def track(self, app: AppKey, namespace: str, env_from: Iterable[EnvFromSource]):
+        """Record which Secrets/ConfigMaps ``app`` references, replacing earlier references."""
+        refs = set(source_refs(namespace, env_from))
+        old = self._refs.get(app, set())
+        for ref in old - refs:
+            self._drop_consumer(ref, app)
+        for ref in refs - old:
+            self._consumers.setdefault(ref, set()).add(app)
+        if refs:
+            self._refs[app] = refs
+        else:
+            self._refs.pop(app, None)
+
+    def untrack(self, app: AppKey):
+        for ref in self._refs.pop(app, set()):
+            self._drop_consumer(ref, app)
+
+    def _drop_consumer(self, ref: SourceRef, app: AppKey):
+        consumers = self._consumers.get(ref)
+        if consumers is None:
+            return
+        consumers.discard(app)
+        if not consumers:
+            del self._consumers[ref]
+
+    def is_referenced(self, kind: str, namespace: str, name: str) -> bool:
+        return (kind, namespace, name) in self._consumers
+
+    def consumers(self, kind: str, namespace: str, name: str) -> Set[AppKey]:
+        return set(self._consumers.get((kind, namespace, name), ()))
+
+    def observe(self, kind: str, namespace: str, name: str, data: Optional[Dict[str, str]]) -> bool:
+        """Apply a watch event; ``data`` is None for deletions. Returns True if a consumed object changed."""
+        ref = (kind, namespace, name)
+        if data is None:
+            return self._data.pop(ref, None) is not None and ref in self._consumers
+        if self._data.get(ref) == data:
+            return False
+        changed = ref in self._data and ref in self._consumers
+        self._data[ref] = data
+        return changed
+
+    def known(self, kind: str, namespace: Optional[str]) -> Set[Tuple[str, str]]:
+        """(namespace, name) of the cached objects of ``kind`` in ``namespace``, or in all namespaces when None."""
+        return {(ns, name) for k, ns, name in self._data if k == kind and namespace in (None, ns)}
+
+    async def get(self, kind: str, namespace: str, name: str) -> Dict[str, str]:
+        ref = (kind, namespace, name)
+        data = self._data.get(ref)
+        if data is not None:
+            env_cache_lookups.labels(result="hit").inc()
+            return data
+        env_cache_lookups.labels(result="miss").inc()
+        return await self._fetch(kind, namespace, name)
+
+    async def resolve(self, namespace: str, env_from: Iterable[EnvFromSource]) -> Dict[str, str]:
+        env_vars = {}
+        for kind, ns, name in source_refs(namespace, env_from):
+            env_vars.update(await self.get(kind, ns, name))
+        return env_vars
+
+
+class EnvSourceWatcher(ListWatcher):
+    """Feeds labelled Secrets or ConfigMaps into an EnvSourceCache.
+
+    The label selector is applied by the API server, so the payloads of
+    other Secrets and ConfigMaps never reach the operator. ``on_change`` is
+    called as ``on_change(kind, namespace, name, data)`` for every object
+    seen, with ``data`` None once it is deleted or loses the label.
+    """
+
+    def __init__(
+        self,
+        kube: KubeClient,
+        kind: str,
+        cache: EnvSourceCache,
+        on_change: Callable[[str, str, str, Optional[Dict[str, str]]], Any],
+        namespaces: Sequence[str] = (),
+    ):
+        super().__init__(kube, namespaces)
+        self.name = f"{kind.lower()}-watch"
+        self.kind = kind
+        self.cache = cache
+        self._on_change = on_change
+        api = client.CoreV1Api(kube.api_client)
+        plural = "secret" if kind == SECRET else "config_map"
+        self._list_all = getattr(api, f"list_{plural}_for_all_namespaces")
+        self._list_namespaced = getattr(api, f"list_namespaced_{plural}")
+
+    def _data(self, obj: Dict[str, Any]) -> Dict[str, str]:
+        return decode_secret_data(obj.get("data")) if self.kind == SECRET else dict(obj.get("data") or {})
+
+    async def _list(self, namespace: Optional[str]) -> str:
+        args = () if namespace is None else (namespace,)
+        method = self._list_all if namespace is None else self._list_namespaced
+        response = await self.kube.call(method, *args, label_selector=ENV_SOURCE_LABEL, _preload_content=False)
+        listed = json.loads(response.data)
+        gone = self.cache.known(self.kind, namespace)
+        for obj in listed.get("items", []):
+            key = (obj["metadata"]["namespace"], obj["metadata"]["name"])
+            gone.discard(key)
+            self._on_change(self.kind, *key, self._data(obj))
+        for key in gone:
+            self._on_change(self.kind, *key, None)
+        return listed["metadata"]["resourceVersion"]
+
+    def _stream(self, namespace: Optional[str], version: str):
+        args = () if namespace is None else (namespace,)
+        method = self._list_all if namespace is None else self._list_namespaced
+        return self._watch(method, *args, version=version, label_selector=ENV_SOURCE_LABEL)
+
+    def _observe(self, event_type: str, obj: Dict[str, Any]):
+        metadata = obj["metadata"]
+        data = None if event_type == "DELETED" else self._data(obj)
+        self._on_change(self.kind, metadata["namespace"], metadata["name"], data)
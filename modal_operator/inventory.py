@@ -0,0 +1,88 @@
+import asyncio
+import time
+from typing import Awaitable, Callable, Dict, Optional
+
+import structlog
+
+from modal_operator.metrics import inventory_refreshes
+
+logger = structlog.get_logger(__name__)
+
+
+class DeploymentInventory:
+    """Shared, TTL-refreshed view of the apps deployed in the Modal workspace.
+
+    Lookups are dict reads. A refresh lists the whole workspace once, and
+    concurrent callers that need a refresh all wait on the same listing.
+    Deploys and stops update the inventory in place when they know the
+    outcome, and invalidate it when they do not.
+    """
+
+    def __init__(
+        self,
+        list_apps: Callable[[], Awaitable[Dict[str, str]]],
+        ttl: float = 30.0,
+        min_refresh_interval: float = 1.0,
+    ):
+        self.ttl = ttl
+        self.min_refresh_interval = min_refresh_interval
+        self._list_apps = list_apps
+        self._apps: Dict[str, str] = {}
+        self._refreshed_at: Optional[float] = None
+        self._refresh: Optional[asyncio.Task] = None
+
+    def _age(self) -> float:
+        if self._refreshed_at is None:
+            return float("inf")
+        return time.monotonic() - self._refreshed_at
+
+    async def snapshot(self) -> Dict[str, str]:
+        """Deployed apps by name -> app ID, refreshed if older than the TTL."""
+        if self._age() > self.ttl:
+            await self.refresh()
+        return self._apps
+
+    async def get(self, name: str) -> Optional[str]:
+        """App ID of a deployed app, refreshing once if it is not known yet."""
+        apps = await self.snapshot()
+        if name not in apps and self._age() > self.min_refresh_interval:
+            apps = await self.refresh()
+        return apps.get(name)
+
+    async def refresh(self) -> Dict[str, str]:
+        if self._refresh is None:
+            self._refresh = asyncio.create_task(self._do_refresh())
+        task = self._refresh
+        try:
+            return await asyncio.shield(task)
+        finally:
+            if self._refresh is task and task.done():
+                self._refresh = None
+
+    async def _do_refresh(self) -> Dict[str, str]:
+        try:
+            apps = await self._list_apps()
+        except Exception:
+            inventory_refreshes.labels(result="error").inc()
+            raise
+        inventory_refreshes.labels(result="ok").inc()
+        self._apps = dict(apps)
+        self._refreshed_at = time.monotonic()
+        logger.debug("refreshed Modal deployment inventory", apps=len(self._apps))
+        return self._apps
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._apps
+
+    def peek(self, name: str) -> Optional[str]:
+        """App ID if already known, without ever triggering a listing."""
+        return self._apps.get(name)
+
+    def record(self, name: str, app_id: str):
+        self._apps[name] = app_id
+
+    def discard(self, name: str):
+        self._apps.pop(name, None)
+
+    def invalidate(self):
+        self._refreshed_at = None
@@ -0,0 +1,307 @@
+import asyncio
+import functools
+import heapq
+import itertools
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from enum import IntEnum
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+import structlog
+from kubernetes import client, config, watch
+from kubernetes.client.exceptions import ApiException
+
+from modal_operator.metrics import (
+    kube_api_latency,
+    kube_api_retries,
+    kube_api_retry_budget_exhausted,
+    kube_api_throttle_wait,
+)
+
+logger = structlog.get_logger(__name__)
+
+RETRYABLE_STATUSES = frozenset({429, 500, 502, 503, 504})
+
+
+def load_config():
+    """Load in-cluster credentials, falling back to the local kubeconfig."""
+    try:
+        config.load_incluster_config()
+    except config.ConfigException:
+        config.load_kube_config()
+
+
+class Verb(IntEnum):
+    """Request classes, in the order the shared rate limiter serves them."""
+
+    STATUS = 0
+    WRITE = 1
+    DELETE = 2
+    READ = 3
+
+
+def classify(method: str) -> Verb:
+    """Map a generated client method name to its request class."""
+    if method.endswith("_status") and method.startswith(("patch_", "replace_")):
+        return Verb.STATUS
+    if method.startswith("delete_"):
+        return Verb.DELETE
+    if method.startswith(("create_", "patch_", "replace_")):
+        return Verb.WRITE
+    return Verb.READ
+
+
+class TokenBucket:
+    """Allows ``qps`` acquisitions per second on average, with bursts of up to ``burst``.
+
+    When the bucket is empty, waiters are served lowest ``priority`` first and
+    in arrival order within a priority.
+    """
+
+    def __init__(self, qps: float, burst: int):
+        self.qps = qps
+        self.burst = max(1, burst)
+        self._tokens = float(self.burst)
+        self._updated = time.monotonic()
+        self._waiters: List[Tuple[int, int, asyncio.Future]] = []
+        self._seq = itertools.count()
+        self._dispatcher: Optional[asyncio.Task] = None
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.qps)
+        self._updated = now
+
+    async def acquire(self, priority: int = 0):
+        if self.qps <= 0:
+            return
+        self._refill()
+        if not self._waiters and self._tokens >= 1:
+            self._tokens -= 1
+            return
+        waiter = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (priority, next(self._seq), waiter))
+        if self._dispatcher is None or self._dispatcher.done():
+            self._dispatcher = asyncio.create_task(self._dispatch())
+        await waiter
+
+    async def _dispatch(self):
+        while self._waiters:
+            self._refill()
+            while self._waiters and self._tokens >= 1:
+                _, _, waiter = heapq.heappop(self._waiters)
+                if not waiter.done():
+                    waiter.set_result(None)
+                    self._tokens -= 1
+            if self._waiters:
+                await asyncio.sleep((1 - self._tokens) / self.qps)
+
+
+class RetryBudget:
+    """Caps retries at roughly ``ratio`` of recent requests.
+
+    Every request deposits ``ratio`` tokens and every retry withdraws one, so
+    a struggling API server sees a bounded amount of extra load instead of
+    every caller retrying at once. ``min_retries`` keeps a few retries
+    available while traffic is low.
+    """
+
+    def __init__(self, ratio: float = 0.2, min_retries: int = 10):
+        self.ratio = ratio
+        self.min_retries = min_retries
+        self._balance = float(min_retries)
+
+    def deposit(self):
+        self._balance = min(self._balance + self.ratio, self.min_retries + 100 * self.ratio)
+
+    def withdraw(self) -> bool:
+        if self._balance < 1:
+            return False
+        self._balance -= 1
+        return True
+
+
+def retry_after(e: ApiException) -> Optional[float]:
+    """Seconds from the response's Retry-After header, if it carries one."""
+    value = (e.headers or {}).get("Retry-After")
+    try:
+        return max(0.0, float(value))
+    except (TypeError, ValueError):
+        return None
+
+
+class _AsyncApi:
+    """Exposes every method of a generated kubernetes API class as a coroutine."""
+
+    def __init__(self, kube: "KubeClient", api: Any):
+        self._kube = kube
+        self._api = api
+
+    def __getattr__(self, name: str):
+        method = getattr(self._api, name)
+
+        async def call(*args, **kwargs):
+            return await self._kube.call(method, *args, **kwargs)
+
+        call.__name__ = name
+        return call
+
+
+class KubeClient:
+    """Shared, rate-limited async access to the Kubernetes API.
+
+    All calls go through one ``ApiClient``, so HTTP connections are pooled and
+    kept alive instead of being set up per request. Blocking calls run on a
+    dedicated executor sized to the connection pool. Each request class has
+    its own token bucket (``verb_qps``, bursts of twice the rate), and all of
+    them share a ``qps``/``burst`` bucket that serves status writes before
+    other writes and reads. Throttled or failed requests are retried with
+    jittered exponential backoff, honoring ``Retry-After``, while the shared
+    retry budget allows it.
+    """
+
+    def __init__(
+        self,
+        qps: float = 20.0,
+        burst: int = 40,
+        pool_size: int = 10,
+        verb_qps: Optional[Dict[str, float]] = None,
+        max_retries: int = 5,
+        retry_ratio: float = 0.2,
+        backoff_base: float = 0.5,
+        backoff_max: float = 30.0,
+        configuration: Optional[client.Configuration] = None,
+    ):
+        configuration = configuration or client.Configuration.get_default_copy()
+        configuration.connection_pool_maxsize = pool_size
+        self.api_client = client.ApiClient(configuration)
+        self.core = _AsyncApi(self, client.CoreV1Api(self.api_client))
+        self.custom = _AsyncApi(self, client.CustomObjectsApi(self.api_client))
+        self.coordination = _AsyncApi(self, client.CoordinationV1Api(self.api_client))
+        self.limiter = TokenBucket(qps, burst)
+        self.verb_limiters = {
+            Verb[verb.upper()]: TokenBucket(rate, int(rate * 2)) for verb, rate in (verb_qps or {}).items()
+        }
+        self.retry_budget = RetryBudget(retry_ratio)
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self._executor = ThreadPoolExecutor(max_workers=pool_size, thread_name_prefix="kube-api")
+
+    async def _throttle(self, verb: Verb):
+        start = time.monotonic()
+        verb_limiter = self.verb_limiters.get(verb)
+        if verb_limiter is not None:
+            await verb_limiter.acquire()
+        await self.limiter.acquire(verb)
+        kube_api_throttle_wait.labels(verb=verb.name.lower()).observe(time.monotonic() - start)
+
+    def _backoff(self, attempt: int, e: ApiException) -> float:
+        delay = random.uniform(0, min(self.backoff_max, self.backoff_base * 2**attempt))
+        server_delay = retry_after(e)
+        if server_delay is not None:
+            delay = max(delay, min(server_delay, self.backoff_max))
+        return delay
+
+    async def call(self, fn: Callable, *args, **kwargs):
+        verb = classify(fn.__name__)
+        loop = asyncio.get_running_loop()
+        self.retry_budget.deposit()
+        for attempt in itertools.count():
+            await self._throttle(verb)
+            start = time.monotonic()
+            try:
+                return await loop.run_in_executor(self._executor, functools.partial(fn, *args, **kwargs))
+            except ApiException as e:
+                if e.status not in RETRYABLE_STATUSES or attempt >= self.max_retries:
+                    raise
+                if not self.retry_budget.withdraw():
+                    kube_api_retry_budget_exhausted.labels(verb=verb.name.lower()).inc()
+                    raise
+                delay = self._backoff(attempt, e)
+                kube_api_retries.labels(verb=verb.name.lower(), status=str(e.status)).inc()
+                logger.debug("retrying kubernetes API call", method=fn.__name__, status=e.status, delay=delay)
+            finally:
+                kube_api_latency.labels(method=fn.__name__).observe(time.monotonic() - start)
+            await asyncio.sleep(delay)
+
+    def close(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+        self.api_client.close()
+
+
+class ListWatcher:
+    """Base for list-then-watch followers of one kind of object.
+
+    ``start`` lists each namespace (the whole cluster when no namespaces are
+    given) and then follows it on a daemon thread, handing events to the
+    event loop. An expired resource version or a broken watch falls back to
+    a fresh listing. Subclasses implement ``_list`` (load a full listing and
+    return its resource version), ``_stream`` (the watch from that version)
+    and ``_observe`` (apply one event, called on the loop with the raw object).
+    """
+
+    name = "watch"
+
+    def __init__(
+        self, kube: KubeClient, namespaces: Sequence[str] = (), watch_timeout: int = 300, retry_delay: float = 5.0
+    ):
+        self.kube = kube
+        self.namespaces = list(namespaces) or [None]
+        self.watch_timeout = watch_timeout
+        self.retry_delay = retry_delay
+        self._stopping = threading.Event()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    async def start(self):
+        """List once, then follow changes in the background."""
+        self._loop = asyncio.get_running_loop()
+        for namespace in self.namespaces:
+            version = await self._list(namespace)
+            threading.Thread(
+                target=self._follow, args=(namespace, version), name=f"{self.name}-{namespace or 'all'}", daemon=True
+            ).start()
+
+    def stop(self):
+        self._stopping.set()
+
+    async def _list(self, namespace: Optional[str]) -> str:
+        raise NotImplementedError
+
+    def _stream(self, namespace: Optional[str], version: str) -> Iterator[Dict[str, Any]]:
+        raise NotImplementedError
+
+    def _observe(self, event_type: str, obj: Dict[str, Any]):
+        raise NotImplementedError
+
+    def _watch(self, method: Callable, *args, version: str, **kwargs) -> Iterator[Dict[str, Any]]:
+        return watch.Watch().stream(
+            method,
+            *args,
+            resource_version=version,
+            timeout_seconds=self.watch_timeout,
+            allow_watch_bookmarks=True,
+            **kwargs,
+        )
+
+    def _follow(self, namespace: Optional[str], version: Optional[str]):
+        while not self._stopping.is_set():
+            try:
+                if version is None:
+                    version = asyncio.run_coroutine_threadsafe(self._list(namespace), self._loop).result()
+                for event in self._stream(namespace, version):
+                    if self._stopping.is_set():
+                        return
+                    obj = event.get("raw_object", event["object"])
+                    if event["type"] == "ERROR":
+                        raise ApiException(status=obj.get("code"), reason=obj.get("message"))
+                    version = obj["metadata"]["resourceVersion"]
+                    if event["type"] != "BOOKMARK":
+                        self._loop.call_soon_threadsafe(self._observe, event["type"], obj)
+            except Exception as e:
+                if not (isinstance(e, ApiException) and e.status == 410):
+                    logger.warning("watch failed, relisting", watch=self.name, namespace=namespace, error=str(e))
+                    self._stopping.wait(self.retry_delay)
+                version = None
@@ -0,0 +1,166 @@
+import asyncio
+import time
+from datetime import datetime, timezone
+from typing import Awaitable, Callable, Optional
+
+import structlog
+from kubernetes import client
+from kubernetes.client.exceptions import ApiException
+
+from modal_operator.kube import KubeClient
+from modal_operator.metrics import leader, leader_transitions
+from modal_operator.sharding import LeaseObserver
+
+logger = structlog.get_logger(__name__)
+
+
+class LeaderElector:
+    """Lease-based leader election between a leader and warm standbys.
+
+    Every replica runs the same watches, so a standby's caches stay as
+    current as the leader's; only the leader runs ModalApp handlers. The
+    leader renews ``lease_name`` every ``retry_period`` seconds and steps
+    down if it could not renew within ``renew_deadline``, which is shorter
+    than ``lease_duration`` so it has stopped acting before a standby can
+    take over. A standby takes over once the lease has expired, or right
+    away when the leader released it on shutdown.
+
+    ``on_elected`` runs in its own task and is retried until it succeeds or
+    the replica steps down, at which point ``on_demoted`` is called.
+    """
+
+    def __init__(
+        self,
+        kube: KubeClient,
+        identity: str,
+        namespace: str,
+        lease_name: str = "modal-operator-leader",
+        lease_duration: float = 15.0,
+        renew_deadline: Optional[float] = None,
+        retry_period: Optional[float] = None,
+        on_elected: Optional[Callable[[], Awaitable[None]]] = None,
+        on_demoted: Optional[Callable[[], None]] = None,
+    ):
+        self.kube = kube
+        self.identity = identity
+        self.namespace = namespace
+        self.lease_name = lease_name
+        self.lease_duration = lease_duration
+        self.renew_deadline = renew_deadline if renew_deadline is not None else lease_duration * 2 / 3
+        self.retry_period = retry_period if retry_period is not None else self.renew_deadline / 5
+        self.is_leader = False
+        self._on_elected = on_elected
+        self._on_demoted = on_demoted
+        self._renewed_at = 0.0
+        self._task: Optional[asyncio.Task] = None
+        self._takeover: Optional[asyncio.Task] = None
+        self._leases = LeaseObserver()
+
+    def owns(self, namespace: str, name: str) -> bool:
+        return self.is_leader
+
+    async def start(self):
+        await self._tick()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Release the lease so a standby can take over without waiting for it to expire."""
+        if self._task is not None:
+            self._task.cancel()
+        if not self.is_leader:
+            return
+        self._step_down()
+        try:
+            lease = await self.kube.coordination.read_namespaced_lease(self.lease_name, self.namespace)
+            if lease.spec.holder_identity == self.identity:
+                lease.spec.holder_identity = None
+                await self.kube.coordination.replace_namespaced_lease(self.lease_name, self.namespace, lease)
+        except ApiException as e:
+            logger.warning("failed to release leader lease", error=str(e))
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.retry_period)
+            try:
+                if self.is_leader:
+                    remaining = self._renewed_at + self.renew_deadline - time.monotonic()
+                    await asyncio.wait_for(self._tick(), timeout=max(remaining, 0))
+                else:
+                    await self._tick()
+            except Exception as e:
+                logger.warning("leader election round failed", error=str(e) or type(e).__name__)
+                if self.is_leader and time.monotonic() - self._renewed_at >= self.renew_deadline:
+                    logger.error("could not renew leader lease, stepping down")
+                    self._step_down()
+
+    async def _tick(self):
+        attempted_at = time.monotonic()
+        held = await self._try_acquire_or_renew()
+        if held:
+            self._renewed_at = attempted_at
+        if held and not self.is_leader:
+            self._set_leader(True)
+            leader_transitions.inc()
+            logger.info("became leader", identity=self.identity)
+            if self._on_elected is not None:
+                self._takeover = asyncio.create_task(self._take_over())
+        elif not held and self.is_leader:
+            logger.warning("lost leader lease", identity=self.identity)
+            self._step_down()
+
+    async def _take_over(self):
+        while self.is_leader:
+            try:
+                await self._on_elected()
+                return
+            except Exception as e:
+                logger.warning("leader takeover failed, retrying", error=str(e))
+                await asyncio.sleep(self.retry_period)
+
+    def _step_down(self):
+        self._set_leader(False)
+        if self._takeover is not None:
+            self._takeover.cancel()
+            self._takeover = None
+        if self._on_demoted is not None:
+            self._on_demoted()
+
+    def _set_leader(self, is_leader: bool):
+        self.is_leader = is_leader
+        leader.set(1 if is_leader else 0)
+
+    async def _try_acquire_or_renew(self) -> bool:
+        coordination = self.kube.coordination
+        now = datetime.now(timezone.utc)
+        try:
+            lease = await coordination.read_namespaced_lease(self.lease_name, self.namespace)
+        except ApiException as e:
+            if e.status != 404:
+                raise
+            lease = None
+        try:
+            if lease is None:
+                spec = client.V1LeaseSpec(
+                    holder_identity=self.identity,
+                    lease_duration_seconds=int(self.lease_duration),
+                    acquire_time=now,
+                    renew_time=now,
+                    lease_transitions=0,
+                )
+                body = client.V1Lease(metadata=client.V1ObjectMeta(name=self.lease_name), spec=spec)
+                await coordination.create_namespaced_lease(self.namespace, body)
+                return True
+            if lease.spec.holder_identity != self.identity:
+                if not self._leases.expired(lease):
+                    return False
+                lease.spec.holder_identity = self.identity
+                lease.spec.acquire_time = now
+                lease.spec.lease_transitions = (lease.spec.lease_transitions or 0) + 1
+            lease.spec.lease_duration_seconds = int(self.lease_duration)
+            lease.spec.renew_time = now
+            await coordination.replace_namespaced_lease(self.lease_name, self.namespace, lease)
+            return True
+        except ApiException as e:
+            if e.status != 409:
+                raise
+            return False
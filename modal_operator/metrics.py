@@ -6,7 +6,109 @@ logger = structlog.get_logger(__name__)
 apps_deployed = Counter("modal_apps_deployed_total", "Total Modal apps deployed", ["namespace"])
 apps_failed = Counter("modal_apps_failed_total", "Total Modal app deploy failures", ["namespace"])
 apps_active = Gauge("modal_apps_active", "Currently active Modal apps")
+deploys_skipped = Counter(
+    "modal_deploys_skipped_total", "Deploys skipped because the deploy inputs were unchanged", ["namespace"]
+)
 deploy_duration = Histogram("modal_deploy_duration_seconds", "Modal deploy duration", buckets=[5, 10, 30, 60, 120, 300])
+deploy_queue_depth = Gauge(
+    "modal_deploy_queue_depth", "Deploys waiting for a scheduler slot", ["namespace", "priority"]
+)
+deploy_queue_wait = Histogram(
+    "modal_deploy_queue_wait_seconds",
+    "Time deploys spend waiting for a scheduler slot",
+    ["priority"],
+    buckets=[0.1, 1, 5, 10, 30, 60, 120, 300, 600],
+)
+deploys_in_flight = Gauge("modal_deploys_in_flight", "Deploys currently running")
+deploy_workers_busy = Gauge("modal_deploy_workers_busy", "SDK deploy workers currently running a job")
+deploy_workers_recycled = Counter(
+    "modal_deploy_workers_recycled_total", "SDK deploy workers replaced, by reason", ["reason"]
+)
+inventory_refreshes = Counter(
+    "modal_inventory_refreshes_total", "Full listings of deployed Modal apps, by result", ["result"]
+)
+env_cache_lookups = Counter(
+    "modal_env_cache_lookups_total", "envFrom Secret/ConfigMap lookups, by cache result", ["result"]
+)
+env_redeploys = Counter(
+    "modal_env_redeploys_total", "Redeploys triggered by changed envFrom Secrets/ConfigMaps", ["namespace"]
+)
+kube_api_latency = Histogram(
+    "modal_kube_api_request_seconds",
+    "Kubernetes API request latency, by client method",
+    ["method"],
+    buckets=[0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5],
+)
+kube_api_throttle_wait = Histogram(
+    "modal_kube_api_throttle_seconds",
+    "Time Kubernetes API requests wait for the client-side rate limiter, by verb",
+    ["verb"],
+    buckets=[0.001, 0.01, 0.05, 0.1, 0.5, 1, 5, 10, 30],
+)
+kube_api_retries = Counter(
+    "modal_kube_api_retries_total", "Kubernetes API requests retried, by verb and response status", ["verb", "status"]
+)
+kube_api_retry_budget_exhausted = Counter(
+    "modal_kube_api_retry_budget_exhausted_total",
+    "Retryable Kubernetes API failures returned because the retry budget was spent",
+    ["verb"],
+)
+services_applied = Counter(
+    "modal_services_applied_total", "ExternalName Services written, by whether they were missing or drifted", ["reason"]
+)
+leader = Gauge("modal_leader", "1 while this replica holds the leader lease")
+leader_transitions = Counter("modal_leader_transitions_total", "Times this replica became leader")
+shard_members = Gauge("modal_shard_members", "Operator replicas currently sharing ModalApps")
+shard_owned_apps = Gauge("modal_shard_owned_apps", "ModalApps this replica owns")
+shard_rebalances = Counter("modal_shard_rebalances_total", "Shard membership changes seen by this replica")
+deploy_lock_conflicts = Counter(
+    "modal_deploy_lock_conflicts_total", "Deploys deferred because another replica held the app's deploy lock"
+)
+status_patches = Counter(
+    "modal_status_patches_total", "ModalApp status updates, by whether they were written, merged or skipped", ["result"]
+)
+proxy_requests = Counter("modal_proxy_requests_total", "Requests handled by modal-proxy, by response status", ["code"])
+proxy_upstream_latency = Histogram(
+    "modal_proxy_upstream_seconds",
+    "Time until Modal returned response headers to modal-proxy",
+    buckets=[0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60],
+)
+proxy_upstream_connections = Counter(
+    "modal_proxy_upstream_connections_total",
+    "Upstream connections modal-proxy used, by whether they came from the keep-alive pool or were newly opened",
+    ["result"],
+)
+proxy_upstream_connect_seconds = Histogram(
+    "modal_proxy_upstream_connect_seconds",
+    "Time modal-proxy spent opening an upstream connection, including DNS, TCP and the TLS handshake",
+    buckets=[0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5],
+)
+proxy_upstream_pool_wait = Histogram(
+    "modal_proxy_upstream_pool_wait_seconds",
+    "Time requests waited for a free upstream connection because a pool limit was reached",
+    buckets=[0.001, 0.01, 0.05, 0.1, 0.5, 1, 5, 10],
+)
+proxy_websockets_open = Gauge("modal_proxy_websockets_open", "WebSocket connections modal-proxy is relaying")
+proxy_cache_lookups = Counter(
+    "modal_proxy_cache_lookups_total",
+    "GETs to cache-enabled ModalApps, by whether they were served from cache, joined an in-flight request, "
+    "went upstream, or bypassed the cache",
+    ["result"],
+)
+proxy_cache_bytes = Gauge("modal_proxy_cache_bytes", "Size of the responses in modal-proxy's cache")
+proxy_cache_evictions = Counter(
+    "modal_proxy_cache_evictions_total", "Cached responses evicted early to stay within the cache size limit"
+)
+proxy_routes = Gauge("modal_proxy_routes", "Service hostnames modal-proxy can route to Modal")
+proxy_watch_lag = Histogram(
+    "modal_proxy_watch_lag_seconds",
+    "Time from a ModalApp change being written until modal-proxy's routing table reflects it",
+    buckets=[0.1, 0.5, 1, 2, 5, 10, 30, 60, 300],
+)
+resume_pending = Gauge("modal_resume_pending", "ModalApps not yet reconciled since operator startup")
+startup_reconcile_seconds = Gauge(
+    "modal_startup_reconcile_seconds", "Time from operator startup until every ModalApp was reconciled"
+)
 
 
 def start_metrics_server(port: int = 8081):
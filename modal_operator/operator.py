@@ -1,44 +1,150 @@
-import base64
+import asyncio
+import contextlib
+import fnmatch
+import os
 import time
 from datetime import datetime, timezone
-from typing import Optional
+from typing import Dict, List, Optional
 
 import kopf
 import structlog
-from kubernetes import client, config
+from kubernetes import client
 from kubernetes.client.exceptions import ApiException
 
 from modal_operator.config import OperatorConfig
-from modal_operator.crds import ModalAppSpec
-from modal_operator.deployer import DeployResult, ModalDeployer
+from modal_operator.crds import ModalAppSpec, ModalAppStatus
+from modal_operator.deploy_output import Endpoint
+from modal_operator.deployer import DeployResult, ModalDeployer, compute_deploy_hash
+from modal_operator.envcache import CONFIG_MAP, SECRET, AppKey, EnvSourceCache, EnvSourceWatcher, decode_secret_data
 from modal_operator.health import mark_ready, start_health_server
-from modal_operator.metrics import apps_active, apps_deployed, apps_failed, deploy_duration, start_metrics_server
-from modal_operator.resources import ResourceManager
+from modal_operator.kube import KubeClient, ListWatcher, load_config
+from modal_operator.leader import LeaderElector
+from modal_operator.metrics import (
+    apps_active,
+    apps_deployed,
+    apps_failed,
+    deploy_duration,
+    deploys_skipped,
+    shard_owned_apps,
+    start_metrics_server,
+)
+from modal_operator.redeploy import EnvRedeployer, TrackedApp
+from modal_operator.resources import ResourceManager, ServiceCache, ServiceWatcher
+from modal_operator.resume import ResumeCoordinator
+from modal_operator.scheduler import DeployScheduler, Priority
+from modal_operator.sharding import DeployLockHeld, DeployLocks, HashRing, ShardCoordinator
+from modal_operator.status import StatusWriter
 
 logger = structlog.get_logger(__name__)
 
 operator_config: Optional[OperatorConfig] = None
+kube: Optional[KubeClient] = None
 deployer: Optional[ModalDeployer] = None
 resource_manager: Optional[ResourceManager] = None
+service_cache = ServiceCache()
+# Namespaces (or kopf-style globs) the watches are scoped to; empty when running cluster-wide.
+watched_namespaces: List[str] = []
+scheduler: Optional[DeployScheduler] = None
+resume_coordinator: Optional[ResumeCoordinator] = None
+env_cache: Optional[EnvSourceCache] = None
+env_redeployer: Optional[EnvRedeployer] = None
+watchers: List[ListWatcher] = []
+status_writer: Optional[StatusWriter] = None
+shard_coordinator: Optional[ShardCoordinator] = None
+leader_elector: Optional[LeaderElector] = None
+deploy_locks: Optional[DeployLocks] = None
+inventory_warmer: Optional[asyncio.Task] = None
+
+ENV_HASH_ANNOTATION = "modal.internal.io/env-hash"
+# kopf registers timers at import time, so this is read here rather than from OperatorConfig.
+SERVICE_DRIFT_INTERVAL = float(os.getenv("SERVICE_DRIFT_INTERVAL_SECONDS", "300"))
+REPLICA_DOMAIN = "replica.modal.internal.io"
+OWNER_ANNOTATION = "modal.internal.io/owner"
+# kopf's default finalizer and annotation prefix, left on apps handled before replicas were enabled.
+LEGACY_KOPF_PREFIX = "kopf.zalando.org/"
+LEGACY_FINALIZER = f"{LEGACY_KOPF_PREFIX}KopfFinalizerMarker"
 
 
 @kopf.on.startup()
 def configure(settings: kopf.OperatorSettings, **_):
-    global operator_config, deployer, resource_manager
+    global operator_config, kube, deployer, resource_manager, scheduler, resume_coordinator, env_cache, env_redeployer
+    global status_writer, shard_coordinator, leader_elector, deploy_locks
 
     settings.peering.standalone = True
     settings.posting.level = 20
     settings.watching.connect_timeout = 60
     settings.watching.server_timeout = 600
 
-    try:
-        config.load_incluster_config()
-    except config.ConfigException:
-        config.load_kube_config()
+    load_config()
 
     operator_config = OperatorConfig.from_env()
-    deployer = ModalDeployer(operator_config.modal_token_id, operator_config.modal_token_secret)
-    resource_manager = ResourceManager()
+    replicated = operator_config.sharding_enabled or operator_config.leader_election_enabled
+    if operator_config.sharding_enabled and operator_config.leader_election_enabled:
+        raise RuntimeError("SHARDING_ENABLED and LEADER_ELECTION_ENABLED are mutually exclusive")
+    if replicated:
+        _configure_replica_persistence(settings, operator_config.pod_name)
+    kube = KubeClient(
+        qps=operator_config.kube_api_qps,
+        burst=operator_config.kube_api_burst,
+        pool_size=operator_config.kube_api_pool_size,
+        verb_qps=operator_config.kube_api_verb_qps,
+        max_retries=operator_config.kube_api_max_retries,
+        retry_ratio=operator_config.kube_api_retry_ratio,
+    )
+    deployer = ModalDeployer(
+        operator_config.modal_token_id,
+        operator_config.modal_token_secret,
+        deploy_timeout=operator_config.deploy_timeout,
+        stop_timeout=operator_config.stop_timeout,
+        backend=operator_config.deploy_backend,
+        workers=operator_config.deploy_workers,
+        worker_max_jobs=operator_config.deploy_worker_max_jobs,
+        worker_max_rss_mb=operator_config.deploy_worker_max_rss_mb,
+        inventory_ttl=operator_config.inventory_ttl,
+    )
+    deployer.start()
+    resource_manager = ResourceManager(kube, service_cache, operator_config.proxy_service)
+    status_writer = StatusWriter(_write_status, window=operator_config.status_patch_window)
+    env_cache = EnvSourceCache(_fetch_env_source)
+    if operator_config.env_auto_redeploy:
+        env_redeployer = EnvRedeployer(
+            env_cache,
+            _request_redeploy,
+            window=operator_config.env_redeploy_debounce,
+            hash_key=operator_config.deploy_hash_key,
+        )
+    scheduler = DeployScheduler(
+        max_concurrent=operator_config.max_concurrent_deploys,
+        namespace_weights=operator_config.namespace_weights,
+    )
+    resume_coordinator = ResumeCoordinator(
+        deployer.inventory.snapshot,
+        mode=operator_config.resume_mode,
+        rate=operator_config.resume_rate,
+        jitter=operator_config.resume_jitter,
+    )
+
+    if replicated:
+        deploy_locks = DeployLocks(
+            kube, operator_config.pod_name, operator_config.pod_namespace, operator_config.deploy_timeout + 60
+        )
+    if operator_config.sharding_enabled:
+        shard_coordinator = ShardCoordinator(
+            kube,
+            operator_config.pod_name,
+            operator_config.pod_namespace,
+            lease_duration=operator_config.shard_lease_duration,
+            on_rebalance=_rebalanced,
+        )
+    if operator_config.leader_election_enabled:
+        leader_elector = LeaderElector(
+            kube,
+            operator_config.pod_name,
+            operator_config.pod_namespace,
+            lease_duration=operator_config.leader_lease_duration,
+            on_elected=_elected,
+            on_demoted=_demoted,
+        )
 
     start_health_server()
     start_metrics_server()
@@ -46,174 +152,484 @@ def configure(settings: kopf.OperatorSettings, **_):
     logger.info("modal operator started")
 
 
-@kopf.on.create("modal.internal.io", "v1alpha1", "modalapps")
-async def create_modal_app(spec, name, namespace, meta, **kwargs):
-    app_spec = ModalAppSpec(**spec)
-    app_name = app_spec.appName or name
-    log = logger.bind(app=app_name, namespace=namespace)
+def _configure_replica_persistence(settings: kopf.OperatorSettings, identity: str):
+    """Give each replica its own kopf finalizer and progress/diff-base annotations.
+
+    Only one replica handles any given ModalApp, but kopf's default annotations
+    and finalizer are shared: a replica that skips an app would still record
+    it as handled, or drop the finalizer before the owner's delete handler ran.
+    """
+    if not identity:
+        raise RuntimeError("Sharding and leader election require POD_NAME to be set to a stable replica name")
+    prefix = f"{identity}.{REPLICA_DOMAIN}"
+    settings.persistence.finalizer = f"{prefix}/finalizer"
+    settings.persistence.progress_storage = kopf.AnnotationsProgressStorage(prefix=prefix)
+    settings.persistence.diffbase_storage = kopf.AnnotationsDiffBaseStorage(
+        prefix=prefix, key="last-handled-configuration"
+    )
 
-    env_vars = app_spec.env.copy()
-    if app_spec.envFrom:
-        env_vars.update(_read_env_from(app_spec.envFrom, namespace))
 
-    start = time.monotonic()
-    result: DeployResult = await deployer.deploy_app(app_name, app_spec.source, env_vars)
-    deploy_duration.observe(time.monotonic() - start)
+@kopf.on.startup()
+async def start_coordination(**_):
+    global inventory_warmer
+    if shard_coordinator is not None:
+        await shard_coordinator.start()
+    if leader_elector is not None:
+        await leader_elector.start()
+        inventory_warmer = asyncio.create_task(_keep_inventory_warm())
+
+
+async def _keep_inventory_warm():
+    """Refresh the deployment inventory while on standby, so a takeover can verify apps without listing."""
+    while True:
+        if not leader_elector.is_leader:
+            try:
+                await deployer.inventory.refresh()
+            except Exception as e:
+                logger.warning("standby inventory refresh failed", error=str(e))
+        await asyncio.sleep(operator_config.inventory_ttl)
 
-    if not result.success:
-        apps_failed.labels(namespace=namespace).inc()
-        _patch_status(name, namespace, {"phase": "Failed", "message": result.error})
-        log.error("deploy failed", error=result.error)
-        raise kopf.TemporaryError(f"Deploy failed: {result.error}", delay=30)
 
-    apps_deployed.labels(namespace=namespace).inc()
-    apps_active.inc()
+@kopf.on.startup()
+async def track_startup_reconcile(**_):
+    try:
+        apps = await _list_modal_apps()
+    except ApiException as e:
+        logger.warning("failed to list ModalApps, not tracking startup reconcile", error=str(e))
+        return
+    keys = [(app["metadata"]["namespace"], app["metadata"]["name"]) for app in apps]
+    resume_coordinator.expect(key for key in keys if _owns(*key))
+
+
+async def _list_modal_apps() -> list:
+    """ModalApps in the watched namespaces, listed per namespace when no globs are involved."""
+    crd = {"group": "modal.internal.io", "version": "v1alpha1", "plural": "modalapps"}
+    if watched_namespaces and not any(_is_pattern(ns) for ns in watched_namespaces):
+        listed = await asyncio.gather(
+            *(kube.custom.list_namespaced_custom_object(namespace=ns, **crd) for ns in watched_namespaces)
+        )
+        return [app for apps in listed for app in apps["items"]]
+    apps = (await kube.custom.list_cluster_custom_object(**crd))["items"]
+    return [app for app in apps if _is_watched(app["metadata"]["namespace"])]
+
+
+def _is_pattern(namespace: str) -> bool:
+    return namespace.startswith("!") or any(c in namespace for c in "*?[")
+
+
+def _is_watched(namespace: str) -> bool:
+    if not watched_namespaces:
+        return True
+    included = [p for p in watched_namespaces if not p.startswith("!")]
+    excluded = [p[1:] for p in watched_namespaces if p.startswith("!")]
+    return (not included or any(fnmatch.fnmatchcase(namespace, p) for p in included)) and not any(
+        fnmatch.fnmatchcase(namespace, p) for p in excluded
+    )
+
+
+@kopf.on.startup()
+async def start_watches(**_):
+    """Follow labelled Services, Secrets and ConfigMaps, per watched namespace when no globs are involved.
+
+    Startup handlers finish before kopf runs any ModalApp handler, so the
+    first reconciles already see every owned Service in the cache.
+    """
+    namespaces = [] if any(_is_pattern(ns) for ns in watched_namespaces) else watched_namespaces
+    started = [ServiceWatcher(kube, service_cache, namespaces)]
+    started += [
+        EnvSourceWatcher(kube, kind, env_cache, _env_source_changed, namespaces) for kind in (SECRET, CONFIG_MAP)
+    ]
+    for watcher in started:
+        await watcher.start()
+        watchers.append(watcher)
+
 
-    if result.url:
-        owner_ref = _owner_ref(meta)
+@kopf.on.startup()
+async def resolve_workspace(**_):
+    workspace = await deployer.workspace()
+    logger.info("resolved Modal workspace", workspace=workspace)
+
+
+@kopf.on.cleanup()
+async def shutdown(**_):
+    if inventory_warmer is not None:
+        inventory_warmer.cancel()
+    for watcher in watchers:
+        watcher.stop()
+    if shard_coordinator is not None:
+        await shard_coordinator.stop()
+    if leader_elector is not None:
+        await leader_elector.stop()
+    if deployer is not None:
+        await asyncio.get_running_loop().run_in_executor(None, deployer.close)
+    if kube is not None:
+        kube.close()
+
+
+_ACTIONS = {
+    Priority.CREATE: ("Deployed", "deployed", "deploy failed"),
+    Priority.UPDATE: ("Updated", "updated", "update deploy failed"),
+    Priority.RESUME: ("Resumed", "resumed", "resume deploy failed"),
+}
+
+
+def _owns(namespace, name) -> bool:
+    if shard_coordinator is not None:
+        return shard_coordinator.owns(namespace, name)
+    if leader_elector is not None:
+        return leader_elector.owns(namespace, name)
+    return True
+
+
+def _owned(namespace, name, **_):
+    return _owns(namespace, name)
+
+
+async def _rebalanced(previous: HashRing, ring: HashRing):
+    """Hand ModalApps over after a membership change.
+
+    Apps this replica lost are dropped from its caches. Apps it gained are
+    annotated with the new owner, which produces a watch event so kopf
+    reconciles them here, and finalizers left by replicas that are no longer
+    members are removed so those apps can still be deleted.
+    """
+    identity = shard_coordinator.identity
+    apps = await _list_modal_apps()
+    owned, gained = 0, []
+    for app in apps:
+        key = (app["metadata"]["namespace"], app["metadata"]["name"])
+        was_owner, is_owner = previous.owner(key) == identity, ring.owner(key) == identity
+        owned += is_owner
+        if was_owner and not is_owner:
+            env_cache.untrack(key)
+            status_writer.forget(key)
+            if env_redeployer is not None:
+                env_redeployer.untrack(key)
+        elif is_owner and not was_owner:
+            gained.append(app)
+    shard_owned_apps.set(owned)
+    await _take_over_all(gained, ring.members)
+
+
+async def _elected():
+    """Take over every ModalApp after winning the leader lease.
+
+    The standby's watches and caches are already warm, and takeover only
+    annotates each app so kopf runs its handlers here. Apps whose deploy
+    inputs are unchanged are verified rather than redeployed. Running apps
+    are tracked for envFrom changes right away, since an app this replica
+    already owned before stepping down gets no new watch event.
+    """
+    apps = await _list_modal_apps()
+    for app in apps:
+        status = ModalAppStatus(**(app.get("status") or {}))
+        if status.phase == "Running" and status.deployHash:
+            metadata, app_spec = app["metadata"], ModalAppSpec(**app["spec"])
+            app_name = app_spec.appName or metadata["name"]
+            _track_deployed(metadata["namespace"], metadata["name"], app_name, app_spec, status.deployHash)
+    await _take_over_all(apps, frozenset({operator_config.pod_name}))
+
+
+def _demoted():
+    """Stop redeploying on envFrom changes once another replica may be the leader."""
+    if env_redeployer is not None:
+        env_redeployer.clear()
+
+
+async def _take_over_all(apps, members: frozenset):
+    """Take over every app in ``apps``; raises after trying them all if any failed, so the caller retries."""
+    failed = 0
+    for app in apps:
         try:
-            resource_manager.create_external_service(
-                name=name,
-                namespace=namespace,
-                modal_url=result.url,
-                service_port=app_spec.servicePort,
-                owner_ref=owner_ref,
+            await _take_over(app, members)
+        except Exception as e:
+            failed += 1
+            metadata = app["metadata"]
+            logger.warning(
+                "failed to take over ModalApp", namespace=metadata["namespace"], app=metadata["name"], error=str(e)
             )
-        except ApiException as e:
-            if e.status == 409:
-                resource_manager.update_external_service(name, namespace, result.url, app_spec.servicePort)
-            else:
-                raise
+    if failed:
+        raise RuntimeError(f"{failed} of {len(apps)} ModalApps were not taken over")
+
+
+async def _take_over(app, members: frozenset):
+    """Make this replica the owner of ``app``.
+
+    Finalizers of replicas that are no longer ``members``, and kopf's
+    default finalizer and annotations from before replicas were enabled,
+    are swapped for this replica's own in the same patch, so kopf still runs
+    the delete handler here. An app that is already being deleted cannot
+    gain a finalizer, so unless it already carries this replica's, it is
+    stopped right away and the stale finalizers are only removed once that
+    succeeded. Raises if the takeover failed.
+    """
+    metadata = app["metadata"]
+    namespace, name = metadata["namespace"], metadata["name"]
+    identity = operator_config.pod_name
+    suffix = f".{REPLICA_DOMAIN}/finalizer"
+    finalizers = metadata.get("finalizers") or []
+    stale = {f.removesuffix(suffix) for f in finalizers if f.endswith(suffix)} - members
+    annotations = metadata.get("annotations") or {}
+    legacy = LEGACY_FINALIZER in finalizers or any(key.startswith(LEGACY_KOPF_PREFIX) for key in annotations)
+    if annotations.get(OWNER_ANNOTATION) == identity and not stale and not legacy:
+        return
+    kept = [f for f in finalizers if f != LEGACY_FINALIZER and f.removesuffix(suffix) not in stale]
+    released = kept != finalizers
+    own = f"{identity}{suffix}"
+    if released and own not in kept and metadata.get("deletionTimestamp"):
+        app_name = (app.get("spec") or {}).get("appName", name)
+        if not await _stop(app_name, name, namespace):
+            raise RuntimeError(f"could not stop {app_name} before releasing its finalizer")
+        logger.info("stopped ModalApp deleted during handover", namespace=namespace, app=name)
+    elif released and own not in kept:
+        kept.append(own)
+    patch = {OWNER_ANNOTATION: identity}
+    for key in annotations:
+        if key.startswith(LEGACY_KOPF_PREFIX) or any(key.startswith(f"{member}.{REPLICA_DOMAIN}/") for member in stale):
+            patch[key] = None
+    body = {"metadata": {"resourceVersion": metadata["resourceVersion"], "annotations": patch}}
+    if kept != finalizers:
+        body["metadata"]["finalizers"] = kept
+    await kube.custom.patch_namespaced_custom_object(
+        group="modal.internal.io",
+        version="v1alpha1",
+        namespace=namespace,
+        plural="modalapps",
+        name=name,
+        body=body,
+    )
 
-    status = {
-        "phase": "Running",
-        "url": result.url,
-        "appId": result.app_id,
-        "lastDeployed": datetime.now(timezone.utc).isoformat(),
-        "message": f"Deployed. Access at {name}.{namespace}.svc.cluster.local",
-    }
-    _patch_status(name, namespace, status)
-    log.info("deployed", url=result.url)
-    return status
+
+@contextlib.asynccontextmanager
+async def _deploy_lock(namespace, name):
+    if deploy_locks is None:
+        yield
+        return
+    try:
+        async with deploy_locks.hold(namespace, name):
+            yield
+    except DeployLockHeld as e:
+        raise kopf.TemporaryError(f"Waiting for {e.holder} to finish deploying", delay=30) from e
+
+
+@kopf.on.create("modal.internal.io", "v1alpha1", "modalapps", when=_owned)
+async def create_modal_app(spec, name, namespace, meta, status, **kwargs):
+    await _reconcile(spec, name, namespace, meta, status, Priority.CREATE)
+
+
+@kopf.on.resume("modal.internal.io", "v1alpha1", "modalapps", when=_owned)
+async def resume_modal_app(spec, name, namespace, meta, status, **kwargs):
+    await _reconcile(spec, name, namespace, meta, status, Priority.RESUME)
+    resume_coordinator.done(namespace, name)
 
 
-@kopf.on.resume("modal.internal.io", "v1alpha1", "modalapps")
-async def resume_modal_app(spec, name, namespace, meta, **kwargs):
+@kopf.on.update("modal.internal.io", "v1alpha1", "modalapps", when=_owned)
+async def update_modal_app(spec, name, namespace, meta, status, **kwargs):
+    await _reconcile(spec, name, namespace, meta, status, Priority.UPDATE)
+
+
+async def _reconcile(spec, name, namespace, meta, status, priority: Priority):
     app_spec = ModalAppSpec(**spec)
     app_name = app_spec.appName or name
     log = logger.bind(app=app_name, namespace=namespace)
+    verb, done_event, failed_event = _ACTIONS[priority]
 
+    env_cache.track((namespace, name), namespace, app_spec.envFrom)
     env_vars = app_spec.env.copy()
-    if app_spec.envFrom:
-        env_vars.update(_read_env_from(app_spec.envFrom, namespace))
-
-    start = time.monotonic()
-    result: DeployResult = await deployer.deploy_app(app_name, app_spec.source, env_vars)
-    deploy_duration.observe(time.monotonic() - start)
+    env_vars.update(await env_cache.resolve(namespace, app_spec.envFrom))
+    deploy_hash = compute_deploy_hash(app_name, app_spec.source, env_vars, operator_config.deploy_hash_key)
+
+    status_writer.observe((namespace, name), status)
+    current = ModalAppStatus(**(status or {}))
+    if await _is_current(app_name, current, deploy_hash, priority):
+        deploys_skipped.labels(namespace=namespace).inc()
+        if priority != Priority.UPDATE:
+            apps_active.inc()
+        await _ensure_services(name, namespace, meta, _status_endpoints(current), app_spec.servicePort)
+        _track_deployed(namespace, name, app_name, app_spec, deploy_hash)
+        log.info("deploy inputs unchanged, skipping deploy", deploy_hash=deploy_hash)
+        return current.model_dump(exclude_none=True)
+
+    if priority == Priority.RESUME:
+        await resume_coordinator.admit()
+    result = await _deploy(app_name, namespace, name, app_spec.source, env_vars, priority)
 
     if not result.success:
         apps_failed.labels(namespace=namespace).inc()
-        _patch_status(name, namespace, {"phase": "Failed", "message": result.error})
-        log.error("resume deploy failed", error=result.error)
+        await _patch_status(name, namespace, {"phase": "Failed", "message": result.error})
+        log.error(failed_event, error=result.error)
         raise kopf.TemporaryError(f"Deploy failed: {result.error}", delay=30)
 
     apps_deployed.labels(namespace=namespace).inc()
-    apps_active.inc()
+    if priority != Priority.UPDATE:
+        apps_active.inc()
 
-    if result.url:
-        owner_ref = _owner_ref(meta)
-        try:
-            resource_manager.create_external_service(
-                name=name,
-                namespace=namespace,
-                modal_url=result.url,
-                service_port=app_spec.servicePort,
-                owner_ref=owner_ref,
-            )
-        except ApiException as e:
-            if e.status == 409:
-                resource_manager.update_external_service(name, namespace, result.url, app_spec.servicePort)
-            else:
-                raise
+    services = await _ensure_services(name, namespace, meta, result.endpoints, app_spec.servicePort)
 
-    status = {
+    new_status = {
         "phase": "Running",
         "url": result.url,
+        "endpoints": _endpoint_status(result.endpoints, services),
         "appId": result.app_id,
+        "deployHash": deploy_hash,
         "lastDeployed": datetime.now(timezone.utc).isoformat(),
-        "message": f"Resumed. Access at {name}.{namespace}.svc.cluster.local",
+        "message": f"{verb}. Access at {name}.{namespace}.svc.cluster.local",
     }
-    _patch_status(name, namespace, status)
-    log.info("resumed", url=result.url)
-    return status
+    await _patch_status(name, namespace, new_status)
+    _track_deployed(namespace, name, app_name, app_spec, deploy_hash)
+    log.info(done_event, url=result.url)
+    return new_status
+
+
+def _track_deployed(namespace, name, app_name, app_spec: ModalAppSpec, deploy_hash):
+    if env_redeployer is None:
+        return
+    env_redeployer.track(
+        (namespace, name),
+        TrackedApp(
+            app_name=app_name,
+            source=app_spec.source,
+            env=app_spec.env.copy(),
+            env_from=list(app_spec.envFrom),
+            deploy_hash=deploy_hash,
+        ),
+    )
 
 
-@kopf.on.update("modal.internal.io", "v1alpha1", "modalapps")
-async def update_modal_app(spec, name, namespace, meta, **kwargs):
-    app_spec = ModalAppSpec(**spec)
-    app_name = app_spec.appName or name
-    log = logger.bind(app=app_name, namespace=namespace)
+async def _is_current(app_name, current: ModalAppStatus, deploy_hash, priority: Priority) -> bool:
+    if current.phase != "Running" or current.deployHash != deploy_hash:
+        return False
+    if priority != Priority.RESUME:
+        return True
+    if not resume_coordinator.verify:
+        return False
+    live = await resume_coordinator.live_apps()
+    return live is None or app_name in live
 
-    env_vars = app_spec.env.copy()
-    if app_spec.envFrom:
-        env_vars.update(_read_env_from(app_spec.envFrom, namespace))
 
-    start = time.monotonic()
-    result: DeployResult = await deployer.deploy_app(app_name, app_spec.source, env_vars)
-    deploy_duration.observe(time.monotonic() - start)
+def _status_endpoints(current: ModalAppStatus):
+    endpoints = [Endpoint(function=e.function, url=e.url) for e in current.endpoints]
+    if not endpoints and current.url:
+        endpoints = [Endpoint(function="serve", url=current.url)]
+    return endpoints
 
-    if not result.success:
-        apps_failed.labels(namespace=namespace).inc()
-        _patch_status(name, namespace, {"phase": "Failed", "message": result.error})
-        log.error("update deploy failed", error=result.error)
-        raise kopf.TemporaryError(f"Deploy failed: {result.error}", delay=30)
 
-    if result.url:
-        resource_manager.update_external_service(name, namespace, result.url, app_spec.servicePort)
+async def _ensure_services(name, namespace, meta, endpoints, service_port) -> Dict[str, Endpoint]:
+    """Reconcile the app's Services; returns the endpoint behind each Service.
 
-    status = {
-        "phase": "Running",
-        "url": result.url,
-        "appId": result.app_id,
-        "lastDeployed": datetime.now(timezone.utc).isoformat(),
-        "message": f"Updated. Access at {name}.{namespace}.svc.cluster.local",
-    }
-    _patch_status(name, namespace, status)
-    log.info("updated", url=result.url)
+    Runs even without endpoints, so the Services of endpoints an app dropped are deleted.
+    """
+    return await resource_manager.reconcile_services(name, namespace, endpoints, service_port, _owner_ref(meta))
+
+
+def _endpoint_status(endpoints, services: Dict[str, Endpoint]) -> List[dict]:
+    """``.status.endpoints``: each endpoint with every Service routing to it.
+
+    The first endpoint of a multi-endpoint app has two Services, ``<name>`` and
+    ``<name>-<function>``; ``service`` keeps the endpoint's own (last) one.
+    """
+    status = []
+    for endpoint in endpoints:
+        names = [svc_name for svc_name, target in services.items() if target.function == endpoint.function]
+        entry = {"function": endpoint.function, "url": endpoint.url, "service": names[-1] if names else None}
+        if names:
+            entry["services"] = names
+        status.append(entry)
     return status
 
 
-@kopf.on.delete("modal.internal.io", "v1alpha1", "modalapps")
+@kopf.on.delete("modal.internal.io", "v1alpha1", "modalapps", when=_owned)
 async def delete_modal_app(spec, name, namespace, **kwargs):
     app_name = spec.get("appName", name)
     log = logger.bind(app=app_name, namespace=namespace)
 
-    await deployer.stop_app(app_name)
-    resource_manager.delete_service(name, namespace)
+    await _stop(app_name, name, namespace)
     apps_active.dec()
-
     log.info("deleted")
 
 
-def _read_env_from(env_from_list, namespace):
-    core_api = client.CoreV1Api()
-    env_vars = {}
+async def _stop(app_name, name, namespace) -> bool:
+    """Stop the Modal app, delete its Services and drop it from every cache; False if the stop failed."""
+    async with _deploy_lock(namespace, name):
+        stopped = await deployer.stop_app(app_name)
+    await resource_manager.delete_services(name, namespace)
+    resume_coordinator.done(namespace, name)
+    env_cache.untrack((namespace, name))
+    status_writer.forget((namespace, name))
+    if env_redeployer is not None:
+        env_redeployer.untrack((namespace, name))
+    return stopped
+
+
+@kopf.timer(
+    "modal.internal.io",
+    "v1alpha1",
+    "modalapps",
+    interval=SERVICE_DRIFT_INTERVAL,
+    initial_delay=SERVICE_DRIFT_INTERVAL,
+    when=_owned,
+)
+async def repair_services(spec, name, namespace, meta, status, **kwargs):
+    """Restore Services that were edited or deleted out from under a running app, without redeploying."""
+    current = ModalAppStatus(**(status or {}))
+    if current.phase != "Running":
+        return
+    app_spec = ModalAppSpec(**spec)
+    await _ensure_services(name, namespace, meta, _status_endpoints(current), app_spec.servicePort)
+
+
+def _standby_enabled(**_):
+    return leader_elector is not None
+
 
-    for env_from in env_from_list:
-        if env_from.secretRef:
-            secret_name = env_from.secretRef["name"]
-            secret = core_api.read_namespaced_secret(secret_name, namespace)
-            if secret.data:
-                for key, value in secret.data.items():
-                    env_vars[key] = base64.b64decode(value).decode()
+@kopf.on.event("modal.internal.io", "v1alpha1", "modalapps", when=_standby_enabled)
+async def modal_app_event(type, body, namespace, name, **_):
+    """Track every app's envFrom sources, so a standby keeps its Secret/ConfigMap cache warm too."""
+    if type == "DELETED":
+        env_cache.untrack((namespace, name))
+    else:
+        env_cache.track((namespace, name), namespace, ModalAppSpec(**body["spec"]).envFrom)
 
-        if env_from.configMapRef:
-            cm_name = env_from.configMapRef["name"]
-            cm = core_api.read_namespaced_config_map(cm_name, namespace)
-            if cm.data:
-                env_vars.update(cm.data)
 
-    return env_vars
+async def _deploy(app_name, namespace, name, source, env_vars, priority: Priority) -> DeployResult:
+    async def _run():
+        # Take the deploy lock only once the scheduler admits the deploy, so time spent queued
+        # does not eat into the lock's fixed duration.
+        async with _deploy_lock(namespace, name):
+            start = time.monotonic()
+            result = await deployer.deploy_app(app_name, source, env_vars)
+            deploy_duration.observe(time.monotonic() - start)
+            return result
+
+    return await scheduler.run(namespace, priority, _run)
+
+
+def _env_source_changed(kind, namespace, name, data):
+    if not _is_watched(namespace):
+        return
+    if env_cache.observe(kind, namespace, name, data) and env_redeployer is not None:
+        env_redeployer.changed(kind, namespace, name)
+
+
+async def _request_redeploy(app: AppKey, deploy_hash: str):
+    """Bump the env-hash annotation so the update handler redeploys with the new values."""
+    namespace, name = app
+    if not _owns(namespace, name):
+        return
+    await kube.custom.patch_namespaced_custom_object(
+        group="modal.internal.io",
+        version="v1alpha1",
+        namespace=namespace,
+        plural="modalapps",
+        name=name,
+        body={"metadata": {"annotations": {ENV_HASH_ANNOTATION: deploy_hash}}},
+    )
+
+
+async def _fetch_env_source(kind, namespace, name):
+    if kind == SECRET:
+        return decode_secret_data((await kube.core.read_namespaced_secret(name, namespace)).data)
+    return dict((await kube.core.read_namespaced_config_map(name, namespace)).data or {})
 
 
 def _owner_ref(meta):
@@ -227,9 +643,12 @@ def _owner_ref(meta):
     )
 
 
-def _patch_status(name, namespace, status_body):
-    api = client.CustomObjectsApi()
-    api.patch_namespaced_custom_object_status(
+async def _patch_status(name, namespace, status_body):
+    await status_writer.update((namespace, name), status_body)
+
+
+async def _write_status(namespace, name, status_body):
+    await kube.custom.patch_namespaced_custom_object_status(
         group="modal.internal.io",
         version="v1alpha1",
         namespace=namespace,
@@ -0,0 +1,62 @@
+import asyncio
+import signal
+
+import structlog
+from aiohttp import web
+
+from modal_operator.__main__ import configure_logging
+from modal_operator.config import ProxyConfig
+from modal_operator.health import mark_ready, start_health_server
+from modal_operator.kube import KubeClient, load_config
+from modal_operator.metrics import start_metrics_server
+from modal_operator.proxy.cache import RouteTable, RouteWatcher
+from modal_operator.proxy.responses import ResponseCache
+from modal_operator.proxy.server import ModalProxy
+
+logger = structlog.get_logger(__name__)
+
+
+async def serve(proxy_config: ProxyConfig):
+    load_config()
+    kube = KubeClient()
+    routes = RouteTable(cluster_domain=proxy_config.cluster_domain)
+    watcher = RouteWatcher(kube, routes, proxy_config.watch_namespaces)
+    proxy = ModalProxy(
+        routes,
+        proxy_config.auth_token_id,
+        proxy_config.auth_token_secret,
+        auth_hosts=proxy_config.auth_hosts,
+        connect_timeout=proxy_config.connect_timeout,
+        pool_size=proxy_config.upstream_pool_size,
+        pool_per_host=proxy_config.upstream_pool_per_host,
+        idle_timeout=proxy_config.upstream_idle_timeout,
+        cache=ResponseCache(proxy_config.cache_max_bytes, proxy_config.cache_max_entry_bytes),
+    )
+    start_health_server()
+    start_metrics_server()
+    await watcher.start()
+    await proxy.start()
+    runner = web.AppRunner(proxy.app(), access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, port=proxy_config.port).start()
+    logger.info("modal-proxy listening", port=proxy_config.port)
+    mark_ready()
+
+    stopping = asyncio.Event()
+    asyncio.get_running_loop().add_signal_handler(signal.SIGTERM, stopping.set)
+    try:
+        await stopping.wait()
+    finally:
+        await runner.cleanup()
+        await proxy.close()
+        watcher.stop()
+        kube.close()
+
+
+def main():
+    configure_logging()
+    asyncio.run(serve(ProxyConfig.from_env()))
+
+
+if __name__ == "__main__":
+    main()
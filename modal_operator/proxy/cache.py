@@ -0,0 +1,139 @@
+import time
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, NamedTuple, Optional, Sequence, Tuple
+
+import structlog
+from kubernetes import client
+
+from modal_operator.kube import KubeClient, ListWatcher
+from modal_operator.metrics import proxy_routes, proxy_watch_lag
+
+logger = structlog.get_logger(__name__)
+
+GROUP, VERSION, PLURAL = "modal.internal.io", "v1alpha1", "modalapps"
+
+Key = Tuple[str, str]
+
+
+class Route(NamedTuple):
+    url: str
+    cache: bool = False
+
+
+def app_routes(app: Dict[str, Any]) -> Dict[str, Route]:
+    """Route for each Service of a ModalApp, from its ``.status.endpoints``.
+
+    Statuses written before ``services`` was recorded name only each endpoint's
+    own Service; the ``<name>`` Service of their first endpoint is added here.
+    """
+    status = app.get("status") or {}
+    cache = bool((app.get("spec") or {}).get("proxyCache"))
+    endpoints = [endpoint for endpoint in status.get("endpoints") or [] if endpoint.get("url")]
+    routes = {
+        service: Route(endpoint["url"], cache)
+        for endpoint in endpoints
+        for service in endpoint.get("services") or [endpoint.get("service")]
+        if service
+    }
+    if endpoints and "services" not in endpoints[0] and endpoints[0].get("service"):
+        routes.setdefault(app["metadata"]["name"], Route(endpoints[0]["url"], cache))
+    if not routes and status.get("url"):
+        routes[app["metadata"]["name"]] = Route(status["url"], cache)
+    return routes
+
+
+def _changed_at(app: Dict[str, Any]) -> Optional[float]:
+    """When the object was last written, from its managed fields (to the second)."""
+    times = [entry.get("time") for entry in app["metadata"].get("managedFields") or [] if entry.get("time")]
+    if not times:
+        return None
+    return max(datetime.fromisoformat(t.replace("Z", "+00:00")) for t in times).timestamp()
+
+
+class RouteTable:
+    """Host header to Route for every ModalApp Service.
+
+    Each Service is reachable as ``name.ns``, ``name.ns.svc`` and
+    ``name.ns.svc.<cluster_domain>``, and as a bare ``name`` while no other
+    namespace has a Service of that name. Every change builds a new host map
+    and swaps it in whole, so a lookup is a single dict read that never sees
+    a half-applied update.
+    """
+
+    def __init__(self, cluster_domain: str = "cluster.local"):
+        self.cluster_domain = cluster_domain
+        self._apps: Dict[Key, Dict[str, Route]] = {}
+        self._hosts: Dict[str, Route] = {}
+
+    def lookup(self, host: str) -> Optional[Route]:
+        return self._hosts.get(host.partition(":")[0].lower().rstrip("."))
+
+    def replace(self, apps: Iterable[Dict[str, Any]], namespace: Optional[str] = None):
+        """Load a full listing of ``namespace``, or of every namespace when None."""
+        kept = {key: routes for key, routes in self._apps.items() if namespace is not None and key[0] != namespace}
+        for app in apps:
+            kept[(app["metadata"]["namespace"], app["metadata"]["name"])] = app_routes(app)
+        self._apps = kept
+        self._rebuild()
+
+    def apply(self, event_type: str, app: Dict[str, Any]):
+        key = (app["metadata"]["namespace"], app["metadata"]["name"])
+        routes = {} if event_type == "DELETED" else app_routes(app)
+        if self._apps.get(key, {}) == routes:
+            return
+        if routes:
+            self._apps[key] = routes
+        else:
+            self._apps.pop(key, None)
+        self._rebuild()
+
+    def _rebuild(self):
+        hosts: Dict[str, Route] = {}
+        bare: Dict[str, List[Route]] = {}
+        for (namespace, _), routes in self._apps.items():
+            for service, route in routes.items():
+                for suffix in ("", ".svc", f".svc.{self.cluster_domain}"):
+                    hosts[f"{service}.{namespace}{suffix}"] = route
+                bare.setdefault(service, []).append(route)
+        for service, matches in bare.items():
+            if len(matches) == 1:
+                hosts[service] = matches[0]
+        self._hosts = hosts
+        proxy_routes.set(len(hosts))
+
+
+class RouteWatcher(ListWatcher):
+    """Keeps a RouteTable in step with ModalApps through a list-then-watch."""
+
+    name = "route-watch"
+
+    def __init__(
+        self,
+        kube: KubeClient,
+        table: RouteTable,
+        namespaces: Sequence[str] = (),
+        watch_timeout: int = 300,
+        retry_delay: float = 5.0,
+    ):
+        super().__init__(kube, namespaces, watch_timeout, retry_delay)
+        self.table = table
+        self._api = client.CustomObjectsApi(kube.api_client)
+
+    async def _list(self, namespace: Optional[str]) -> str:
+        if namespace is None:
+            listed = await self.kube.custom.list_cluster_custom_object(GROUP, VERSION, PLURAL)
+        else:
+            listed = await self.kube.custom.list_namespaced_custom_object(GROUP, VERSION, namespace, PLURAL)
+        self.table.replace(listed.get("items", []), namespace)
+        return listed["metadata"]["resourceVersion"]
+
+    def _stream(self, namespace: Optional[str], version: str):
+        if namespace is None:
+            return self._watch(self._api.list_cluster_custom_object, GROUP, VERSION, PLURAL, version=version)
+        return self._watch(self._api.list_namespaced_custom_object, GROUP, VERSION, namespace, PLURAL, version=version)
+
+    def _observe(self, event_type: str, app: Dict[str, Any]):
+        self.table.apply(event_type, app)
+        changed_at = _changed_at(app)
+        if changed_at is not None:
+            proxy_watch_lag.observe(max(0.0, time.time() - changed_at))
@@ -0,0 +1,144 @@
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Mapping, Optional, Tuple
+
+from aiohttp import web
+from multidict import CIMultiDict
+
+from modal_operator.metrics import proxy_cache_bytes, proxy_cache_evictions
+
+# Request headers that select a different representation of the same URL. Requests that differ in
+# any of them are neither coalesced nor served each other's cached responses.
+KEY_HEADERS = ("Accept", "Accept-Encoding", "Accept-Language", "Authorization", "Cookie")
+CACHEABLE_STATUSES = frozenset({200, 203, 204, 300, 301, 404, 410})
+
+Key = Tuple[str, ...]
+
+
+def request_key(target: str, headers: Mapping[str, str]) -> Key:
+    return (target, *(headers.get(name, "") for name in KEY_HEADERS))
+
+
+def _directives(value: str) -> dict:
+    directives = {}
+    for item in value.split(","):
+        name, _, argument = item.strip().partition("=")
+        if name:
+            directives[name.lower()] = argument.strip('"')
+    return directives
+
+
+def bypasses_cache(headers: Mapping[str, str]) -> bool:
+    """Whether the client asked for a fresh response (``Cache-Control: no-cache``/``no-store``)."""
+    directives = _directives(headers.get("Cache-Control", ""))
+    return "no-cache" in directives or "no-store" in directives or headers.get("Pragma") == "no-cache"
+
+
+def _varies_outside_key(headers: Mapping[str, str]) -> bool:
+    varies = {name.strip().lower() for name in headers.get("Vary", "").split(",") if name.strip()}
+    return bool(varies - {name.lower() for name in KEY_HEADERS})
+
+
+def shareable(headers: Mapping[str, str]) -> bool:
+    """Whether a response may also answer identical requests that were waiting for it.
+
+    Looser than ``freshness()``: a response that must not be stored can
+    still be shared with requests already in flight, unless it is
+    ``private``/``no-store``, sets cookies, or varies on headers outside
+    the cache key.
+    """
+    directives = _directives(headers.get("Cache-Control", ""))
+    if {"no-store", "private"} & directives.keys() or "Set-Cookie" in headers:
+        return False
+    return not _varies_outside_key(headers)
+
+
+def freshness(status: int, headers: Mapping[str, str], request_headers: Mapping[str, str]) -> float:
+    """Seconds a shared cache may serve this response for, 0 if it must not store it.
+
+    Only explicit ``s-maxage``/``max-age`` lifetimes are honored; there is
+    no heuristic caching. Responses that vary on headers outside the cache
+    key, set cookies, or answer a request with credentials without being
+    marked ``public`` are not stored.
+    """
+    if status not in CACHEABLE_STATUSES or "Set-Cookie" in headers:
+        return 0.0
+    directives = _directives(headers.get("Cache-Control", ""))
+    if {"no-store", "no-cache", "private"} & directives.keys():
+        return 0.0
+    if _varies_outside_key(headers):
+        return 0.0
+    if "Authorization" in request_headers and not ({"public", "s-maxage"} & directives.keys()):
+        return 0.0
+    try:
+        lifetime = float(directives.get("s-maxage") or directives.get("max-age") or 0)
+        age = float(headers.get("Age", 0))
+    except ValueError:
+        return 0.0
+    return max(0.0, lifetime - age)
+
+
+@dataclass
+class CachedResponse:
+    status: int
+    reason: str
+    headers: CIMultiDict
+    body: bytes
+    stored_at: float = 0.0
+    expires_at: float = 0.0
+
+    @property
+    def size(self) -> int:
+        return len(self.body) + sum(len(name) + len(value) for name, value in self.headers.items())
+
+    def response(self) -> web.Response:
+        headers = CIMultiDict(self.headers)
+        if self.stored_at:
+            # Stored responses passed freshness(), so any upstream Age header parses.
+            headers["Age"] = str(int(float(self.headers.get("Age", 0)) + time.monotonic() - self.stored_at))
+        return web.Response(status=self.status, reason=self.reason, headers=headers, body=self.body)
+
+
+class ResponseCache:
+    """LRU cache of complete upstream responses, bounded by total size.
+
+    Entries expire after the freshness lifetime their Cache-Control allows.
+    When storing a response would exceed ``max_bytes``, the least recently
+    used entries are evicted first; responses larger than
+    ``max_entry_bytes`` are never stored.
+    """
+
+    def __init__(self, max_bytes: int = 64 * 1024 * 1024, max_entry_bytes: int = 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.max_entry_bytes = max_entry_bytes
+        self._entries: "OrderedDict[Key, CachedResponse]" = OrderedDict()
+        self._bytes = 0
+
+    def get(self, key: Key) -> Optional[CachedResponse]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if entry.expires_at <= time.monotonic():
+            self._remove(key)
+            return None
+        self._entries.move_to_end(key)
+        return entry
+
+    def put(self, key: Key, entry: CachedResponse, ttl: float):
+        if ttl <= 0 or entry.size > min(self.max_entry_bytes, self.max_bytes):
+            return
+        if key in self._entries:
+            self._remove(key)
+        entry.stored_at = time.monotonic()
+        entry.expires_at = entry.stored_at + ttl
+        self._entries[key] = entry
+        self._bytes += entry.size
+        while self._bytes > self.max_bytes:
+            self._remove(next(iter(self._entries)))
+            proxy_cache_evictions.inc()
+        proxy_cache_bytes.set(self._bytes)
+
+    def _remove(self, key: Key):
+        self._bytes -= self._entries.pop(key).size
+        proxy_cache_bytes.set(self._bytes)
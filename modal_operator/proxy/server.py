@@ -0,0 +1,337 @@
+import asyncio
+import fnmatch
+import ssl
+import time
+from typing import Callable, Dict, Optional, Sequence, Tuple
+
+import aiohttp
+import structlog
+from aiohttp import web
+from multidict import CIMultiDict
+from yarl import URL
+
+from modal_operator.metrics import (
+    proxy_cache_lookups,
+    proxy_requests,
+    proxy_upstream_connect_seconds,
+    proxy_upstream_connections,
+    proxy_upstream_latency,
+    proxy_upstream_pool_wait,
+    proxy_websockets_open,
+)
+from modal_operator.proxy.cache import RouteTable
+from modal_operator.proxy.responses import (
+    CachedResponse,
+    Key,
+    ResponseCache,
+    bypasses_cache,
+    freshness,
+    request_key,
+    shareable,
+)
+
+logger = structlog.get_logger(__name__)
+
+HOP_BY_HOP = frozenset(
+    {
+        "connection",
+        "keep-alive",
+        "proxy-authenticate",
+        "proxy-authorization",
+        "proxy-connection",
+        "te",
+        "trailer",
+        "transfer-encoding",
+        "upgrade",
+    }
+)
+AUTH_HEADERS = frozenset({"modal-key", "modal-secret"})
+# Generated afresh for the upstream handshake
+WEBSOCKET_HANDSHAKE_HEADERS = (
+    "Sec-WebSocket-Key",
+    "Sec-WebSocket-Version",
+    "Sec-WebSocket-Extensions",
+    "Sec-WebSocket-Protocol",
+)
+
+
+def _end_to_end(headers, drop=frozenset()) -> CIMultiDict:
+    """Headers minus hop-by-hop ones, including any the Connection header names."""
+    listed = {h.strip().lower() for value in headers.getall("Connection", []) for h in value.split(",")}
+    return CIMultiDict(
+        (name, value) for name, value in headers.items() if name.lower() not in HOP_BY_HOP | listed | drop
+    )
+
+
+def _pool_tracing() -> aiohttp.TraceConfig:
+    """Records whether each upstream request reused a pooled connection and what opening one cost."""
+
+    async def started(session, ctx, params):
+        ctx.started = time.monotonic()
+
+    async def queued(session, ctx, params):
+        proxy_upstream_pool_wait.observe(time.monotonic() - ctx.started)
+
+    async def created(session, ctx, params):
+        proxy_upstream_connections.labels(result="new").inc()
+        proxy_upstream_connect_seconds.observe(time.monotonic() - ctx.started)
+
+    async def reused(session, ctx, params):
+        proxy_upstream_connections.labels(result="reused").inc()
+
+    tracing = aiohttp.TraceConfig()
+    tracing.on_connection_queued_start.append(started)
+    tracing.on_connection_queued_end.append(queued)
+    tracing.on_connection_create_start.append(started)
+    tracing.on_connection_create_end.append(created)
+    tracing.on_connection_reuseconn.append(reused)
+    return tracing
+
+
+async def _pump(source, sink):
+    """Relay WebSocket messages until ``source`` closes, then close ``sink`` with the same code."""
+    async for message in source:
+        if message.type == aiohttp.WSMsgType.TEXT:
+            await sink.send_str(message.data)
+        elif message.type == aiohttp.WSMsgType.BINARY:
+            await sink.send_bytes(message.data)
+    await sink.close(code=source.close_code or aiohttp.WSCloseCode.OK)
+
+
+class ModalProxy:
+    """Reverse proxy from in-cluster Service hostnames to Modal web endpoints.
+
+    The Host header picks the ModalApp Service, and the request is forwarded
+    to that endpoint's Modal URL with ``Modal-Key`` and ``Modal-Secret``
+    headers added, so clients need no Modal credentials and no TLS of their
+    own. The headers carry a proxy auth token, not the operator's deploy
+    token, and are only sent to upstream hosts matching ``auth_hosts``. Request and response bodies are streamed through
+    chunk by chunk, never buffered, and compressed bodies pass through as is.
+    Each chunk is written as soon as it arrives, and the next one is only
+    read once the client has taken it, so a slow client slows the upstream
+    down instead of filling the proxy's memory. WebSocket upgrades are
+    relayed message by message in the same way.
+
+    Upstream connections are kept alive and pooled per Modal host, so only
+    the first request on a connection pays for DNS, TCP and the TLS
+    handshake. At most ``pool_size`` connections are open in total and
+    ``pool_per_host`` to one host; further requests wait for a free one.
+    Connections idle for ``idle_timeout`` seconds are closed.
+
+    For ModalApps with ``proxyCache`` set, GETs are answered from ``cache``
+    while Cache-Control allows, and identical GETs that arrive while one is
+    already in flight wait for it and share its response instead of going
+    upstream themselves.
+    """
+
+    def __init__(
+        self,
+        routes: RouteTable,
+        token_id: str,
+        token_secret: str,
+        connect_timeout: float = 10.0,
+        pool_size: int = 200,
+        pool_per_host: int = 50,
+        idle_timeout: float = 60.0,
+        cache: Optional[ResponseCache] = None,
+        auth_hosts: Sequence[str] = ("*.modal.run",),
+    ):
+        self.routes = routes
+        self.cache = cache or ResponseCache()
+        self.connect_timeout = connect_timeout
+        self.pool_size = pool_size
+        self.pool_per_host = pool_per_host
+        self.idle_timeout = idle_timeout
+        self._auth = {"Modal-Key": token_id, "Modal-Secret": token_secret}
+        self._auth_hosts = [pattern.lower() for pattern in auth_hosts]
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._flights: Dict[Key, asyncio.Future] = {}
+
+    async def start(self):
+        connector = aiohttp.TCPConnector(
+            limit=self.pool_size,
+            limit_per_host=self.pool_per_host,
+            keepalive_timeout=self.idle_timeout,
+            ttl_dns_cache=300,
+            ssl=ssl.create_default_context(),
+        )
+        self._session = aiohttp.ClientSession(
+            connector=connector,
+            auto_decompress=False,
+            skip_auto_headers=("Accept-Encoding", "User-Agent"),
+            timeout=aiohttp.ClientTimeout(total=None, sock_connect=self.connect_timeout),
+            trace_configs=[_pool_tracing()],
+        )
+
+    async def close(self):
+        if self._session is not None:
+            await self._session.close()
+
+    def app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_route("*", "/{path:.*}", self.handle)
+        return app
+
+    def _sends_auth(self, host: Optional[str]) -> bool:
+        host = (host or "").lower().rstrip(".")
+        return any(fnmatch.fnmatchcase(host, pattern) for pattern in self._auth_hosts)
+
+    def _upstream_headers(self, request: web.BaseRequest, target: URL) -> CIMultiDict:
+        headers = _end_to_end(request.headers, drop=AUTH_HEADERS | {"host"})
+        if self._sends_auth(target.host):
+            headers.update(self._auth)
+        if request.remote:
+            forwarded_for = request.headers.get("X-Forwarded-For")
+            headers["X-Forwarded-For"] = f"{forwarded_for}, {request.remote}" if forwarded_for else request.remote
+        headers["X-Forwarded-Host"] = request.host
+        headers.setdefault("X-Forwarded-Proto", request.scheme)
+        return headers
+
+    async def handle(self, request: web.Request) -> web.StreamResponse:
+        route = self.routes.lookup(request.host)
+        if route is None:
+            proxy_requests.labels(code="404").inc()
+            return web.Response(status=404, text=f"no ModalApp serves {request.host}\n")
+
+        target = URL(route.url.rstrip("/") + request.raw_path, encoded=True)
+        if request.headers.get("Upgrade", "").lower() == "websocket":
+            return await self._proxy_websocket(request, target)
+        if route.cache and request.method == "GET" and not request.body_exists:
+            return await self._proxy_cached(request, target)
+        response, _ = await self._proxy_http(request, target)
+        return response
+
+    async def _proxy_cached(self, request: web.Request, target: URL) -> web.StreamResponse:
+        """Serve a GET from the cache, from an identical in-flight request, or by fetching it once for all."""
+        if bypasses_cache(request.headers):
+            proxy_cache_lookups.labels(result="bypass").inc()
+            response, _ = await self._proxy_http(request, target)
+            return response
+        key = request_key(str(target), request.headers)
+        cached = self.cache.get(key)
+        if cached is not None:
+            proxy_cache_lookups.labels(result="hit").inc()
+            proxy_requests.labels(code=str(cached.status)).inc()
+            return cached.response()
+
+        flight = self._flights.get(key)
+        if flight is not None:
+            proxy_cache_lookups.labels(result="coalesced").inc()
+            shared = await asyncio.shield(flight)
+            if shared is None:
+                # The response could not be shared (too large, streamed, private, or the request failed).
+                response, _ = await self._proxy_http(request, target)
+                return response
+            proxy_requests.labels(code=str(shared.status)).inc()
+            return shared.response()
+
+        proxy_cache_lookups.labels(result="miss").inc()
+        flight = self._flights[key] = asyncio.get_running_loop().create_future()
+
+        def release(shared: Optional[CachedResponse] = None):
+            if self._flights.get(key) is flight:
+                del self._flights[key]
+            if not flight.done():
+                flight.set_result(shared)
+
+        shared, ttl = None, 0.0
+        try:
+            # A streamed response is never shared: let waiters go upstream as soon as the headers say so.
+            response, whole = await self._proxy_http(
+                request, target, buffer_limit=self.cache.max_entry_bytes, on_stream=release
+            )
+            if whole is not None:
+                ttl = freshness(whole.status, whole.headers, request.headers)
+                if ttl > 0 or shareable(whole.headers):
+                    shared = whole
+        finally:
+            release(shared)
+        if shared is not None:
+            self.cache.put(key, shared, ttl)
+        return response
+
+    async def _proxy_http(
+        self,
+        request: web.Request,
+        target: URL,
+        buffer_limit: int = 0,
+        on_stream: Optional[Callable[[], None]] = None,
+    ) -> Tuple[web.StreamResponse, Optional[CachedResponse]]:
+        """Forward the request; responses with a Content-Length up to ``buffer_limit`` are also returned whole.
+
+        ``on_stream`` is called once the headers show the response will be streamed instead.
+        """
+        response = None
+        start = time.monotonic()
+        try:
+            async with self._session.request(
+                request.method,
+                target,
+                headers=self._upstream_headers(request, target),
+                data=request.content if request.body_exists else None,
+                allow_redirects=False,
+            ) as upstream:
+                proxy_upstream_latency.observe(time.monotonic() - start)
+                headers = _end_to_end(upstream.headers)
+                if buffer_limit and upstream.content_length is not None and upstream.content_length <= buffer_limit:
+                    headers.popall("Content-Length", None)
+                    whole = CachedResponse(upstream.status, upstream.reason, headers, await upstream.read())
+                    proxy_requests.labels(code=str(upstream.status)).inc()
+                    return whole.response(), whole
+                if on_stream is not None:
+                    on_stream()
+                response = web.StreamResponse(status=upstream.status, reason=upstream.reason)
+                response.headers.extend(headers)
+                await response.prepare(request)
+                if response.content_length is None:
+                    # Streamed responses (SSE, chunked token streams) get their headers right away instead of
+                    # with the first chunk. Older aiohttp versions always write headers immediately.
+                    send_headers = getattr(request.writer, "send_headers", None)
+                    if send_headers is not None:
+                        send_headers()
+                async for chunk in upstream.content.iter_any():
+                    await response.write(chunk)
+                await response.write_eof()
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            logger.warning("upstream request failed", host=request.host, upstream=target.host, error=str(e))
+            proxy_requests.labels(code="502").inc()
+            if response is not None and response.prepared:
+                # Too late for an error status; dropping the connection tells the client the body is truncated.
+                raise
+            return web.Response(status=502, text="bad gateway\n"), None
+        proxy_requests.labels(code=str(upstream.status)).inc()
+        return response, None
+
+    async def _proxy_websocket(self, request: web.Request, target: URL) -> web.StreamResponse:
+        headers = self._upstream_headers(request, target)
+        for name in WEBSOCKET_HANDSHAKE_HEADERS:
+            headers.popall(name, None)
+        protocols = [p.strip() for p in request.headers.get("Sec-WebSocket-Protocol", "").split(",") if p.strip()]
+        try:
+            upstream = await self._session.ws_connect(
+                target, headers=headers, protocols=protocols, max_msg_size=0, autoclose=False
+            )
+        except aiohttp.WSServerHandshakeError as e:
+            proxy_requests.labels(code=str(e.status)).inc()
+            return web.Response(status=e.status, text=f"{e.message}\n")
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            logger.warning("upstream websocket failed", host=request.host, upstream=target.host, error=str(e))
+            proxy_requests.labels(code="502").inc()
+            return web.Response(status=502, text="bad gateway\n")
+
+        downstream = web.WebSocketResponse(
+            protocols=[upstream.protocol] if upstream.protocol else (), max_msg_size=0, autoclose=False
+        )
+        proxy_requests.labels(code="101").inc()
+        proxy_websockets_open.inc()
+        try:
+            await downstream.prepare(request)
+            pumps = [asyncio.create_task(_pump(downstream, upstream)), asyncio.create_task(_pump(upstream, downstream))]
+            _, pending = await asyncio.wait(pumps, return_when=asyncio.FIRST_COMPLETED)
+            for pump in pending:
+                pump.cancel()
+        finally:
+            proxy_websockets_open.dec()
+            await upstream.close()
+            await downstream.close()
+        return downstream
@@ -0,0 +1,95 @@
+import asyncio
+from dataclasses import dataclass, field
+from typing import Awaitable, Callable, Dict, List, Optional, Set
+
+import structlog
+
+from modal_operator.crds import EnvFromSource
+from modal_operator.deployer import compute_deploy_hash
+from modal_operator.envcache import AppKey, EnvSourceCache
+from modal_operator.metrics import env_redeploys
+
+logger = structlog.get_logger(__name__)
+
+
+@dataclass
+class TrackedApp:
+    app_name: str
+    source: str
+    env: Dict[str, str]
+    env_from: List[EnvFromSource] = field(default_factory=list)
+    deploy_hash: Optional[str] = None
+
+
+class EnvRedeployer:
+    """Redeploys ModalApps whose ``envFrom`` Secrets or ConfigMaps changed.
+
+    Changes are debounced per app: a burst of updates to one or more sources
+    within ``window`` seconds results in a single check. The check recomputes
+    the deploy hash from the cached values and only calls ``trigger`` when it
+    differs from the hash of what is deployed.
+    """
+
+    def __init__(
+        self,
+        env_cache: EnvSourceCache,
+        trigger: Callable[[AppKey, str], Awaitable[None]],
+        window: float = 10.0,
+        hash_key: str = "",
+    ):
+        self.env_cache = env_cache
+        self.window = window
+        self.hash_key = hash_key
+        self._trigger = trigger
+        self._apps: Dict[AppKey, TrackedApp] = {}
+        self._timers: Dict[AppKey, asyncio.TimerHandle] = {}
+        self._tasks: Set[asyncio.Task] = set()
+
+    def track(self, app: AppKey, tracked: TrackedApp):
+        self._apps[app] = tracked
+
+    def untrack(self, app: AppKey):
+        self._apps.pop(app, None)
+        timer = self._timers.pop(app, None)
+        if timer is not None:
+            timer.cancel()
+
+    def clear(self):
+        """Stop tracking every app, e.g. when this replica is no longer the one handling them."""
+        for app in list(self._apps.keys() | self._timers.keys()):
+            self.untrack(app)
+
+    def changed(self, kind: str, namespace: str, name: str):
+        for app in self.env_cache.consumers(kind, namespace, name):
+            self._schedule(app)
+
+    def _schedule(self, app: AppKey):
+        timer = self._timers.pop(app, None)
+        if timer is not None:
+            timer.cancel()
+        loop = asyncio.get_running_loop()
+        self._timers[app] = loop.call_later(self.window, self._fire, app)
+
+    def _fire(self, app: AppKey):
+        self._timers.pop(app, None)
+        task = asyncio.create_task(self._check(app))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _check(self, app: AppKey):
+        tracked = self._apps.get(app)
+        if tracked is None:
+            return
+        namespace, name = app
+        log = logger.bind(app=tracked.app_name, namespace=namespace)
+        try:
+            env_vars = {**tracked.env, **await self.env_cache.resolve(namespace, tracked.env_from)}
+            deploy_hash = compute_deploy_hash(tracked.app_name, tracked.source, env_vars, self.hash_key)
+            if deploy_hash == tracked.deploy_hash:
+                log.debug("envFrom sources changed but resolved env did not")
+                return
+            log.info("envFrom values changed, redeploying")
+            env_redeploys.labels(namespace=namespace).inc()
+            await self._trigger(app, deploy_hash)
+        except Exception as e:
+            log.error("failed to redeploy after envFrom change", error=str(e))
@@ -1,81 +1,308 @@
+import hashlib
+import json
 import logging
-from typing import Any
+import re
+from typing import Any, Dict, List, Mapping, Optional, Sequence, Set, Tuple
 from urllib.parse import urlparse
 
 from kubernetes import client
 from kubernetes.client.exceptions import ApiException
 
+from modal_operator.deploy_output import Endpoint
+from modal_operator.kube import KubeClient, ListWatcher
+from modal_operator.metrics import services_applied
+
 logger = logging.getLogger(__name__)
 
+APP_LABEL = "modal.internal.io/app"
+FUNCTION_LABEL = "modal.internal.io/function"
+MANAGED_LABELS = frozenset({APP_LABEL, FUNCTION_LABEL})
+URL_ANNOTATION = "modal.internal.io/url"
+FIELD_MANAGER = "modal-operator"
+APPLY_PATCH = "application/apply-patch+yaml"
+
+
+def service_names(name: str, endpoints: Sequence[Endpoint]) -> List[Tuple[str, Endpoint]]:
+    """Service name for each endpoint of a ModalApp.
+
+    The first endpoint is always served as ``name``. When an app has more than
+    one endpoint, every endpoint also gets its own ``name-<function>`` Service.
+    Functions whose names slugify or truncate to a name already taken get a
+    short hash of the function name appended, so no endpoint is dropped.
+    """
+    if not endpoints:
+        return []
+    names = [(name, endpoints[0])]
+    if len(endpoints) > 1:
+        taken = {name}
+        for endpoint in endpoints:
+            base = f"{name}-{re.sub(r'[^a-z0-9]+', '-', endpoint.function.lower()).strip('-')}"
+            svc_name = base[:63].rstrip("-")
+            if svc_name in taken:
+                digest = hashlib.sha256(endpoint.function.encode()).hexdigest()[:8]
+                svc_name = f"{base[:54].rstrip('-')}-{digest}"
+            taken.add(svc_name)
+            names.append((svc_name, endpoint))
+    return names
+
+
+def _external_hostname(modal_url: str) -> str:
+    parsed = urlparse(modal_url)
+    return parsed.netloc or parsed.path
+
+
+# The fields the operator manages on a Service: type, external name, URL
+# annotation, its own labels and ports. Comparing these is how drift is
+# detected; labels other managers add are not drift.
+ServiceState = Tuple[str, str, str, Tuple[Tuple[str, str], ...], Tuple[int, ...]]
+
+
+def service_state(svc: Any) -> ServiceState:
+    """Managed fields of a Service given as a ``V1Service`` or as a manifest/watch body."""
+    if isinstance(svc, client.V1Service):
+        svc = {
+            "metadata": {"labels": svc.metadata.labels, "annotations": svc.metadata.annotations},
+            "spec": {
+                "type": svc.spec.type,
+                "externalName": svc.spec.external_name,
+                "ports": [{"port": port.port} for port in svc.spec.ports or []],
+            },
+        }
+    metadata, spec = svc.get("metadata") or {}, svc.get("spec") or {}
+    return (
+        spec.get("type"),
+        spec.get("externalName"),
+        (metadata.get("annotations") or {}).get(URL_ANNOTATION),
+        tuple(sorted((k, v) for k, v in (metadata.get("labels") or {}).items() if k in MANAGED_LABELS)),
+        tuple(port.get("port") for port in spec.get("ports") or []),
+    )
+
+
+class ServiceCache:
+    """Services labelled with an owning ModalApp, as last seen by the watch.
+
+    Lets reconciliation compare desired and observed Services in memory, so
+    an unchanged app costs no API calls at all.
+    """
 
-class ResourceManager:
     def __init__(self):
-        self.core_api = client.CoreV1Api()
+        self._by_app: Dict[Tuple[str, str], Dict[str, ServiceState]] = {}
+        self._owner: Dict[Tuple[str, str], str] = {}
+
+    def observe(self, namespace: str, name: str, body: Optional[Mapping[str, Any]]):
+        """Apply a watch event; ``body`` is None when the Service was deleted."""
+        app = (((body or {}).get("metadata") or {}).get("labels") or {}).get(APP_LABEL)
+        if body is None or app is None:
+            self.forget(namespace, name)
+        else:
+            self.record(namespace, name, app, service_state(body))
+
+    def record(self, namespace: str, name: str, app: str, state: ServiceState):
+        self.forget(namespace, name)
+        self._owner[(namespace, name)] = app
+        self._by_app.setdefault((namespace, app), {})[name] = state
+
+    def forget(self, namespace: str, name: str):
+        app = self._owner.pop((namespace, name), None)
+        if app is None:
+            return
+        services = self._by_app[(namespace, app)]
+        services.pop(name, None)
+        if not services:
+            del self._by_app[(namespace, app)]
+
+    def services(self, namespace: str, app: str) -> Dict[str, ServiceState]:
+        return dict(self._by_app.get((namespace, app), {}))
+
+    def known(self, namespace: Optional[str]) -> Set[Tuple[str, str]]:
+        """(namespace, name) of the cached Services in ``namespace``, or in all namespaces when None."""
+        return {key for key in self._owner if namespace in (None, key[0])}
+
+
+class ServiceWatcher(ListWatcher):
+    """Feeds Services labelled with an owning ModalApp into a ServiceCache.
+
+    The label selector is applied by the API server, so other Services in
+    the watched namespaces are never streamed to the operator. ``start``
+    returns once the first listing is cached.
+    """
+
+    name = "service-watch"
 
-    def create_external_service(
+    def __init__(self, kube: KubeClient, cache: ServiceCache, namespaces: Sequence[str] = ()):
+        super().__init__(kube, namespaces)
+        self.cache = cache
+        api = client.CoreV1Api(kube.api_client)
+        self._list_all = api.list_service_for_all_namespaces
+        self._list_namespaced = api.list_namespaced_service
+
+    async def _list(self, namespace: Optional[str]) -> str:
+        args = () if namespace is None else (namespace,)
+        method = self._list_all if namespace is None else self._list_namespaced
+        response = await self.kube.call(method, *args, label_selector=APP_LABEL, _preload_content=False)
+        listed = json.loads(response.data)
+        gone = self.cache.known(namespace)
+        for obj in listed.get("items", []):
+            key = (obj["metadata"]["namespace"], obj["metadata"]["name"])
+            gone.discard(key)
+            self.cache.observe(*key, obj)
+        for key in gone:
+            self.cache.forget(*key)
+        return listed["metadata"]["resourceVersion"]
+
+    def _stream(self, namespace: Optional[str], version: str):
+        args = () if namespace is None else (namespace,)
+        method = self._list_all if namespace is None else self._list_namespaced
+        return self._watch(method, *args, version=version, label_selector=APP_LABEL)
+
+    def _observe(self, event_type: str, obj: Dict[str, Any]):
+        metadata = obj["metadata"]
+        self.cache.observe(metadata["namespace"], metadata["name"], None if event_type == "DELETED" else obj)
+
+
+def _owner_reference(owner_ref: client.V1OwnerReference) -> Dict[str, Any]:
+    reference = {
+        "apiVersion": owner_ref.api_version,
+        "kind": owner_ref.kind,
+        "name": owner_ref.name,
+        "uid": owner_ref.uid,
+        "controller": owner_ref.controller,
+        "blockOwnerDeletion": owner_ref.block_owner_deletion,
+    }
+    return {key: value for key, value in reference.items() if value is not None}
+
+
+class ResourceManager:
+    """Manages the ExternalName Services of ModalApps.
+
+    Services resolve to the Modal endpoint's hostname, or to ``proxy_host``
+    (the modal-proxy Service) when set, so clients reach Modal through the
+    proxy and never need Modal credentials.
+    """
+
+    def __init__(self, kube: KubeClient, cache: Optional[ServiceCache] = None, proxy_host: str = ""):
+        self.core_api = kube.core
+        self.cache = cache
+        self.proxy_host = proxy_host
+
+    async def _owned_services(self, name: str, namespace: str) -> Dict[str, ServiceState]:
+        if self.cache is not None:
+            return self.cache.services(namespace, name)
+        listed = await self.core_api.list_namespaced_service(namespace, label_selector=f"{APP_LABEL}={name}")
+        return {svc.metadata.name: service_state(svc) for svc in listed.items}
+
+    def _external_service(
         self,
         name: str,
         namespace: str,
-        modal_url: str,
+        app: str,
+        endpoint: Endpoint,
         service_port: int,
         owner_ref: Any,
-    ) -> Any:
-        parsed = urlparse(modal_url)
-        external_hostname = parsed.netloc or parsed.path
-
-        service = client.V1Service(
-            metadata=client.V1ObjectMeta(
-                name=name,
-                namespace=namespace,
-                labels={"modal.internal.io/app": name},
-                annotations={"modal.internal.io/url": modal_url},
-                owner_references=[owner_ref],
-            ),
-            spec=client.V1ServiceSpec(
-                type="ExternalName",
-                external_name=external_hostname,
-                ports=[
-                    client.V1ServicePort(
-                        port=service_port,
-                        target_port=443,
-                        protocol="TCP",
-                    )
-                ],
-            ),
-        )
+    ) -> Dict[str, Any]:
+        labels = {APP_LABEL: app}
+        if endpoint.function:
+            labels[FUNCTION_LABEL] = re.sub(r"[^A-Za-z0-9_.-]+", "-", endpoint.function)[:63].strip("-_.")
+        return {
+            "apiVersion": "v1",
+            "kind": "Service",
+            "metadata": {
+                "name": name,
+                "namespace": namespace,
+                "labels": labels,
+                "annotations": {URL_ANNOTATION: endpoint.url},
+                "ownerReferences": [_owner_reference(owner_ref)],
+            },
+            "spec": {
+                "type": "ExternalName",
+                "externalName": self.proxy_host or _external_hostname(endpoint.url),
+                "ports": [{"port": service_port, "targetPort": 443, "protocol": "TCP"}],
+            },
+        }
+
+    async def apply_service(self, namespace: str, body: Dict[str, Any]) -> client.V1Service:
+        """Create or update a Service in one server-side apply call.
 
-        logger.info(f"Creating ExternalName service {name} -> {external_hostname}")
-        return self.core_api.create_namespaced_service(namespace=namespace, body=service)
+        The operator is the only intended writer of these Services, so the
+        apply is forced: fields another manager changed (e.g. ``kubectl
+        edit``) are taken back instead of failing with a conflict.
+        """
+        return await self.core_api.patch_namespaced_service(
+            body["metadata"]["name"],
+            namespace,
+            body,
+            field_manager=FIELD_MANAGER,
+            force=True,
+            _content_type=APPLY_PATCH,
+        )
 
-    def update_external_service(
+    async def reconcile_services(
         self,
         name: str,
         namespace: str,
-        modal_url: str,
+        endpoints: Sequence[Endpoint],
         service_port: int,
-    ) -> Any:
-        try:
-            parsed = urlparse(modal_url)
-            external_hostname = parsed.netloc or parsed.path
+        owner_ref: Any,
+    ) -> Dict[str, Endpoint]:
+        """Make the ExternalName Services of a ModalApp match its endpoints in one pass.
+
+        Existing Services come from the cache, or from one labelled listing
+        without it; only missing or drifted Services are applied, and Services
+        for endpoints that no longer exist are deleted. A name already taken
+        by a Service that is not labelled for this app is left alone, and
+        its endpoint goes without a Service. Returns the Service name for
+        each endpoint that has one.
+        """
+        desired = dict(service_names(name, endpoints))
+        existing = await self._owned_services(name, namespace)
 
-            service = self.core_api.read_namespaced_service(name, namespace)
-            service.spec.external_name = external_hostname
-            service.metadata.annotations["modal.internal.io/url"] = modal_url
+        for svc_name, endpoint in list(desired.items()):
+            body = self._external_service(svc_name, namespace, name, endpoint, service_port, owner_ref)
+            state = service_state(body)
+            current = existing.get(svc_name)
+            if current == state:
+                continue
+            if current is None:
+                owner = await self._service_owner(svc_name, namespace)
+                if owner is not None and owner != name:
+                    logger.warning(f"Not applying Service {svc_name} in {namespace}: it belongs to {owner or 'no app'}")
+                    del desired[svc_name]
+                    continue
+            services_applied.labels(reason="missing" if current is None else "drift").inc()
+            logger.info(f"Applying ExternalName service {svc_name} -> {body['spec']['externalName']}")
+            await self.apply_service(namespace, body)
+            if self.cache is not None:
+                self.cache.record(namespace, svc_name, name, state)
 
-            logger.info(f"Updating ExternalName service {name} -> {external_hostname}")
-            return self.core_api.replace_namespaced_service(name, namespace, service)
+        for svc_name in existing.keys() - desired.keys():
+            await self.delete_service(svc_name, namespace)
+
+        return desired
+
+    async def _service_owner(self, name: str, namespace: str) -> Optional[str]:
+        """App label of an existing Service ("" when it has none), or None when there is no such Service."""
+        try:
+            svc = await self.core_api.read_namespaced_service(name, namespace)
         except ApiException as e:
             if e.status == 404:
                 return None
             raise
+        return (svc.metadata.labels or {}).get(APP_LABEL, "")
 
-    def delete_service(self, name: str, namespace: str) -> bool:
+    async def delete_services(self, name: str, namespace: str) -> bool:
+        names = set(await self._owned_services(name, namespace))
+        if name not in names and await self._service_owner(name, namespace) == name:
+            names.add(name)
+        return all([await self.delete_service(svc_name, namespace) for svc_name in names])
+
+    async def delete_service(self, name: str, namespace: str) -> bool:
         try:
-            self.core_api.delete_namespaced_service(name, namespace)
+            await self.core_api.delete_namespaced_service(name, namespace)
             logger.info(f"Deleted service {name} in {namespace}")
-            return True
         except ApiException as e:
-            if e.status == 404:
-                return True
-            logger.error(f"Failed to delete service {name}: {e}")
-            return False
+            if e.status != 404:
+                logger.error(f"Failed to delete service {name}: {e}")
+                return False
+        if self.cache is not None:
+            self.cache.forget(namespace, name)
+        return True
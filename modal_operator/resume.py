@@ -0,0 +1,86 @@
+import asyncio
+import random
+import time
+from typing import Awaitable, Callable, Dict, Iterable, Optional, Set, Tuple
+
+import structlog
+
+from modal_operator.metrics import resume_pending, startup_reconcile_seconds
+
+logger = structlog.get_logger(__name__)
+
+RESUME_MODES = ("verify", "redeploy")
+
+Key = Tuple[str, str]
+
+
+class ResumeCoordinator:
+    """Keeps an operator restart from turning into a redeploy storm.
+
+    In ``verify`` mode every resume handler checks the shared deployment
+    inventory, so the workspace is listed once rather than per app, and apps
+    whose deploy hash matches and which are still deployed are not touched.
+    Apps that do need a redeploy are admitted at ``rate`` per second with up
+    to ``jitter`` seconds of random delay.
+    """
+
+    def __init__(
+        self,
+        list_live_apps: Callable[[], Awaitable[Dict[str, str]]],
+        mode: str = "verify",
+        rate: float = 1.0,
+        jitter: float = 5.0,
+    ):
+        if mode not in RESUME_MODES:
+            raise ValueError(f"Unknown resume mode {mode!r}, expected one of {RESUME_MODES}")
+        self.mode = mode
+        self.rate = rate
+        self.jitter = jitter
+        self._list_live_apps = list_live_apps
+        self._next_slot = 0.0
+        self._started = time.monotonic()
+        self._pending: Set[Key] = set()
+        self._tracking = False
+
+    @property
+    def verify(self) -> bool:
+        return self.mode == "verify"
+
+    async def live_apps(self) -> Optional[Dict[str, str]]:
+        """Deployed Modal apps (name -> app ID), or None if listing failed."""
+        try:
+            return await self._list_live_apps()
+        except Exception as e:
+            logger.warning("failed to list live Modal apps, trusting deploy hashes", error=str(e))
+            return None
+
+    async def admit(self):
+        """Wait for a rate-limited, jittered slot before redeploying."""
+        now = time.monotonic()
+        delay = max(0.0, self._next_slot - now)
+        if self.rate > 0:
+            self._next_slot = max(now, self._next_slot) + 1.0 / self.rate
+        if self.jitter > 0:
+            delay += random.uniform(0, self.jitter)
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+    def expect(self, keys: Iterable[Key]):
+        self._pending = set(keys)
+        self._tracking = True
+        resume_pending.set(len(self._pending))
+        self._check_done()
+
+    def done(self, namespace: str, name: str):
+        if not self._tracking:
+            return
+        self._pending.discard((namespace, name))
+        resume_pending.set(len(self._pending))
+        self._check_done()
+
+    def _check_done(self):
+        if self._tracking and not self._pending:
+            self._tracking = False
+            elapsed = time.monotonic() - self._started
+            startup_reconcile_seconds.set(elapsed)
+            logger.info("all ModalApps reconciled after startup", seconds=round(elapsed, 3))
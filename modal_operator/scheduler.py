@@ -0,0 +1,125 @@
+import asyncio
+import heapq
+import itertools
+import time
+from dataclasses import dataclass, field
+from enum import IntEnum
+from typing import Awaitable, Callable, Dict, List, Optional, TypeVar
+
+import structlog
+
+from modal_operator.metrics import deploy_queue_depth, deploy_queue_wait, deploys_in_flight
+
+logger = structlog.get_logger(__name__)
+
+T = TypeVar("T")
+
+
+class Priority(IntEnum):
+    CREATE = 0
+    UPDATE = 1
+    RESUME = 2
+
+
+@dataclass(order=True)
+class _Waiter:
+    priority: int
+    finish_tag: float
+    seq: int
+    start_tag: float = field(compare=False)
+    namespace: str = field(compare=False)
+    future: asyncio.Future = field(compare=False)
+
+
+class DeployScheduler:
+    """Admission control for deploys.
+
+    At most ``max_concurrent`` deploys run at once. Waiting deploys are served
+    strictly by priority, and within a priority by weighted fair queuing across
+    namespaces, so one namespace with hundreds of ModalApps cannot starve the
+    others.
+    """
+
+    def __init__(
+        self,
+        max_concurrent: int = 8,
+        namespace_weights: Optional[Dict[str, float]] = None,
+        default_weight: float = 1.0,
+    ):
+        if max_concurrent < 1:
+            raise ValueError("max_concurrent must be at least 1")
+        self.max_concurrent = max_concurrent
+        self.namespace_weights = namespace_weights or {}
+        self.default_weight = default_weight
+        self._running = 0
+        self._waiters: List[_Waiter] = []
+        self._virtual_time = 0.0
+        self._last_finish: Dict[str, float] = {}
+        self._seq = itertools.count()
+
+    @property
+    def running(self) -> int:
+        return self._running
+
+    @property
+    def queued(self) -> int:
+        return sum(1 for w in self._waiters if not w.future.done())
+
+    async def run(self, namespace: str, priority: Priority, fn: Callable[[], Awaitable[T]]) -> T:
+        await self._acquire(namespace, priority)
+        try:
+            return await fn()
+        finally:
+            self._release()
+
+    def _weight(self, namespace: str) -> float:
+        return self.namespace_weights.get(namespace, self.default_weight)
+
+    async def _acquire(self, namespace: str, priority: Priority):
+        start_tag = max(self._virtual_time, self._last_finish.get(namespace, 0.0))
+        finish_tag = start_tag + 1.0 / self._weight(namespace)
+        self._last_finish[namespace] = finish_tag
+
+        if self._running < self.max_concurrent and not self.queued:
+            self._virtual_time = start_tag
+            self._start()
+            deploy_queue_wait.labels(priority=priority.name.lower()).observe(0)
+            return
+
+        waiter = _Waiter(
+            priority=int(priority),
+            finish_tag=finish_tag,
+            seq=next(self._seq),
+            start_tag=start_tag,
+            namespace=namespace,
+            future=asyncio.get_running_loop().create_future(),
+        )
+        heapq.heappush(self._waiters, waiter)
+        depth = deploy_queue_depth.labels(namespace=namespace, priority=priority.name.lower())
+        depth.inc()
+        enqueued = time.monotonic()
+        logger.debug("deploy queued", namespace=namespace, priority=priority.name, running=self._running)
+        try:
+            await waiter.future
+        except asyncio.CancelledError:
+            if waiter.future.done() and not waiter.future.cancelled():
+                self._release()
+            raise
+        finally:
+            depth.dec()
+        deploy_queue_wait.labels(priority=priority.name.lower()).observe(time.monotonic() - enqueued)
+
+    def _start(self):
+        self._running += 1
+        deploys_in_flight.set(self._running)
+
+    def _release(self):
+        self._running -= 1
+        deploys_in_flight.set(self._running)
+        while self._waiters and self._running < self.max_concurrent:
+            waiter = heapq.heappop(self._waiters)
+            if waiter.future.done():
+                continue
+            self._virtual_time = max(self._virtual_time, waiter.start_tag)
+            self._start()
+            waiter.future.set_result(None)
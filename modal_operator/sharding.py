@@ -0,0 +1,281 @@
+import asyncio
+import bisect
+import contextlib
+import hashlib
+import time
+from datetime import datetime, timezone
+from typing import AsyncIterator, Awaitable, Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+import structlog
+from kubernetes import client
+from kubernetes.client.exceptions import ApiException
+
+from modal_operator.kube import KubeClient
+from modal_operator.metrics import deploy_lock_conflicts, shard_members, shard_rebalances
+
+logger = structlog.get_logger(__name__)
+
+MEMBER_LABEL = "modal.internal.io/shard-member"
+
+Key = Tuple[str, str]
+
+
+def _hash(value: str) -> int:
+    return int.from_bytes(hashlib.sha256(value.encode()).digest()[:8], "big")
+
+
+class HashRing:
+    """Consistent-hash ring mapping ``namespace/name`` keys to members.
+
+    Each member is placed on the ring ``vnodes`` times, so adding or removing
+    a member only moves roughly 1/N of the keys.
+    """
+
+    def __init__(self, members: Iterable[str], vnodes: int = 64):
+        self.members = frozenset(members)
+        self._points: List[Tuple[int, str]] = sorted(
+            (_hash(f"{member}#{i}"), member) for member in self.members for i in range(vnodes)
+        )
+        self._hashes = [point for point, _ in self._points]
+
+    def owner(self, key: Key) -> Optional[str]:
+        if not self._points:
+            return None
+        index = bisect.bisect(self._hashes, _hash(f"{key[0]}/{key[1]}")) % len(self._points)
+        return self._points[index][1]
+
+
+class DeployLockHeld(Exception):
+    """Another replica holds the deploy lock for a ModalApp."""
+
+    def __init__(self, holder: str):
+        super().__init__(f"deploy lock held by {holder}")
+        self.holder = holder
+
+
+def _now() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+class LeaseObserver:
+    """Decides whether other replicas' Leases have expired without trusting their clocks.
+
+    Comparing another pod's ``renewTime`` with this pod's clock lets two
+    replicas both believe they hold a Lease once the clocks are skewed by
+    more than the renewal margin. As in client-go, expiry is instead
+    measured on this replica's monotonic clock from when it last saw the
+    Lease record change, so a Lease seen for the first time is live for one
+    more ``leaseDurationSeconds``.
+    """
+
+    def __init__(self, clock: Callable[[], float] = time.monotonic):
+        self.clock = clock
+        self._seen: Dict[str, Tuple[Tuple, float]] = {}
+
+    def expired(self, lease: client.V1Lease) -> bool:
+        spec, name = lease.spec, lease.metadata.name
+        if not spec.holder_identity:
+            self._seen.pop(name, None)
+            return True
+        record = (spec.holder_identity, spec.renew_time, lease.metadata.resource_version)
+        now = self.clock()
+        seen = self._seen.get(name)
+        if seen is None or seen[0] != record:
+            self._seen[name] = (record, now)
+            return False
+        return now - seen[1] > (spec.lease_duration_seconds or 0)
+
+    def retain(self, names: Iterable[str]):
+        """Forget Leases other than ``names``, e.g. after a listing."""
+        names = set(names)
+        self._seen = {name: seen for name, seen in self._seen.items() if name in names}
+
+
+class DeployLocks:
+    """Per-ModalApp lock Leases that keep two replicas from deploying one app at once.
+
+    Whichever way replicas split the work, their views of who owns an app can
+    briefly disagree. A deploy therefore also takes the app's lock Lease, held
+    for at most ``lock_duration`` seconds, which any other replica has to wait
+    out before deploying or stopping the same app.
+    """
+
+    def __init__(self, kube: KubeClient, identity: str, namespace: str, lock_duration: float = 360.0):
+        self.kube = kube
+        self.identity = identity
+        self.namespace = namespace
+        self.lock_duration = lock_duration
+        self._leases = LeaseObserver()
+
+    def _lock_name(self, namespace: str, name: str) -> str:
+        return f"modalapp-deploy-{hashlib.sha256(f'{namespace}/{name}'.encode()).hexdigest()[:16]}"
+
+    @contextlib.asynccontextmanager
+    async def hold(self, namespace: str, name: str) -> AsyncIterator[None]:
+        """Hold the app's lock for the duration of the block; raises DeployLockHeld if taken."""
+        lock = self._lock_name(namespace, name)
+        await self._acquire(lock)
+        try:
+            yield
+        finally:
+            await self._release(lock)
+
+    async def _acquire(self, lock: str):
+        coordination = self.kube.coordination
+        now = _now()
+        spec = client.V1LeaseSpec(
+            holder_identity=self.identity,
+            lease_duration_seconds=int(self.lock_duration),
+            acquire_time=now,
+            renew_time=now,
+        )
+        try:
+            current = await coordination.read_namespaced_lease(lock, self.namespace)
+        except ApiException as e:
+            if e.status != 404:
+                raise
+            current = None
+        try:
+            if current is None:
+                body = client.V1Lease(metadata=client.V1ObjectMeta(name=lock), spec=spec)
+                await coordination.create_namespaced_lease(self.namespace, body)
+                return
+            holder = current.spec.holder_identity
+            if holder != self.identity and not self._leases.expired(current):
+                deploy_lock_conflicts.inc()
+                raise DeployLockHeld(holder)
+            current.spec = spec
+            await coordination.replace_namespaced_lease(lock, self.namespace, current)
+        except ApiException as e:
+            if e.status != 409:
+                raise
+            deploy_lock_conflicts.inc()
+            raise DeployLockHeld("another replica") from e
+
+    async def _release(self, lock: str):
+        try:
+            current = await self.kube.coordination.read_namespaced_lease(lock, self.namespace)
+            if current.spec.holder_identity != self.identity:
+                return
+            await self.kube.coordination.delete_namespaced_lease(
+                lock,
+                self.namespace,
+                body=client.V1DeleteOptions(
+                    preconditions=client.V1Preconditions(resource_version=current.metadata.resource_version)
+                ),
+            )
+        except ApiException as e:
+            if e.status not in (404, 409):
+                logger.warning("failed to release deploy lock", lock=lock, error=str(e))
+
+
+class ShardCoordinator:
+    """Splits ModalApps across operator replicas.
+
+    Every replica keeps a member Lease in ``namespace`` renewed; the live
+    members form a consistent-hash ring that decides which replica handles
+    each ModalApp. Membership views can briefly disagree while replicas join
+    or leave, so ownership alone is not trusted for deploys; see DeployLocks.
+
+    ``on_rebalance`` runs in its own task, away from the lease renewals, and
+    is retried until it succeeds for the latest ring.
+    """
+
+    def __init__(
+        self,
+        kube: KubeClient,
+        identity: str,
+        namespace: str,
+        lease_duration: float = 15.0,
+        on_rebalance: Optional[Callable[[HashRing, HashRing], Awaitable[None]]] = None,
+    ):
+        self.kube = kube
+        self.identity = identity
+        self.namespace = namespace
+        self.lease_duration = lease_duration
+        self.ring = HashRing([identity])
+        self._on_rebalance = on_rebalance
+        # Empty until the first handover, so a replica takes over its share on startup even when it is alone.
+        self._handed_over = HashRing([])
+        self._task: Optional[asyncio.Task] = None
+        self._handover: Optional[asyncio.Task] = None
+        self._leases = LeaseObserver()
+
+    @property
+    def _member_lease(self) -> str:
+        return f"modal-operator-member-{self.identity}"
+
+    def owns(self, namespace: str, name: str) -> bool:
+        return self.ring.owner((namespace, name)) == self.identity
+
+    async def start(self):
+        """Join the ring and wait for the first membership view before handlers run."""
+        await self._heartbeat()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Leave the ring right away so the remaining replicas rebalance without waiting for expiry."""
+        for task in (self._task, self._handover):
+            if task is not None:
+                task.cancel()
+        with contextlib.suppress(ApiException):
+            await self.kube.coordination.delete_namespaced_lease(self._member_lease, self.namespace)
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.lease_duration / 3)
+            try:
+                await self._heartbeat()
+            except Exception as e:
+                logger.warning("shard heartbeat failed", error=str(e))
+
+    async def _heartbeat(self):
+        await self._renew_member_lease()
+        members = await self._live_members()
+        members.add(self.identity)
+        if members != self.ring.members:
+            self.ring = HashRing(members)
+            shard_members.set(len(members))
+            shard_rebalances.inc()
+            logger.info("shard membership changed", members=sorted(members))
+        if self._handed_over is self.ring:
+            return
+        if self._on_rebalance is None:
+            self._handed_over = self.ring
+        elif self._handover is None or self._handover.done():
+            self._handover = asyncio.create_task(self._hand_over())
+
+    async def _hand_over(self):
+        while self._handed_over is not self.ring:
+            ring = self.ring
+            try:
+                await self._on_rebalance(self._handed_over, ring)
+            except Exception as e:
+                logger.warning("shard rebalance failed, retrying", error=str(e))
+                await asyncio.sleep(self.lease_duration / 3)
+                continue
+            self._handed_over = ring
+
+    async def _renew_member_lease(self):
+        now = _now()
+        body = client.V1Lease(
+            metadata=client.V1ObjectMeta(name=self._member_lease, labels={MEMBER_LABEL: "true"}),
+            spec=client.V1LeaseSpec(
+                holder_identity=self.identity,
+                lease_duration_seconds=int(self.lease_duration),
+                renew_time=now,
+            ),
+        )
+        try:
+            await self.kube.coordination.replace_namespaced_lease(self._member_lease, self.namespace, body)
+        except ApiException as e:
+            if e.status != 404:
+                raise
+            await self.kube.coordination.create_namespaced_lease(self.namespace, body)
+
+    async def _live_members(self) -> Set[str]:
+        leases = await self.kube.coordination.list_namespaced_lease(
+            self.namespace, label_selector=f"{MEMBER_LABEL}=true"
+        )
+        self._leases.retain(lease.metadata.name for lease in leases.items)
+        return {lease.spec.holder_identity for lease in leases.items if not self._leases.expired(lease)}
@@ -0,0 +1,79 @@
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+import structlog
+
+from modal_operator.metrics import status_patches
+
+logger = structlog.get_logger(__name__)
+
+Key = Tuple[str, str]
+
+
+class StatusWriter:
+    """Coalesces status patches per ModalApp into as few writes as possible.
+
+    Each update is diffed against the last status known to be stored, so
+    fields that would not change are dropped and a patch with nothing left
+    is skipped. Updates for the same object that arrive within ``window``
+    seconds of each other are merged and written once; every caller waits
+    for the write that carries its fields and sees its error if it fails.
+    """
+
+    def __init__(self, write: Callable[[str, str, Dict[str, Any]], Awaitable[None]], window: float = 0.2):
+        self.window = window
+        self._write = write
+        self._known: Dict[Key, Dict[str, Any]] = {}
+        self._pending: Dict[Key, Dict[str, Any]] = {}
+        self._waiters: Dict[Key, List[asyncio.Future]] = {}
+        self._flushes: Dict[Key, asyncio.Task] = {}
+
+    def observe(self, key: Key, status: Optional[Dict[str, Any]]):
+        """Record the status as stored on the object, e.g. from a handler's ``status`` kwarg."""
+        if key not in self._pending:
+            self._known[key] = dict(status or {})
+
+    def forget(self, key: Key):
+        self._known.pop(key, None)
+
+    def _diff(self, key: Key, patch: Dict[str, Any]) -> Dict[str, Any]:
+        known = self._known.get(key, {})
+        return {field: value for field, value in patch.items() if known.get(field) != value}
+
+    async def update(self, key: Key, patch: Dict[str, Any]) -> bool:
+        """Patch the object's status; returns False if nothing needed writing."""
+        changes = self._diff(key, patch)
+        if not changes and key not in self._pending:
+            status_patches.labels(result="skipped").inc()
+            return False
+        if key in self._pending:
+            status_patches.labels(result="merged").inc()
+        self._pending.setdefault(key, {}).update(patch)
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.setdefault(key, []).append(waiter)
+        if key not in self._flushes:
+            self._flushes[key] = asyncio.create_task(self._flush(key))
+        await waiter
+        return True
+
+    async def _flush(self, key: Key):
+        await asyncio.sleep(self.window)
+        del self._flushes[key]
+        body = self._diff(key, self._pending.pop(key))
+        waiters = self._waiters.pop(key)
+        try:
+            if body:
+                await self._write(key[0], key[1], body)
+                status_patches.labels(result="written").inc()
+            else:
+                status_patches.labels(result="skipped").inc()
+        except Exception as e:
+            logger.warning("status patch failed", namespace=key[0], name=key[1], error=str(e))
+            for waiter in waiters:
+                if not waiter.done():
+                    waiter.set_exception(e)
+            return
+        self._known.setdefault(key, {}).update(body)
+        for waiter in waiters:
+            if not waiter.done():
+                waiter.set_result(None)
@@ -0,0 +1,204 @@
+import asyncio
+import multiprocessing
+import os
+import resource
+import sys
+from multiprocessing.connection import Connection
+from typing import Any, Callable, Dict, List, Optional, Set
+
+import structlog
+
+from modal_operator.metrics import deploy_workers_busy, deploy_workers_recycled
+
+logger = structlog.get_logger(__name__)
+
+
+class WorkerCrashed(Exception):
+    pass
+
+
+class WorkerError(Exception):
+    """A job raised inside a worker; carries the remote error message."""
+
+
+def _rss_bytes() -> int:
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except OSError:
+        rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return rss if sys.platform == "darwin" else rss * 1024
+
+
+def _worker_main(conn: Connection, env: Dict[str, str], initializer: Optional[Callable[[], None]]):
+    os.environ.update(env)
+    if initializer is not None:
+        initializer()
+    while True:
+        try:
+            job = conn.recv()
+        except (EOFError, KeyboardInterrupt):
+            return
+        if job is None:
+            return
+        fn, args = job
+        try:
+            reply = ("ok", fn(*args))
+        except BaseException as e:
+            reply = ("error", f"{type(e).__name__}: {e}")
+        conn.send((reply, _rss_bytes()))
+
+
+class _Worker:
+    def __init__(self, ctx, env: Dict[str, str], initializer: Optional[Callable[[], None]]):
+        self.conn, child_conn = ctx.Pipe()
+        self.process = ctx.Process(target=_worker_main, args=(child_conn, env, initializer), daemon=True)
+        self.process.start()
+        child_conn.close()
+        self.jobs = 0
+        self.rss = 0
+
+    async def call(self, fn: Callable, args: tuple) -> Any:
+        loop = asyncio.get_running_loop()
+        readable = loop.create_future()
+        fd = self.conn.fileno()
+        try:
+            self.conn.send((fn, args))
+        except (BrokenPipeError, OSError) as e:
+            raise WorkerCrashed(f"deploy worker {self.process.pid} is gone: {e}") from None
+        loop.add_reader(fd, lambda: readable.done() or readable.set_result(None))
+        try:
+            await readable
+        finally:
+            loop.remove_reader(fd)
+        try:
+            (status, value), self.rss = self.conn.recv()
+        except (EOFError, OSError):
+            await loop.run_in_executor(None, self.process.join, 1)
+            raise WorkerCrashed(f"deploy worker exited with code {self.process.exitcode}") from None
+        self.jobs += 1
+        if status == "error":
+            raise WorkerError(value)
+        return value
+
+    def stop(self, timeout: float = 5.0):
+        try:
+            self.conn.send(None)
+        except (BrokenPipeError, OSError):
+            pass
+        self.process.join(timeout=timeout)
+        self.kill()
+
+    def kill(self):
+        if self.process.is_alive():
+            self.process.kill()
+            self.process.join()
+        self.conn.close()
+
+
+class WorkerPool:
+    """Pre-forked worker processes that run deploy jobs off the event loop.
+
+    Workers are spawned up front and run ``initializer`` once (importing and
+    authenticating ``modal``), then receive jobs over a pipe. A worker is
+    replaced after ``max_jobs`` jobs, once its RSS exceeds ``max_rss_bytes``,
+    when a job times out or is cancelled, or when it dies — a crashing job only
+    ever takes down its own worker. Stopping and spawning workers blocks, so
+    the pool does both in the default executor rather than on the event loop.
+    """
+
+    def __init__(
+        self,
+        size: int = 4,
+        max_jobs: int = 50,
+        max_rss_bytes: Optional[int] = None,
+        env: Optional[Dict[str, str]] = None,
+        initializer: Optional[Callable[[], None]] = None,
+    ):
+        if size < 1:
+            raise ValueError("size must be at least 1")
+        self.size = size
+        self.max_jobs = max_jobs
+        self.max_rss_bytes = max_rss_bytes
+        self.env = env or {}
+        self.initializer = initializer
+        self._ctx = multiprocessing.get_context("spawn")
+        self._idle: Optional[asyncio.Queue] = None
+        self._workers: List[_Worker] = []
+        self._recycling: Set[asyncio.Task] = set()
+
+    def start(self):
+        """Spawn the workers now. Blocks until they are started, so call it off the event loop."""
+        if self._idle is not None:
+            return
+        self._idle = asyncio.Queue()
+        for _ in range(self.size):
+            worker = _Worker(self._ctx, self.env, self.initializer)
+            self._workers.append(worker)
+            self._idle.put_nowait(worker)
+
+    async def _spawn(self) -> _Worker:
+        loop = asyncio.get_running_loop()
+        worker = await loop.run_in_executor(None, _Worker, self._ctx, self.env, self.initializer)
+        self._workers.append(worker)
+        return worker
+
+    async def _replace(self, worker: _Worker, reason: str):
+        deploy_workers_recycled.labels(reason=reason).inc()
+        logger.info("replacing deploy worker", pid=worker.process.pid, reason=reason, jobs=worker.jobs)
+        self._workers.remove(worker)
+        retire = worker.stop if reason in ("max_jobs", "memory") else worker.kill
+        loop = asyncio.get_running_loop()
+        await asyncio.gather(loop.run_in_executor(None, retire), self._add_worker())
+
+    async def _add_worker(self):
+        self._idle.put_nowait(await self._spawn())
+
+    async def run(self, fn: Callable, *args, timeout: Optional[float] = None) -> Any:
+        """Run ``fn(*args)`` in a worker; ``fn`` and its arguments must be picklable."""
+        if self._idle is None:
+            self._idle = asyncio.Queue()
+            await asyncio.gather(*(self._add_worker() for _ in range(self.size)))
+        worker = await self._idle.get()
+        if not worker.process.is_alive():
+            await self._replace(worker, "died")
+            worker = await self._idle.get()
+
+        deploy_workers_busy.inc()
+        try:
+            result = await asyncio.wait_for(worker.call(fn, args), timeout)
+        except WorkerCrashed:
+            await self._replace(worker, "crashed")
+            raise
+        except asyncio.TimeoutError:
+            await self._replace(worker, "timeout")
+            raise
+        except asyncio.CancelledError:
+            # The caller is going away; swap the worker in the background so the pool keeps its size.
+            task = asyncio.create_task(self._replace(worker, "timeout"))
+            self._recycling.add(task)
+            task.add_done_callback(self._recycling.discard)
+            raise
+        except WorkerError:
+            await self._release(worker)
+            raise
+        else:
+            await self._release(worker)
+            return result
+        finally:
+            deploy_workers_busy.dec()
+
+    async def _release(self, worker: _Worker):
+        if worker.jobs >= self.max_jobs:
+            await self._replace(worker, "max_jobs")
+        elif self.max_rss_bytes and worker.rss > self.max_rss_bytes:
+            await self._replace(worker, "memory")
+        else:
+            self._idle.put_nowait(worker)
+
+    def close(self):
+        """Stop every worker. Blocks while they exit, so call it off the event loop."""
+        for worker in self._workers:
+            worker.stop()
+        self._workers = []
+        self._idle = None
@@ -0,0 +1,54 @@
+from modal_operator.deploy_output import Endpoint, parse_deploy_output
+
+TREE_OUTPUT = """\
+Building image im-123: loading cache for ap-NotThisOne
+✓ Initialized. View run at https://modal.com/apps/ws/main/ap-AbC123
+✓ Created objects.
+├── 🔨 Created mount /tmp/modal-llm-abc.py
+├── ✓ Created Function download.
+├── ✓ Created Function serve
+│   └── https://ws--llm-serve.modal.run 🔑
+└── ✓ Created Function Model.*.
+    ├── generate -> https://ws--llm-model-generate.modal.run 🔑
+    └──          -> https://llm.example.com 🔑
+✓ App deployed in 3.142s! 🎉
+
+View Deployment: https://modal.com/apps/ws/main/deployed/llm
+"""
+
+ARROW_OUTPUT = """\
+\x1b[32m✓\x1b[0m Created objects.
+├── 🔨 Created web function hello => https://ws--hello-modal-hello.modal.run
+└── 🔨 Created function ping.
+"""
+
+
+def test_parses_tree_output():
+    parsed = parse_deploy_output(TREE_OUTPUT)
+    assert parsed.ok
+    assert parsed.app_id == "ap-AbC123"
+    assert parsed.app_page_url == "https://modal.com/apps/ws/main/deployed/llm"
+    assert parsed.functions == ["download", "serve", "Model.*"]
+    assert parsed.endpoints == [
+        Endpoint(function="serve", url="https://ws--llm-serve.modal.run"),
+        Endpoint(function="Model.generate", url="https://ws--llm-model-generate.modal.run"),
+    ]
+
+
+def test_parses_arrow_output_with_ansi():
+    parsed = parse_deploy_output(ARROW_OUTPUT)
+    assert parsed.functions == ["hello", "ping"]
+    assert parsed.endpoints == [Endpoint(function="hello", url="https://ws--hello-modal-hello.modal.run")]
+    assert parsed.app_id is None
+
+
+def test_unrecognised_output_is_not_ok():
+    parsed = parse_deploy_output("Deployment complete\nsomething https://modal.com/x\n")
+    assert not parsed.ok
+    assert parsed.endpoints == []
+
+
+def test_app_id_only_comes_from_modal_lines():
+    output = "user log: ap-Fake99\nApp ID: ap-Real42\n" + ARROW_OUTPUT
+    assert parse_deploy_output(output).app_id == "ap-Real42"
+    assert parse_deploy_output("see https://modal.com/apps/ws/main/ap-Fake99\n" + ARROW_OUTPUT).app_id is None
@@ -0,0 +1,162 @@
+import asyncio
+import os
+import stat
+import sys
+import time
+import types
+
+import pytest
+
+from modal_operator.deployer import CommandTimeout, ModalDeployer, _find_app, run_command, sdk_deploy
+from modal_operator.workers import WorkerPool
+
+
+def _fake_modal(tmp_path, monkeypatch, script):
+    bin_dir = tmp_path / "bin"
+    bin_dir.mkdir()
+    modal = bin_dir / "modal"
+    modal.write_text("#!/bin/sh\n" + script)
+    modal.chmod(modal.stat().st_mode | stat.S_IEXEC)
+    monkeypatch.setenv("PATH", f"{bin_dir}{os.pathsep}{os.environ['PATH']}")
+
+
+async def test_run_command_captures_output():
+    result = await run_command(["sh", "-c", "echo out; echo err >&2; exit 3"], timeout=10)
+    assert result.returncode == 3
+    assert result.stdout == "out\n"
+    assert result.stderr == "err\n"
+
+
+async def test_run_command_captures_lines_longer_than_the_stream_limit():
+    script = "import sys; sys.stdout.write('\\r'.join(['building'] * 20000) + '\\ndone\\n')"
+    result = await run_command([sys.executable, "-c", script], timeout=10)
+    assert result.returncode == 0
+    assert len(result.stdout) > 100_000
+    assert result.stdout.endswith("building\ndone\n")
+
+
+async def test_run_command_timeout_kills_process_group(tmp_path):
+    marker = tmp_path / "survived"
+    start = time.monotonic()
+    with pytest.raises(CommandTimeout):
+        await run_command(["sh", "-c", f"(sleep 1; touch {marker}) & wait"], timeout=0.2)
+    assert time.monotonic() - start < 1
+    await asyncio.sleep(1.2)
+    assert not marker.exists()
+
+
+async def test_run_command_cancellation_kills_child(tmp_path):
+    marker = tmp_path / "survived"
+    task = asyncio.create_task(run_command(["sh", "-c", f"sleep 1; touch {marker}"]))
+    await asyncio.sleep(0.1)
+    task.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await task
+    await asyncio.sleep(1.2)
+    assert not marker.exists()
+
+
+async def test_deploy_app_does_not_block_event_loop(tmp_path, monkeypatch):
+    _fake_modal(tmp_path, monkeypatch, "sleep 0.5\n")
+    deployer = ModalDeployer("id", "secret")
+
+    async def _query(name, env):
+        return "https://ws--app-serve.modal.run", "ap-123"
+
+    monkeypatch.setattr(deployer, "_query_deployment", _query)
+
+    start = time.monotonic()
+    results = await asyncio.gather(*(deployer.deploy_app(f"app-{i}", "import modal") for i in range(5)))
+    assert all(r.success for r in results)
+    assert time.monotonic() - start < 2
+
+
+async def test_deploy_app_timeout(tmp_path, monkeypatch):
+    _fake_modal(tmp_path, monkeypatch, "sleep 5\n")
+    deployer = ModalDeployer("id", "secret")
+
+    result = await deployer.deploy_app("slow", "import modal", timeout=0.2)
+    assert not result.success
+    assert result.error == "modal deploy timed out after 0.2s"
+
+
+async def test_stop_app_failure(tmp_path, monkeypatch):
+    _fake_modal(tmp_path, monkeypatch, "echo 'no such app' >&2; exit 1\n")
+    deployer = ModalDeployer("id", "secret")
+
+    assert await deployer.stop_app("missing") is False
+
+
+def test_sdk_deploy_sees_env_and_restores_it(monkeypatch):
+    monkeypatch.delenv("MODAL_OPERATOR_TEST_VAR", raising=False)
+    source = "import os\nassert os.environ['MODAL_OPERATOR_TEST_VAR'] == 'bar'\n"
+
+    with pytest.raises(ValueError, match="found 0"):
+        sdk_deploy("no-app", source, {"MODAL_OPERATOR_TEST_VAR": "bar"})
+    assert "MODAL_OPERATOR_TEST_VAR" not in os.environ
+    assert "modal_app_no_app" not in sys.modules
+
+
+def test_find_app_prefers_app_attribute():
+    import modal
+
+    module = types.SimpleNamespace(app=modal.App("a"), other=modal.App("b"))
+    assert _find_app(module, modal.App) is module.app
+
+
+async def test_sdk_backend_reports_worker_errors():
+    deployer = ModalDeployer("id", "secret", backend="sdk")
+    deployer._pool = WorkerPool(size=1)
+    try:
+        result = await deployer.deploy_app("broken", "raise RuntimeError('bad source')")
+    finally:
+        deployer.close()
+    assert not result.success
+    assert "bad source" in result.error
+
+
+def test_unknown_backend_rejected():
+    with pytest.raises(ValueError):
+        ModalDeployer("id", "secret", backend="grpc")
+
+
+async def test_workspace_resolved_once(tmp_path, monkeypatch):
+    calls = tmp_path / "calls"
+    _fake_modal(tmp_path, monkeypatch, f'echo "$MODAL_TOKEN_ID" >> {calls}; echo "ws-$MODAL_TOKEN_ID"\n')
+    monkeypatch.delenv("MODAL_WORKSPACE", raising=False)
+    deployer = ModalDeployer("id", "secret")
+
+    results = await asyncio.gather(*(deployer.workspace() for _ in range(10)))
+    assert results == ["ws-id"] * 10
+    assert await deployer.workspace() == "ws-id"
+    assert calls.read_text().split() == ["id"]
+
+
+async def test_workspace_failure_not_cached(tmp_path, monkeypatch):
+    _fake_modal(tmp_path, monkeypatch, "exit 1\n")
+    deployer = ModalDeployer("id", "secret")
+
+    assert await deployer.workspace() is None
+    assert deployer._workspaces == {}
+
+
+async def test_deploy_app_uses_parsed_output(tmp_path, monkeypatch):
+    output = tmp_path / "output.txt"
+    output.write_text(
+        "├── ✓ Created Function serve\n│   └── https://ws--app-serve.modal.run 🔑\n"
+        "View Deployment: https://modal.com/apps/ap-XyZ9\n"
+    )
+    _fake_modal(tmp_path, monkeypatch, f"cat {output}\n")
+    deployer = ModalDeployer("id", "secret")
+
+    async def _query(name, env):
+        raise AssertionError("parsed output should make the follow-up query unnecessary")
+
+    monkeypatch.setattr(deployer, "_query_deployment", _query)
+
+    result = await deployer.deploy_app("app", "import modal")
+    assert result.success
+    assert result.url == "https://ws--app-serve.modal.run"
+    assert result.app_id == "ap-XyZ9"
+    assert result.functions == ["serve"]
+    assert deployer.inventory.peek("app") == "ap-XyZ9"
@@ -0,0 +1,100 @@
+import base64
+import json
+from types import SimpleNamespace
+
+from modal_operator.crds import EnvFromSource
+from modal_operator.envcache import (
+    CONFIG_MAP,
+    ENV_SOURCE_LABEL,
+    SECRET,
+    EnvSourceCache,
+    EnvSourceWatcher,
+    decode_secret_data,
+)
+
+
+class _Fetcher:
+    def __init__(self, objects):
+        self.objects = objects
+        self.calls = []
+
+    async def __call__(self, kind, namespace, name):
+        self.calls.append((kind, namespace, name))
+        return dict(self.objects[(kind, namespace, name)])
+
+
+ENV_FROM = [EnvFromSource(secretRef={"name": "hf"}), EnvFromSource(configMapRef={"name": "settings"})]
+
+
+def _cache():
+    fetcher = _Fetcher({(SECRET, "ns", "hf"): {"HF_TOKEN": "t1"}, (CONFIG_MAP, "ns", "settings"): {"MODE": "fast"}})
+    return EnvSourceCache(fetcher), fetcher
+
+
+def test_decode_secret_data():
+    assert decode_secret_data({"K": base64.b64encode(b"v").decode()}) == {"K": "v"}
+    assert decode_secret_data(None) == {}
+
+
+async def test_resolve_serves_watched_objects_from_memory():
+    cache, fetcher = _cache()
+    cache.track(("ns", "app"), "ns", ENV_FROM)
+    cache.observe(SECRET, "ns", "hf", {"HF_TOKEN": "t1"})
+
+    assert await cache.resolve("ns", ENV_FROM) == {"HF_TOKEN": "t1", "MODE": "fast"}
+    assert await cache.resolve("ns", ENV_FROM) == {"HF_TOKEN": "t1", "MODE": "fast"}
+    assert fetcher.calls == [(CONFIG_MAP, "ns", "settings")] * 2
+
+
+async def test_watch_events_only_report_changes_to_consumed_objects():
+    cache, fetcher = _cache()
+    cache.track(("ns", "app"), "ns", ENV_FROM)
+    assert not cache.observe(SECRET, "ns", "hf", {"HF_TOKEN": "t1"})
+
+    assert cache.observe(SECRET, "ns", "hf", {"HF_TOKEN": "t2"})
+    assert not cache.observe(SECRET, "ns", "hf", {"HF_TOKEN": "t2"})
+    assert not cache.observe(SECRET, "ns", "unrelated", {"X": "1"})
+    assert not cache.observe(SECRET, "ns", "unrelated", {"X": "2"})
+    assert not cache.is_referenced(SECRET, "ns", "unrelated")
+    assert (await cache.resolve("ns", ENV_FROM))["HF_TOKEN"] == "t2"
+    assert cache.known(SECRET, "ns") == {("ns", "hf"), ("ns", "unrelated")}
+
+    assert cache.observe(SECRET, "ns", "hf", None)
+    assert (await cache.resolve("ns", ENV_FROM))["HF_TOKEN"] == "t1"
+
+
+class _Response:
+    def __init__(self, body):
+        self.data = json.dumps(body).encode()
+
+
+async def test_watcher_lists_labelled_sources_and_drops_vanished_ones():
+    cache, _ = _cache()
+    cache.observe(CONFIG_MAP, "ns", "gone", {"A": "1"})
+    calls, changes = [], []
+
+    async def call(method, *args, **kwargs):
+        calls.append((method.__name__, args, kwargs["label_selector"]))
+        item = {"metadata": {"namespace": "ns", "name": "settings"}, "data": {"MODE": "fast"}}
+        return _Response({"metadata": {"resourceVersion": "7"}, "items": [item]})
+
+    kube = SimpleNamespace(call=call, api_client=None)
+    watcher = EnvSourceWatcher(kube, CONFIG_MAP, cache, lambda *change: changes.append(change), ["ns"])
+    assert await watcher._list("ns") == "7"
+    assert calls == [("list_namespaced_config_map", ("ns",), ENV_SOURCE_LABEL)]
+    assert changes == [(CONFIG_MAP, "ns", "settings", {"MODE": "fast"}), (CONFIG_MAP, "ns", "gone", None)]
+
+
+async def test_reverse_index_and_untrack():
+    cache, _ = _cache()
+    cache.track(("ns", "a"), "ns", ENV_FROM)
+    cache.track(("ns", "b"), "ns", ENV_FROM[:1])
+    assert cache.consumers(SECRET, "ns", "hf") == {("ns", "a"), ("ns", "b")}
+    assert cache.consumers(CONFIG_MAP, "ns", "settings") == {("ns", "a")}
+
+    cache.track(("ns", "a"), "ns", [])
+    assert cache.consumers(SECRET, "ns", "hf") == {("ns", "b")}
+    assert not cache.is_referenced(CONFIG_MAP, "ns", "settings")
+
+    cache.untrack(("ns", "b"))
+    assert not cache.is_referenced(SECRET, "ns", "hf")
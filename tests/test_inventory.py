@@ -0,0 +1,75 @@
+import asyncio
+
+import pytest
+
+from modal_operator.inventory import DeploymentInventory
+
+
+class _Lister:
+    def __init__(self, apps):
+        self.apps = apps
+        self.calls = 0
+
+    async def __call__(self):
+        self.calls += 1
+        await asyncio.sleep(0.01)
+        return dict(self.apps)
+
+
+async def test_concurrent_lookups_share_one_listing():
+    lister = _Lister({"a": "ap-1", "b": "ap-2"})
+    inventory = DeploymentInventory(lister)
+
+    results = await asyncio.gather(*(inventory.get("a") for _ in range(50)))
+    assert results == ["ap-1"] * 50
+    assert lister.calls == 1
+
+
+async def test_ttl_and_invalidate():
+    lister = _Lister({"a": "ap-1"})
+    inventory = DeploymentInventory(lister, ttl=60)
+
+    await inventory.get("a")
+    await inventory.get("a")
+    assert lister.calls == 1
+
+    inventory.invalidate()
+    await inventory.get("a")
+    assert lister.calls == 2
+
+
+async def test_missing_app_refreshes_at_most_once_per_interval():
+    lister = _Lister({})
+    inventory = DeploymentInventory(lister, ttl=60, min_refresh_interval=60)
+
+    assert await inventory.get("new") is None
+    assert await inventory.get("new") is None
+    assert lister.calls == 1
+
+
+async def test_record_and_discard_skip_listing():
+    lister = _Lister({"a": "ap-1"})
+    inventory = DeploymentInventory(lister, ttl=60)
+    await inventory.snapshot()
+
+    inventory.record("b", "ap-2")
+    inventory.discard("a")
+    assert await inventory.get("b") == "ap-2"
+    assert "a" not in inventory
+    assert lister.calls == 1
+
+
+async def test_failed_refresh_is_retried():
+    calls = 0
+
+    async def flaky():
+        nonlocal calls
+        calls += 1
+        if calls == 1:
+            raise RuntimeError("unavailable")
+        return {"a": "ap-1"}
+
+    inventory = DeploymentInventory(flaky)
+    with pytest.raises(RuntimeError):
+        await inventory.get("a")
+    assert await inventory.get("a") == "ap-1"
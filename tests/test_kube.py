@@ -0,0 +1,125 @@
+import asyncio
+import threading
+import time
+
+import pytest
+from kubernetes import client
+from kubernetes.client.exceptions import ApiException
+
+from modal_operator.kube import KubeClient, RetryBudget, TokenBucket, Verb, _AsyncApi, classify, retry_after
+
+
+class _FakeApi:
+    def __init__(self):
+        self.threads = set()
+
+    def read_namespaced_secret(self, name, namespace):
+        self.threads.add(threading.current_thread().name)
+        return (name, namespace)
+
+
+async def test_token_bucket_allows_burst_then_throttles():
+    bucket = TokenBucket(qps=50, burst=3)
+
+    start = time.monotonic()
+    for _ in range(3):
+        await bucket.acquire()
+    assert time.monotonic() - start < 0.01
+
+    for _ in range(2):
+        await bucket.acquire()
+    assert time.monotonic() - start >= 0.035
+
+
+async def test_token_bucket_disabled_with_zero_qps():
+    bucket = TokenBucket(qps=0, burst=1)
+    await asyncio.wait_for(asyncio.gather(*(bucket.acquire() for _ in range(100))), timeout=0.1)
+
+
+async def test_calls_run_off_the_event_loop():
+    kube = KubeClient(qps=0, pool_size=2, configuration=client.Configuration())
+    api = _FakeApi()
+    try:
+        core = _AsyncApi(kube, api)
+        results = await asyncio.gather(*(core.read_namespaced_secret(f"s{i}", namespace="ns") for i in range(4)))
+    finally:
+        kube.close()
+
+    assert results == [(f"s{i}", "ns") for i in range(4)]
+    assert all(name.startswith("kube-api") for name in api.threads)
+
+
+def test_classify():
+    assert classify("patch_namespaced_custom_object_status") == Verb.STATUS
+    assert classify("patch_namespaced_custom_object") == Verb.WRITE
+    assert classify("create_namespaced_service") == Verb.WRITE
+    assert classify("delete_namespaced_service") == Verb.DELETE
+    assert classify("list_namespaced_service") == Verb.READ
+
+
+async def test_token_bucket_serves_higher_priority_first():
+    bucket = TokenBucket(qps=100, burst=1)
+    await bucket.acquire()
+    order = []
+
+    async def acquire(priority):
+        await bucket.acquire(priority)
+        order.append(priority)
+
+    await asyncio.gather(acquire(Verb.READ), acquire(Verb.WRITE), acquire(Verb.STATUS))
+    assert order == [Verb.STATUS, Verb.WRITE, Verb.READ]
+
+
+class _FlakyApi:
+    def __init__(self, failures, status=429):
+        self.failures = failures
+        self.status = status
+        self.calls = 0
+
+    def patch_namespaced_custom_object_status(self):
+        self.calls += 1
+        if self.calls <= self.failures:
+            raise ApiException(status=self.status, reason="Too Many Requests")
+        return "ok"
+
+
+def _kube(api, **kwargs):
+    kube = KubeClient(qps=0, pool_size=1, backoff_base=0.001, configuration=client.Configuration(), **kwargs)
+    return kube, _AsyncApi(kube, api)
+
+
+async def test_retries_throttled_calls_honoring_retry_after():
+    api = _FlakyApi(failures=2)
+    api_exc = ApiException(status=429)
+    api_exc.headers = {"Retry-After": "0.05"}
+    kube, custom = _kube(api)
+    try:
+        assert retry_after(api_exc) == 0.05
+        assert kube._backoff(0, api_exc) >= 0.05
+        assert await custom.patch_namespaced_custom_object_status() == "ok"
+    finally:
+        kube.close()
+    assert api.calls == 3
+
+
+async def test_does_not_retry_client_errors():
+    api = _FlakyApi(failures=1, status=404)
+    kube, custom = _kube(api)
+    try:
+        with pytest.raises(ApiException):
+            await custom.patch_namespaced_custom_object_status()
+    finally:
+        kube.close()
+    assert api.calls == 1
+
+
+async def test_retry_budget_limits_retries():
+    api = _FlakyApi(failures=100)
+    kube, custom = _kube(api, retry_ratio=0)
+    kube.retry_budget = RetryBudget(ratio=0, min_retries=2)
+    try:
+        with pytest.raises(ApiException):
+            await custom.patch_namespaced_custom_object_status()
+    finally:
+        kube.close()
+    assert api.calls == 3
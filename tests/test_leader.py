@@ -0,0 +1,97 @@
+import asyncio
+from types import SimpleNamespace
+
+from modal_operator.leader import LeaderElector
+from tests.test_sharding import FakeCoordinationApi
+
+
+def _elector(api, identity, elected=None, **kwargs):
+    async def on_elected():
+        elected.append(identity)
+
+    return LeaderElector(
+        SimpleNamespace(coordination=api),
+        identity,
+        "operators",
+        on_elected=on_elected if elected is not None else None,
+        **kwargs,
+    )
+
+
+async def _elect(elector):
+    await elector._tick()
+    if elector._takeover is not None:
+        await elector._takeover
+
+
+async def test_one_leader_and_a_standby():
+    api = FakeCoordinationApi()
+    elected = []
+    a, b = _elector(api, "op-0", elected), _elector(api, "op-1", elected)
+
+    await _elect(a)
+    await _elect(b)
+    await _elect(a)
+    assert (a.is_leader, b.is_leader) == (True, False)
+    assert a.owns("ns", "app") and not b.owns("ns", "app")
+    assert elected == ["op-0"]
+
+
+async def test_standby_takes_over_released_or_expired_lease():
+    api = FakeCoordinationApi()
+    elected = []
+    a, b = _elector(api, "op-0", elected), _elector(api, "op-1", elected)
+    await _elect(a)
+
+    await a.stop()
+    await _elect(b)
+    assert b.is_leader and not a.is_leader
+
+    now = [0.0]
+    a._leases.clock = lambda: now[0]
+    await _elect(a)
+    assert not a.is_leader
+    now[0] = 16.0
+    await _elect(a)
+    assert a.is_leader
+    assert api.leases["modal-operator-leader"].spec.lease_transitions == 2
+    assert elected == ["op-0", "op-1", "op-0"]
+
+    await b._tick()
+    assert not b.is_leader
+
+
+async def test_failed_takeover_is_retried_while_leader():
+    api = FakeCoordinationApi()
+    attempts = []
+
+    async def on_elected():
+        attempts.append(len(attempts))
+        if len(attempts) < 3:
+            raise RuntimeError("api down")
+
+    elector = LeaderElector(
+        SimpleNamespace(coordination=api), "op-0", "operators", retry_period=0.01, on_elected=on_elected
+    )
+    await _elect(elector)
+    assert attempts == [0, 1, 2]
+
+
+async def test_leader_steps_down_within_the_renew_deadline():
+    api = FakeCoordinationApi()
+    demoted = []
+    elector = _elector(api, "op-0", lease_duration=0.3, on_demoted=lambda: demoted.append(True))
+    assert elector.renew_deadline < elector.lease_duration
+    await elector._tick()
+
+    async def hang(name, namespace):
+        await asyncio.sleep(10)
+
+    api.read_namespaced_lease = hang
+    runner = asyncio.create_task(elector._run())
+    try:
+        await asyncio.sleep(elector.renew_deadline + elector.retry_period * 2)
+    finally:
+        runner.cancel()
+    assert not elector.is_leader
+    assert demoted == [True]
@@ -1,6 +1,19 @@
+import asyncio
+import contextlib
+
+import pytest
+
+from modal_operator import operator
 from modal_operator.config import OperatorConfig
 from modal_operator.crds import ModalAppSpec
-from modal_operator.deployer import DeployResult
+from modal_operator.deploy_output import Endpoint
+from modal_operator.deployer import DeployResult, compute_deploy_hash
+from modal_operator.envcache import EnvSourceCache
+from modal_operator.resources import service_names
+from modal_operator.resume import ResumeCoordinator
+from modal_operator.scheduler import DeployScheduler, Priority
+from modal_operator.sharding import HashRing
+from modal_operator.status import StatusWriter
 
 
 def test_operator_config_from_env(monkeypatch):
@@ -12,6 +25,10 @@ def test_operator_config_from_env(monkeypatch):
     assert config.modal_token_id == "test-id"
     assert config.modal_token_secret == "test-secret"
     assert config.watch_namespaces == ["ns1", "ns2"]
+    assert config.deploy_hash_key == "test-secret"
+
+    monkeypatch.setenv("DEPLOY_HASH_KEY", "hash-key")
+    assert OperatorConfig.from_env().deploy_hash_key == "hash-key"
 
 
 def test_operator_config_defaults(monkeypatch):
@@ -57,3 +74,295 @@ def test_deploy_result_failure():
     assert not r.success
     assert r.error == "deploy failed"
     assert r.url is None
+
+
+def test_compute_deploy_hash_is_stable():
+    a = compute_deploy_hash("app", "import modal", {"A": "1", "B": "2"})
+    b = compute_deploy_hash("app", "import modal", {"B": "2", "A": "1"})
+    assert a == b
+    assert a != compute_deploy_hash("app", "import modal", {"A": "1", "B": "3"})
+    assert a != compute_deploy_hash("other", "import modal", {"A": "1", "B": "2"})
+
+
+def test_deploy_hash_is_keyed():
+    plain = compute_deploy_hash("app", "import modal", {"HF_TOKEN": "hunter2"})
+    keyed = compute_deploy_hash("app", "import modal", {"HF_TOKEN": "hunter2"}, key="operator-secret")
+    assert keyed == compute_deploy_hash("app", "import modal", {"HF_TOKEN": "hunter2"}, key="operator-secret")
+    assert keyed != plain
+    assert keyed != compute_deploy_hash("app", "import modal", {"HF_TOKEN": "hunter2"}, key="other-secret")
+
+
+class _FakeDeployer:
+    def __init__(self):
+        self.deploys = []
+
+    async def deploy_app(self, name, source, env_vars=None):
+        self.deploys.append(name)
+        endpoints = [
+            Endpoint(function="serve", url="https://ws--app-serve.modal.run"),
+            Endpoint(function="admin", url="https://ws--app-admin.modal.run"),
+        ]
+        return DeployResult(success=True, url=endpoints[0].url, app_id="ap-1", endpoints=endpoints)
+
+
+class _FakeResources:
+    def __init__(self):
+        self.reconciled = []
+
+    async def reconcile_services(self, name, namespace, endpoints, service_port, owner_ref):
+        self.reconciled.append((name, list(endpoints), service_port))
+        return dict(service_names(name, endpoints))
+
+
+async def _no_env(kind, namespace, name):
+    return {}
+
+
+async def _live_apps():
+    return {"app": "ap-1"}
+
+
+@pytest.fixture
+def fake_operator(monkeypatch):
+    fake_deployer = _FakeDeployer()
+    patches = []
+    monkeypatch.setattr(operator, "deployer", fake_deployer)
+    monkeypatch.setattr(operator, "resource_manager", _FakeResources())
+    monkeypatch.setattr(operator, "scheduler", DeployScheduler(max_concurrent=1))
+    monkeypatch.setattr(operator, "env_cache", EnvSourceCache(_no_env))
+    monkeypatch.setattr(operator, "resume_coordinator", ResumeCoordinator(_live_apps, rate=0, jitter=0))
+    monkeypatch.setattr(operator, "operator_config", OperatorConfig())
+
+    async def _write_status(namespace, name, body):
+        patches.append(body)
+
+    monkeypatch.setattr(operator, "status_writer", StatusWriter(_write_status, window=0))
+    return fake_deployer, patches
+
+
+META = {"name": "app", "uid": "uid-1"}
+
+
+async def test_reconcile_deploys_and_records_hash(fake_operator):
+    fake_deployer, patches = fake_operator
+    spec = {"source": "import modal", "env": {"A": "1"}}
+
+    status = await operator._reconcile(spec, "app", "ns", META, {}, Priority.CREATE)
+    assert fake_deployer.deploys == ["app"]
+    assert status["deployHash"] == compute_deploy_hash("app", "import modal", {"A": "1"})
+    assert patches[-1]["deployHash"] == status["deployHash"]
+
+
+async def test_reconcile_skips_unchanged_inputs(fake_operator):
+    fake_deployer, patches = fake_operator
+    spec = {"source": "import modal", "env": {"A": "1"}}
+    current = {
+        "phase": "Running",
+        "url": "https://ws--app-serve.modal.run",
+        "deployHash": compute_deploy_hash("app", "import modal", {"A": "1"}),
+    }
+
+    await operator._reconcile(spec, "app", "ns", META, current, Priority.RESUME)
+    assert fake_deployer.deploys == []
+    assert patches == []
+
+    await operator._reconcile({**spec, "env": {"A": "2"}}, "app", "ns", META, current, Priority.UPDATE)
+    assert fake_deployer.deploys == ["app"]
+
+
+async def test_resume_redeploys_apps_missing_from_modal(fake_operator):
+    fake_deployer, _ = fake_operator
+    spec = {"source": "import modal"}
+    current = {"phase": "Running", "deployHash": compute_deploy_hash("gone", "import modal", {})}
+
+    await operator._reconcile({**spec, "appName": "gone"}, "gone", "ns", META, current, Priority.RESUME)
+    assert fake_deployer.deploys == ["gone"]
+
+
+async def test_reconcile_records_endpoint_services(fake_operator):
+    await operator._reconcile({"source": "import modal"}, "app", "ns", META, {}, Priority.CREATE)
+    _, patches = fake_operator
+    assert patches[-1]["endpoints"] == [
+        {
+            "function": "serve",
+            "url": "https://ws--app-serve.modal.run",
+            "service": "app-serve",
+            "services": ["app", "app-serve"],
+        },
+        {
+            "function": "admin",
+            "url": "https://ws--app-admin.modal.run",
+            "service": "app-admin",
+            "services": ["app-admin"],
+        },
+    ]
+
+
+async def test_deploy_lock_is_taken_after_the_scheduler_admits_the_deploy(fake_operator, monkeypatch):
+    fake_deployer, _ = fake_operator
+    events = []
+
+    class _Locks:
+        @contextlib.asynccontextmanager
+        async def hold(self, namespace, name):
+            events.append(f"lock {name}")
+            yield
+
+    deploy_app = fake_deployer.deploy_app
+
+    async def slow_deploy(name, source, env_vars=None):
+        events.append(f"deploy {name}")
+        await asyncio.sleep(0.05)
+        return await deploy_app(name, source, env_vars)
+
+    monkeypatch.setattr(operator, "deploy_locks", _Locks())
+    monkeypatch.setattr(fake_deployer, "deploy_app", slow_deploy)
+    await asyncio.gather(
+        *(operator._reconcile({"source": "import modal"}, n, "ns", META, {}, Priority.CREATE) for n in ("a", "b"))
+    )
+    assert events == ["lock a", "deploy a", "lock b", "deploy b"]
+
+
+def test_watch_namespace_patterns(monkeypatch):
+    monkeypatch.setattr(operator, "watched_namespaces", ["team-*", "!team-sandbox", "prod"])
+    assert operator._is_watched("team-a")
+    assert operator._is_watched("prod")
+    assert not operator._is_watched("team-sandbox")
+    assert not operator._is_watched("default")
+
+    monkeypatch.setattr(operator, "watched_namespaces", [])
+    assert operator._is_watched("default")
+
+
+class _FakeCustomApi:
+    def __init__(self, apps):
+        self.apps = apps
+        self.calls = []
+
+    async def list_namespaced_custom_object(self, namespace, group, version, plural):
+        self.calls.append(namespace)
+        return {"items": [app for app in self.apps if app["metadata"]["namespace"] == namespace]}
+
+    async def list_cluster_custom_object(self, group, version, plural):
+        self.calls.append("*")
+        return {"items": self.apps}
+
+
+async def test_list_modal_apps_is_scoped_to_watched_namespaces(monkeypatch):
+    apps = [{"metadata": {"namespace": ns, "name": "app"}} for ns in ("a", "b", "c")]
+    custom = _FakeCustomApi(apps)
+    monkeypatch.setattr(operator, "kube", type("Kube", (), {"custom": custom})())
+
+    monkeypatch.setattr(operator, "watched_namespaces", ["a", "b"])
+    assert [app["metadata"]["namespace"] for app in await operator._list_modal_apps()] == ["a", "b"]
+    assert custom.calls == ["a", "b"]
+
+    monkeypatch.setattr(operator, "watched_namespaces", ["!b"])
+    assert [app["metadata"]["namespace"] for app in await operator._list_modal_apps()] == ["a", "c"]
+    assert custom.calls[-1] == "*"
+
+
+async def test_take_over_prunes_finalizers_of_departed_replicas(monkeypatch):
+    patched = []
+
+    class _Custom:
+        async def patch_namespaced_custom_object(self, **kwargs):
+            patched.append(kwargs["body"])
+
+    monkeypatch.setattr(operator, "kube", type("Kube", (), {"custom": _Custom()})())
+    monkeypatch.setattr(operator, "operator_config", OperatorConfig(pod_name="op-1"))
+    app = {
+        "metadata": {
+            "namespace": "ns",
+            "name": "app",
+            "resourceVersion": "7",
+            "finalizers": ["op-0.replica.modal.internal.io/finalizer", "op-2.replica.modal.internal.io/finalizer"],
+            "annotations": {"op-2.replica.modal.internal.io/last-handled-configuration": "{}"},
+        }
+    }
+
+    await operator._take_over(app, HashRing(["op-0", "op-1"]).members)
+    assert patched == [
+        {
+            "metadata": {
+                "resourceVersion": "7",
+                "annotations": {
+                    "modal.internal.io/owner": "op-1",
+                    "op-2.replica.modal.internal.io/last-handled-configuration": None,
+                },
+                "finalizers": ["op-0.replica.modal.internal.io/finalizer", "op-1.replica.modal.internal.io/finalizer"],
+            }
+        }
+    ]
+
+
+async def test_take_over_migrates_kopf_default_finalizer_and_annotations(monkeypatch):
+    patched = []
+
+    class _Custom:
+        async def patch_namespaced_custom_object(self, **kwargs):
+            patched.append(kwargs["body"]["metadata"])
+
+    monkeypatch.setattr(operator, "kube", type("Kube", (), {"custom": _Custom()})())
+    monkeypatch.setattr(operator, "operator_config", OperatorConfig(pod_name="op-0"))
+    app = {
+        "metadata": {
+            "namespace": "ns",
+            "name": "app",
+            "resourceVersion": "3",
+            "finalizers": ["kopf.zalando.org/KopfFinalizerMarker", "example.com/other"],
+            "annotations": {
+                "kopf.zalando.org/last-handled-configuration": "{}",
+                "kopf.zalando.org/create_modal_app": "{}",
+                "team": "ml",
+            },
+        },
+        "spec": {"appName": "llm"},
+    }
+
+    await operator._take_over_all([app], frozenset({"op-0"}))
+    assert patched == [
+        {
+            "resourceVersion": "3",
+            "annotations": {
+                "modal.internal.io/owner": "op-0",
+                "kopf.zalando.org/last-handled-configuration": None,
+                "kopf.zalando.org/create_modal_app": None,
+            },
+            "finalizers": ["example.com/other", "op-0.replica.modal.internal.io/finalizer"],
+        }
+    ]
+
+
+async def test_take_over_stops_apps_already_being_deleted(monkeypatch):
+    patched, stopped = [], []
+
+    class _Custom:
+        async def patch_namespaced_custom_object(self, **kwargs):
+            patched.append(kwargs["body"]["metadata"])
+
+    async def stop(app_name, name, namespace):
+        stopped.append(app_name)
+        return len(stopped) > 1
+
+    monkeypatch.setattr(operator, "kube", type("Kube", (), {"custom": _Custom()})())
+    monkeypatch.setattr(operator, "operator_config", OperatorConfig(pod_name="op-1"))
+    monkeypatch.setattr(operator, "_stop", stop)
+    app = {
+        "metadata": {
+            "namespace": "ns",
+            "name": "app",
+            "resourceVersion": "7",
+            "deletionTimestamp": "2026-10-15T00:00:00Z",
+            "finalizers": ["op-0.replica.modal.internal.io/finalizer"],
+        },
+        "spec": {"appName": "llm"},
+    }
+
+    with pytest.raises(RuntimeError):
+        await operator._take_over_all([app], frozenset({"op-1"}))
+    assert patched == []
+
+    await operator._take_over_all([app], frozenset({"op-1"}))
+    assert stopped == ["llm", "llm"]
+    assert patched[-1]["finalizers"] == []
@@ -0,0 +1,372 @@
+import asyncio
+import time
+from types import SimpleNamespace
+
+import pytest
+from aiohttp import web
+from aiohttp.test_utils import TestClient, TestServer
+from multidict import CIMultiDict
+
+from modal_operator.deploy_output import Endpoint
+from modal_operator.metrics import proxy_upstream_connections
+from modal_operator.operator import _endpoint_status
+from modal_operator.proxy.cache import Route, RouteTable, RouteWatcher
+from modal_operator.proxy.responses import CachedResponse, ResponseCache, bypasses_cache, freshness, shareable
+from modal_operator.proxy.server import ModalProxy
+from modal_operator.resources import service_names
+
+
+def _app(name, namespace, status, resource_version="1"):
+    return {
+        "metadata": {"name": name, "namespace": namespace, "resourceVersion": resource_version},
+        "status": status,
+    }
+
+
+def _llm_status(url):
+    """``.status`` as ``_reconcile`` writes it for an app with two web endpoints."""
+    endpoints = [Endpoint("serve", url), Endpoint("admin", "https://ws--llm-admin.modal.run")]
+    return {"url": url, "endpoints": _endpoint_status(endpoints, dict(service_names("llm", endpoints)))}
+
+
+def _routes(upstream_url):
+    routes = RouteTable()
+    routes.replace([_app("llm", "ai", _llm_status(upstream_url)), _app("legacy", "ai", {"url": "http://127.0.0.1:9"})])
+    return routes
+
+
+def test_route_table_answers_every_host_form():
+    routes = _routes("https://ws--llm-serve.modal.run")
+    for host in ("llm-serve", "llm-serve.ai", "llm-serve.ai.svc:80", "LLM-serve.ai.svc.cluster.local."):
+        assert routes.lookup(host) == Route("https://ws--llm-serve.modal.run")
+    assert routes.lookup("legacy.ai:8080") == Route("http://127.0.0.1:9")
+    assert routes.lookup("llm.other") is None
+    assert routes.lookup("ws--llm-serve.modal.run") is None
+
+
+def test_route_table_routes_the_primary_service_to_the_first_endpoint():
+    routes = _routes("https://ws--llm-serve.modal.run")
+    assert routes.lookup("llm.ai") == routes.lookup("llm-serve.ai") == Route("https://ws--llm-serve.modal.run")
+    assert routes.lookup("llm-admin.ai") == Route("https://ws--llm-admin.modal.run")
+
+    written_before_services = _llm_status("https://ws--llm-serve.modal.run")
+    for endpoint in written_before_services["endpoints"]:
+        del endpoint["services"]
+    routes.apply("MODIFIED", _app("llm", "ai", written_before_services))
+    assert routes.lookup("llm.ai") == Route("https://ws--llm-serve.modal.run")
+
+
+def test_route_table_drops_ambiguous_bare_names_and_follows_events():
+    routes = _routes("https://ws--llm.modal.run")
+    routes.apply("ADDED", _app("llm", "batch", {"url": "https://ws--batch-llm.modal.run"}))
+    assert routes.lookup("llm") is None
+    assert routes.lookup("llm.batch") == Route("https://ws--batch-llm.modal.run")
+
+    routes.apply("DELETED", _app("llm", "batch", {}))
+    assert routes.lookup("llm") == Route("https://ws--llm.modal.run")
+
+    routes.replace([], namespace="ai")
+    assert routes.lookup("llm.ai") is None
+
+
+class FakeCustomApi:
+    def __init__(self):
+        self.lists = 0
+
+    async def list_cluster_custom_object(self, group, version, plural):
+        self.lists += 1
+        items = [_app("llm", "ai", {"url": f"https://ws--llm-v{self.lists}.modal.run"})]
+        return {"metadata": {"resourceVersion": str(self.lists)}, "items": items}
+
+
+async def test_watcher_applies_events_and_relists_on_expired_version():
+    api = FakeCustomApi()
+    routes = RouteTable()
+    watcher = RouteWatcher(SimpleNamespace(custom=api, api_client=None), routes, retry_delay=0)
+    streams = [
+        [{"type": "ERROR", "object": {"code": 410, "message": "too old resource version"}}],
+        [{"type": "MODIFIED", "object": _app("llm", "ai", {"url": "https://ws--llm-v3.modal.run"}, "5")}],
+    ]
+
+    def stream(namespace, version):
+        if not streams:
+            watcher.stop()
+            return iter(())
+        return iter(streams.pop(0))
+
+    watcher._stream = stream
+    await watcher.start()
+    assert routes.lookup("llm.ai") == Route("https://ws--llm-v1.modal.run")
+    for _ in range(100):
+        if routes.lookup("llm.ai") == Route("https://ws--llm-v3.modal.run"):
+            break
+        await asyncio.sleep(0.01)
+    assert api.lists == 2
+    assert routes.lookup("llm.ai") == Route("https://ws--llm-v3.modal.run")
+
+
+async def _upstream_echo(request):
+    if request.path == "/ws":
+        ws = web.WebSocketResponse(protocols=["chat"])
+        await ws.prepare(request)
+        async for message in ws:
+            if message.type == web.WSMsgType.TEXT:
+                await ws.send_str(f"{request.headers['Modal-Key']}:{message.data}")
+            else:
+                await ws.send_bytes(message.data)
+        return ws
+    body = await request.read()
+    response = web.StreamResponse(headers={"X-Seen-Key": request.headers.get("Modal-Key", "")})
+    response.headers["X-Seen-Secret"] = request.headers.get("Modal-Secret", "")
+    response.headers["X-Seen-Path"] = request.path_qs
+    response.headers["X-Seen-Host"] = request.host
+    await response.prepare(request)
+    for chunk in (b"data: one\n\n", b"data: " + body + b"\n\n"):
+        await response.write(chunk)
+    await response.write_eof()
+    return response
+
+
+@pytest.fixture
+async def proxied():
+    upstream_app = web.Application()
+    upstream_app.router.add_route("*", "/{path:.*}", _upstream_echo)
+    upstream = TestServer(upstream_app)
+    await upstream.start_server()
+
+    proxy = ModalProxy(_routes(str(upstream.make_url("/"))), "key-id", "key-secret", auth_hosts=["127.0.0.1"])
+    await proxy.start()
+    client = TestClient(TestServer(proxy.app()))
+    await client.start_server()
+    yield client
+    await client.close()
+    await proxy.close()
+    await upstream.close()
+
+
+async def test_proxy_injects_auth_and_streams_the_body(proxied):
+    async def body():
+        yield b"hello "
+        yield b"world"
+
+    response = await proxied.post(
+        "/v1/chat?stream=1",
+        data=body(),
+        headers={"Host": "llm-serve.ai.svc.cluster.local", "Modal-Key": "client-supplied"},
+    )
+    assert response.status == 200
+    assert response.headers["X-Seen-Key"] == "key-id"
+    assert response.headers["X-Seen-Secret"] == "key-secret"
+    assert response.headers["X-Seen-Path"] == "/v1/chat?stream=1"
+    assert response.headers["X-Seen-Host"].startswith("127.0.0.1")
+    assert await response.read() == b"data: one\n\ndata: hello world\n\n"
+
+
+async def test_proxy_only_sends_auth_to_allowed_hosts():
+    upstream_app = web.Application()
+    upstream_app.router.add_route("*", "/{path:.*}", _upstream_echo)
+    async with TestServer(upstream_app) as upstream:
+        proxy = ModalProxy(_routes(str(upstream.make_url("/"))), "key-id", "key-secret")
+        await proxy.start()
+        async with TestClient(TestServer(proxy.app())) as client:
+            response = await client.get("/", headers={"Host": "llm.ai", "Modal-Key": "client-supplied"})
+            assert response.status == 200
+            assert (response.headers["X-Seen-Key"], response.headers["X-Seen-Secret"]) == ("", "")
+        await proxy.close()
+    assert proxy._sends_auth("WS--llm-serve.modal.run.")
+    assert not proxy._sends_auth("modal.run.example.com")
+
+
+async def test_proxy_rejects_unknown_hosts(proxied):
+    response = await proxied.get("/", headers={"Host": "missing.ai.svc"})
+    assert response.status == 404
+
+
+async def test_proxy_reports_unreachable_upstream_as_bad_gateway(proxied):
+    response = await proxied.get("/", headers={"Host": "legacy.ai.svc"})
+    assert response.status == 502
+
+
+async def test_proxy_reuses_pooled_upstream_connections(proxied):
+    def used(result):
+        return proxy_upstream_connections.labels(result=result)._value.get()
+
+    new, reused = used("new"), used("reused")
+    for _ in range(3):
+        response = await proxied.get("/", headers={"Host": "llm.ai"})
+        assert response.status == 200
+        await response.read()
+    assert (used("new") - new, used("reused") - reused) == (1, 2)
+
+
+async def test_proxy_streams_events_before_the_upstream_finishes():
+    release = asyncio.Event()
+
+    async def events(request):
+        response = web.StreamResponse(headers={"Content-Type": "text/event-stream"})
+        await response.prepare(request)
+        await response.write(b"data: first\n\n")
+        await release.wait()
+        await response.write(b"data: last\n\n")
+        await response.write_eof()
+        return response
+
+    upstream_app = web.Application()
+    upstream_app.router.add_get("/stream", events)
+    async with TestServer(upstream_app) as upstream:
+        proxy = ModalProxy(_routes(str(upstream.make_url("/"))), "key-id", "key-secret")
+        await proxy.start()
+        async with TestClient(TestServer(proxy.app())) as client:
+            response = await client.get("/stream", headers={"Host": "llm.ai"})
+            assert response.headers["Content-Type"] == "text/event-stream"
+            assert await asyncio.wait_for(response.content.readuntil(b"\n\n"), 2) == b"data: first\n\n"
+            release.set()
+            assert await response.content.read() == b"data: last\n\n"
+        await proxy.close()
+
+
+async def test_proxy_relays_websockets(proxied):
+    async with proxied.ws_connect("/ws", headers={"Host": "llm.ai"}, protocols=["chat"]) as ws:
+        assert ws.protocol == "chat"
+        await ws.send_str("hello")
+        assert await ws.receive_str() == "key-id:hello"
+        await ws.send_bytes(b"\x00\x01")
+        assert await ws.receive_bytes() == b"\x00\x01"
+        await ws.close()
+    assert ws.close_code == 1000
+
+
+def test_freshness_honors_cache_control():
+    assert freshness(200, {"Cache-Control": "public, max-age=60"}, {}) == 60
+    assert freshness(200, {"Cache-Control": "max-age=60, s-maxage=10", "Age": "4"}, {}) == 6
+    assert freshness(200, {}, {}) == 0
+    assert freshness(500, {"Cache-Control": "max-age=60"}, {}) == 0
+    assert freshness(200, {"Cache-Control": "private, max-age=60"}, {}) == 0
+    assert freshness(200, {"Cache-Control": "max-age=60", "Set-Cookie": "a=b"}, {}) == 0
+    assert freshness(200, {"Cache-Control": "max-age=60", "Vary": "User-Agent"}, {}) == 0
+    assert freshness(200, {"Cache-Control": "max-age=60", "Vary": "Accept-Encoding"}, {}) == 60
+    assert freshness(200, {"Cache-Control": "max-age=60"}, {"Authorization": "Bearer t"}) == 0
+    assert bypasses_cache({"Cache-Control": "no-cache"})
+
+
+def test_response_cache_evicts_least_recently_used_and_expired_entries():
+    cache = ResponseCache(max_bytes=250, max_entry_bytes=200)
+
+    def entry():
+        return CachedResponse(200, "OK", CIMultiDict(), b"x" * 100)
+
+    cache.put(("a",), entry(), ttl=60)
+    cache.put(("b",), entry(), ttl=60)
+    assert cache.get(("a",)) is not None
+    cache.put(("c",), entry(), ttl=60)
+    assert [cache.get((k,)) is not None for k in "abc"] == [True, False, True]
+
+    cache.put(("big",), CachedResponse(200, "OK", CIMultiDict(), b"x" * 201), ttl=60)
+    assert cache.get(("big",)) is None
+    cache.put(("old",), entry(), ttl=0.01)
+    time.sleep(0.02)
+    assert cache.get(("old",)) is None
+
+
+async def test_proxy_coalesces_and_caches_gets_for_opted_in_apps():
+    calls = []
+
+    async def metadata(request):
+        calls.append(request.path)
+        await asyncio.sleep(0.05)
+        return web.json_response({"model": "devstral"}, headers={"Cache-Control": "max-age=60"})
+
+    upstream_app = web.Application()
+    upstream_app.router.add_get("/{path:.*}", metadata)
+    async with TestServer(upstream_app) as upstream:
+        url = str(upstream.make_url("/"))
+        routes = RouteTable()
+        routes.replace(
+            [
+                {**_app("cached", "ai", {"url": url}), "spec": {"proxyCache": True}},
+                _app("plain", "ai", {"url": url}),
+            ]
+        )
+        proxy = ModalProxy(routes, "key-id", "key-secret")
+        await proxy.start()
+        async with TestClient(TestServer(proxy.app())) as client:
+
+            async def get(host, path="/v1/models", **headers):
+                response = await client.get(path, headers={"Host": host, **headers})
+                assert response.status == 200
+                return response, await response.json()
+
+            results = await asyncio.gather(*(get("cached.ai") for _ in range(10)))
+            assert all(body == {"model": "devstral"} for _, body in results)
+            assert calls == ["/v1/models"]
+
+            response, _ = await get("cached.ai")
+            assert "Age" in response.headers
+            assert len(calls) == 1
+
+            await get("cached.ai", **{"Cache-Control": "no-cache"})
+            await get("cached.ai", path="/v1/other")
+            await asyncio.gather(*(get("plain.ai") for _ in range(3)))
+            assert len(calls) == 6
+        await proxy.close()
+
+
+async def test_proxy_lets_coalesced_requests_stream_without_waiting_for_the_leader():
+    calls, release = [], asyncio.Event()
+
+    async def events(request):
+        calls.append(request.path)
+        response = web.StreamResponse(headers={"Content-Type": "text/event-stream"})
+        await response.prepare(request)
+        await response.write(b"data: first\n\n")
+        await release.wait()
+        await response.write_eof()
+        return response
+
+    upstream_app = web.Application()
+    upstream_app.router.add_get("/stream", events)
+    async with TestServer(upstream_app) as upstream:
+        routes = RouteTable()
+        routes.replace([{**_app("cached", "ai", {"url": str(upstream.make_url("/"))}), "spec": {"proxyCache": True}}])
+        proxy = ModalProxy(routes, "key-id", "key-secret")
+        await proxy.start()
+        async with TestClient(TestServer(proxy.app())) as client:
+            leader = await client.get("/stream", headers={"Host": "cached.ai"})
+            assert await asyncio.wait_for(leader.content.readuntil(b"\n\n"), 2) == b"data: first\n\n"
+            follower = await asyncio.wait_for(client.get("/stream", headers={"Host": "cached.ai"}), 2)
+            assert await asyncio.wait_for(follower.content.readuntil(b"\n\n"), 2) == b"data: first\n\n"
+            assert calls == ["/stream", "/stream"]
+            release.set()
+            assert await leader.content.read() == await follower.content.read() == b""
+        await proxy.close()
+
+
+async def test_proxy_does_not_share_private_responses():
+    calls = []
+
+    async def profile(request):
+        calls.append(request.path)
+        user = len(calls)
+        await asyncio.sleep(0.05)
+        return web.json_response({"user": user}, headers={"Cache-Control": "private, max-age=60"})
+
+    upstream_app = web.Application()
+    upstream_app.router.add_get("/{path:.*}", profile)
+    async with TestServer(upstream_app) as upstream:
+        routes = RouteTable()
+        routes.replace([{**_app("cached", "ai", {"url": str(upstream.make_url("/"))}), "spec": {"proxyCache": True}}])
+        proxy = ModalProxy(routes, "key-id", "key-secret")
+        await proxy.start()
+        async with TestClient(TestServer(proxy.app())) as client:
+
+            async def get():
+                response = await client.get("/v1/me", headers={"Host": "cached.ai"})
+                assert response.status == 200
+                return (await response.json())["user"]
+
+            assert sorted(await asyncio.gather(*(get() for _ in range(3)))) == [1, 2, 3]
+            assert len(calls) == 3
+        await proxy.close()
+    assert shareable({"Cache-Control": "max-age=0"})
+    assert not shareable({"Cache-Control": "no-store"})
+    assert not shareable({"Vary": "User-Agent"})
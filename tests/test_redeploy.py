@@ -0,0 +1,80 @@
+import asyncio
+
+from modal_operator.crds import EnvFromSource
+from modal_operator.deployer import compute_deploy_hash
+from modal_operator.envcache import SECRET, EnvSourceCache
+from modal_operator.redeploy import EnvRedeployer, TrackedApp
+
+ENV_FROM = [EnvFromSource(secretRef={"name": "hf"})]
+
+
+async def _fetch(kind, namespace, name):
+    return {"HF_TOKEN": "t1"}
+
+
+async def _redeployer(apps, window=0.05):
+    cache = EnvSourceCache(_fetch)
+    cache.observe(SECRET, "ns", "hf", {"HF_TOKEN": "t1"})
+    triggered = []
+
+    async def trigger(app, deploy_hash):
+        triggered.append((app, deploy_hash))
+
+    redeployer = EnvRedeployer(cache, trigger, window=window)
+    for name in apps:
+        cache.track(("ns", name), "ns", ENV_FROM)
+        env = {"A": "1", **await cache.resolve("ns", ENV_FROM)}
+        redeployer.track(
+            ("ns", name),
+            TrackedApp(name, "src", {"A": "1"}, ENV_FROM, compute_deploy_hash(name, "src", env)),
+        )
+    return redeployer, cache, triggered
+
+
+async def test_burst_of_changes_triggers_one_redeploy_per_app():
+    redeployer, cache, triggered = await _redeployer(["a", "b"])
+
+    for token in ("t2", "t3", "t4"):
+        assert cache.observe(SECRET, "ns", "hf", {"HF_TOKEN": token})
+        redeployer.changed(SECRET, "ns", "hf")
+        await asyncio.sleep(0.01)
+    await asyncio.sleep(0.1)
+
+    assert sorted(app for app, _ in triggered) == [("ns", "a"), ("ns", "b")]
+    expected = compute_deploy_hash("a", "src", {"A": "1", "HF_TOKEN": "t4"})
+    assert dict(triggered)[("ns", "a")] == expected
+
+
+async def test_no_redeploy_when_resolved_env_is_unchanged():
+    redeployer, cache, triggered = await _redeployer(["a"])
+
+    cache.observe(SECRET, "ns", "hf", {"HF_TOKEN": "t2"})
+    redeployer.changed(SECRET, "ns", "hf")
+    cache.observe(SECRET, "ns", "hf", {"HF_TOKEN": "t1"})
+    redeployer.changed(SECRET, "ns", "hf")
+    await asyncio.sleep(0.1)
+
+    assert triggered == []
+
+
+async def test_untrack_cancels_pending_redeploy():
+    redeployer, cache, triggered = await _redeployer(["a"])
+
+    cache.observe(SECRET, "ns", "hf", {"HF_TOKEN": "t2"})
+    redeployer.changed(SECRET, "ns", "hf")
+    redeployer.untrack(("ns", "a"))
+    await asyncio.sleep(0.1)
+
+    assert triggered == []
+
+
+async def test_clear_stops_redeploying_every_app():
+    redeployer, cache, triggered = await _redeployer(["a", "b"])
+
+    cache.observe(SECRET, "ns", "hf", {"HF_TOKEN": "t2"})
+    redeployer.changed(SECRET, "ns", "hf")
+    redeployer.clear()
+    redeployer.changed(SECRET, "ns", "hf")
+    await asyncio.sleep(0.1)
+
+    assert triggered == []
@@ -0,0 +1,235 @@
+import json
+from types import SimpleNamespace
+
+from kubernetes import client
+from kubernetes.client.exceptions import ApiException
+
+from modal_operator.deploy_output import Endpoint
+from modal_operator.resources import (
+    APP_LABEL,
+    APPLY_PATCH,
+    FIELD_MANAGER,
+    ResourceManager,
+    ServiceCache,
+    ServiceWatcher,
+    service_names,
+)
+
+OWNER = client.V1OwnerReference(api_version="modal.internal.io/v1alpha1", kind="ModalApp", name="app", uid="uid-1")
+
+
+class FakeCoreApi:
+    def __init__(self):
+        self.services = {}
+        self.calls = []
+
+    async def list_namespaced_service(self, namespace, label_selector):
+        self.calls.append("list")
+        key, value = label_selector.split("=")
+        items = [s for s in self.services.values() if (s.metadata.labels or {}).get(key) == value]
+        return SimpleNamespace(items=items)
+
+    async def read_namespaced_service(self, name, namespace):
+        self.calls.append("read")
+        if name not in self.services:
+            raise ApiException(status=404)
+        return self.services[name]
+
+    async def patch_namespaced_service(self, name, namespace, body, field_manager, force, _content_type):
+        assert (field_manager, force, _content_type) == (FIELD_MANAGER, True, APPLY_PATCH)
+        self.calls.append("apply")
+        metadata, spec = body["metadata"], body["spec"]
+        self.services[name] = client.V1Service(
+            metadata=client.V1ObjectMeta(name=name, labels=metadata["labels"], annotations=metadata["annotations"]),
+            spec=client.V1ServiceSpec(
+                type=spec["type"],
+                external_name=spec["externalName"],
+                ports=[client.V1ServicePort(port=p["port"]) for p in spec["ports"]],
+            ),
+        )
+        return self.services[name]
+
+    async def delete_namespaced_service(self, name, namespace):
+        self.calls.append("delete")
+        if self.services.pop(name, None) is None:
+            raise ApiException(status=404)
+
+
+def _manager():
+    manager = ResourceManager.__new__(ResourceManager)
+    manager.core_api = FakeCoreApi()
+    manager.cache = None
+    manager.proxy_host = ""
+    return manager
+
+
+ENDPOINTS = [
+    Endpoint(function="serve", url="https://ws--app-serve.modal.run"),
+    Endpoint(function="Model.generate", url="https://ws--app-model-generate.modal.run"),
+]
+
+
+def test_service_names():
+    assert service_names("app", ENDPOINTS[:1]) == [("app", ENDPOINTS[0])]
+    assert [n for n, _ in service_names("app", ENDPOINTS)] == ["app", "app-serve", "app-model-generate"]
+    assert service_names("app", []) == []
+
+
+def test_service_names_never_merge_endpoints():
+    colliding = [
+        Endpoint(function="Model.generate", url="https://a.modal.run"),
+        Endpoint(function="model_generate", url="https://b.modal.run"),
+        Endpoint(function="f" * 70 + "a", url="https://c.modal.run"),
+        Endpoint(function="f" * 70 + "b", url="https://d.modal.run"),
+    ]
+    names = service_names("app", colliding)
+    assert len({n for n, _ in names}) == len(names) == 5
+    assert all(len(n) <= 63 for n, _ in names)
+    assert names[1][0] == "app-model-generate"
+    assert names[2][0].startswith("app-model-generate-")
+
+
+async def test_reconcile_refuses_services_of_other_apps():
+    manager = _manager()
+    await manager.reconcile_services("app-serve", "ns", ENDPOINTS[:1], 80, OWNER)
+    manager.core_api.calls.clear()
+
+    services = await manager.reconcile_services("app", "ns", ENDPOINTS, 80, OWNER)
+    assert set(services) == {"app", "app-model-generate"}
+    assert manager.core_api.services["app-serve"].metadata.labels["modal.internal.io/app"] == "app-serve"
+
+    assert await manager.delete_services("app", "ns")
+    assert set(manager.core_api.services) == {"app-serve"}
+
+
+async def test_reconcile_creates_one_service_per_endpoint():
+    manager = _manager()
+    await manager.reconcile_services("app", "ns", ENDPOINTS, 80, OWNER)
+    assert manager.core_api.calls == ["list"] + ["read", "apply"] * 3
+
+    services = manager.core_api.services
+    assert set(services) == {"app", "app-serve", "app-model-generate"}
+    assert services["app-model-generate"].spec.external_name == "ws--app-model-generate.modal.run"
+    assert services["app-model-generate"].metadata.labels["modal.internal.io/function"] == "Model.generate"
+
+
+async def test_reconcile_is_idempotent_and_prunes():
+    manager = _manager()
+    await manager.reconcile_services("app", "ns", ENDPOINTS, 80, OWNER)
+    manager.core_api.calls.clear()
+
+    await manager.reconcile_services("app", "ns", ENDPOINTS, 80, OWNER)
+    assert manager.core_api.calls == ["list"]
+
+    manager.core_api.calls.clear()
+    await manager.reconcile_services("app", "ns", ENDPOINTS[:1], 8080, OWNER)
+    assert sorted(manager.core_api.calls) == ["apply", "delete", "delete", "list"]
+    assert set(manager.core_api.services) == {"app"}
+    assert manager.core_api.services["app"].spec.ports[0].port == 8080
+
+    await manager.reconcile_services("app", "ns", [], 8080, OWNER)
+    assert manager.core_api.services == {}
+
+
+async def test_services_point_at_the_proxy_when_configured():
+    manager = _manager()
+    await manager.reconcile_services("app", "ns", ENDPOINTS, 80, OWNER)
+    manager.core_api.calls.clear()
+
+    manager.proxy_host = "modal-proxy.modal-system.svc.cluster.local"
+    await manager.reconcile_services("app", "ns", ENDPOINTS, 80, OWNER)
+    assert manager.core_api.calls == ["list", "apply", "apply", "apply"]
+    service = manager.core_api.services["app-serve"]
+    assert service.spec.external_name == "modal-proxy.modal-system.svc.cluster.local"
+    assert service.metadata.annotations["modal.internal.io/url"] == "https://ws--app-serve.modal.run"
+
+
+async def test_delete_services():
+    manager = _manager()
+    await manager.reconcile_services("app", "ns", ENDPOINTS, 80, OWNER)
+
+    assert await manager.delete_services("app", "ns")
+    assert manager.core_api.services == {}
+
+
+def test_service_manifest_is_a_complete_apply_body():
+    body = _manager()._external_service("app", "ns", "app", ENDPOINTS[0], 80, OWNER)
+    assert (body["apiVersion"], body["kind"]) == ("v1", "Service")
+    assert body["metadata"]["ownerReferences"] == [
+        {"apiVersion": "modal.internal.io/v1alpha1", "kind": "ModalApp", "name": "app", "uid": "uid-1"}
+    ]
+
+
+def _watch_body(service):
+    return {
+        "metadata": {"labels": service.metadata.labels, "annotations": service.metadata.annotations},
+        "spec": {
+            "type": service.spec.type,
+            "externalName": service.spec.external_name,
+            "ports": [{"port": port.port} for port in service.spec.ports],
+        },
+    }
+
+
+async def test_cached_reconcile_only_writes_on_drift():
+    manager = _manager()
+    manager.cache = ServiceCache()
+    await manager.reconcile_services("app", "ns", ENDPOINTS, 80, OWNER)
+    services = manager.core_api.services
+    for svc_name, service in services.items():
+        manager.cache.observe("ns", svc_name, _watch_body(service))
+    manager.core_api.calls.clear()
+
+    await manager.reconcile_services("app", "ns", ENDPOINTS, 80, OWNER)
+    assert manager.core_api.calls == []
+
+    labelled = _watch_body(services["app"])
+    labelled["metadata"]["labels"] = {**labelled["metadata"]["labels"], "team": "ml"}
+    manager.cache.observe("ns", "app", labelled)
+    await manager.reconcile_services("app", "ns", ENDPOINTS, 80, OWNER)
+    assert manager.core_api.calls == []
+
+    edited = _watch_body(services["app-serve"])
+    edited["spec"]["externalName"] = "example.com"
+    manager.cache.observe("ns", "app-serve", edited)
+    manager.cache.observe("ns", "app", None)
+    await manager.reconcile_services("app", "ns", ENDPOINTS, 80, OWNER)
+    assert manager.core_api.calls == ["read", "apply", "apply"]
+    assert set(manager.cache.services("ns", "app")) == {"app", "app-serve", "app-model-generate"}
+
+
+def test_service_cache_follows_label_changes():
+    cache = ServiceCache()
+    cache.observe("ns", "svc", {"metadata": {"labels": {"modal.internal.io/app": "a"}}, "spec": {}})
+    cache.observe("ns", "svc", {"metadata": {"labels": {"modal.internal.io/app": "b"}}, "spec": {}})
+    assert cache.services("ns", "a") == {}
+    assert set(cache.services("ns", "b")) == {"svc"}
+
+    cache.observe("ns", "svc", {"metadata": {"labels": {}}, "spec": {}})
+    assert cache.services("ns", "b") == {}
+
+
+async def test_service_watcher_primes_the_cache_from_a_labelled_listing():
+    cache = ServiceCache()
+    cache.observe("ns", "gone", {"metadata": {"labels": {APP_LABEL: "old"}}, "spec": {}})
+    calls = []
+
+    async def call(method, *args, **kwargs):
+        calls.append((method.__name__, args, kwargs["label_selector"]))
+        item = _watch_body(
+            client.V1Service(
+                metadata=client.V1ObjectMeta(labels={APP_LABEL: "app"}, annotations={}),
+                spec=client.V1ServiceSpec(type="ExternalName", external_name="x.modal.run", ports=[]),
+            )
+        )
+        item["metadata"].update(namespace="ns", name="app")
+        return SimpleNamespace(data=json.dumps({"metadata": {"resourceVersion": "7"}, "items": [item]}).encode())
+
+    watcher = ServiceWatcher(SimpleNamespace(call=call, api_client=None), cache, ["ns"])
+    assert await watcher._list("ns") == "7"
+    assert calls == [("list_namespaced_service", ("ns",), APP_LABEL)]
+    assert set(cache.services("ns", "app")) == {"app"}
+    assert cache.services("ns", "old") == {}
+
+    watcher._observe("DELETED", {"metadata": {"namespace": "ns", "name": "app"}})
+    assert cache.known(None) == set()
@@ -0,0 +1,53 @@
+import asyncio
+import time
+
+import pytest
+
+from modal_operator.inventory import DeploymentInventory
+from modal_operator.metrics import startup_reconcile_seconds
+from modal_operator.resume import ResumeCoordinator
+
+
+async def test_live_apps_listed_once():
+    calls = 0
+
+    async def list_live_apps():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.01)
+        return {"a": "ap-1"}
+
+    coordinator = ResumeCoordinator(DeploymentInventory(list_live_apps).snapshot)
+    results = await asyncio.gather(*(coordinator.live_apps() for _ in range(20)))
+    assert calls == 1
+    assert all(r == {"a": "ap-1"} for r in results)
+
+
+async def test_live_apps_failure_returns_none():
+    async def list_live_apps():
+        raise RuntimeError("unauthenticated")
+
+    coordinator = ResumeCoordinator(list_live_apps)
+    assert await coordinator.live_apps() is None
+
+
+async def test_admit_is_rate_limited():
+    coordinator = ResumeCoordinator(dict, rate=50, jitter=0)
+    start = time.monotonic()
+    await asyncio.gather(*(coordinator.admit() for _ in range(6)))
+    assert time.monotonic() - start >= 0.09
+
+
+def test_startup_reconcile_tracking():
+    coordinator = ResumeCoordinator(dict)
+    coordinator.expect([("ns", "a"), ("ns", "b")])
+    coordinator.done("ns", "a")
+    assert coordinator._tracking
+    coordinator.done("ns", "b")
+    assert not coordinator._tracking
+    assert startup_reconcile_seconds._value.get() > 0
+
+
+def test_unknown_mode_rejected():
+    with pytest.raises(ValueError):
+        ResumeCoordinator(dict, mode="yolo")
@@ -0,0 +1,103 @@
+import asyncio
+
+import pytest
+
+from modal_operator.config import OperatorConfig
+from modal_operator.scheduler import DeployScheduler, Priority
+
+
+async def _fill(scheduler, order, jobs):
+    """Occupy every slot, queue ``jobs``, then release and record dispatch order."""
+    gate = asyncio.Event()
+
+    async def blocker():
+        await gate.wait()
+
+    blockers = [
+        asyncio.create_task(scheduler.run("busy", Priority.CREATE, blocker)) for _ in range(scheduler.max_concurrent)
+    ]
+    await asyncio.sleep(0)
+
+    async def job(label):
+        order.append(label)
+
+    tasks = []
+    for namespace, priority, label in jobs:
+        tasks.append(asyncio.create_task(scheduler.run(namespace, priority, lambda label=label: job(label))))
+        await asyncio.sleep(0)
+
+    gate.set()
+    await asyncio.gather(*blockers, *tasks)
+
+
+async def test_concurrency_cap():
+    scheduler = DeployScheduler(max_concurrent=2)
+    peak = 0
+
+    async def job():
+        nonlocal peak
+        peak = max(peak, scheduler.running)
+        await asyncio.sleep(0.01)
+
+    await asyncio.gather(*(scheduler.run("ns", Priority.CREATE, job) for _ in range(10)))
+    assert peak == 2
+    assert scheduler.running == 0
+
+
+async def test_priority_order():
+    scheduler = DeployScheduler(max_concurrent=1)
+    order = []
+    await _fill(
+        scheduler,
+        order,
+        [
+            ("ns", Priority.RESUME, "resume"),
+            ("ns", Priority.UPDATE, "update"),
+            ("ns", Priority.CREATE, "create"),
+        ],
+    )
+    assert order == ["create", "update", "resume"]
+
+
+async def test_namespace_fairness():
+    scheduler = DeployScheduler(max_concurrent=1)
+    order = []
+    jobs = [("noisy", Priority.RESUME, f"noisy-{i}") for i in range(4)]
+    jobs += [("quiet", Priority.RESUME, "quiet-0"), ("quiet", Priority.RESUME, "quiet-1")]
+    await _fill(scheduler, order, jobs)
+    assert order.index("quiet-0") <= 2
+    assert order.index("quiet-1") <= 4
+
+
+async def test_namespace_weights():
+    scheduler = DeployScheduler(max_concurrent=1, namespace_weights={"heavy": 3})
+    order = []
+    jobs = [("light", Priority.RESUME, f"light-{i}") for i in range(4)]
+    jobs += [("heavy", Priority.RESUME, f"heavy-{i}") for i in range(4)]
+    await _fill(scheduler, order, jobs)
+    assert [label.split("-")[0] for label in order[:4]].count("heavy") >= 3
+
+
+async def test_cancelled_waiter_releases_nothing():
+    scheduler = DeployScheduler(max_concurrent=1)
+    gate = asyncio.Event()
+    holder = asyncio.create_task(scheduler.run("ns", Priority.CREATE, gate.wait))
+    await asyncio.sleep(0)
+    waiter = asyncio.create_task(scheduler.run("ns", Priority.CREATE, gate.wait))
+    await asyncio.sleep(0)
+    waiter.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await waiter
+    gate.set()
+    await holder
+    assert scheduler.running == 0
+    assert scheduler.queued == 0
+
+
+def test_namespace_weights_from_env(monkeypatch):
+    monkeypatch.setenv("MAX_CONCURRENT_DEPLOYS", "4")
+    monkeypatch.setenv("DEPLOY_NAMESPACE_WEIGHTS", "ai=2, batch=0.5")
+
+    config = OperatorConfig.from_env()
+    assert config.max_concurrent_deploys == 4
+    assert config.namespace_weights == {"ai": 2.0, "batch": 0.5}
@@ -0,0 +1,177 @@
+import asyncio
+import copy
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+
+import pytest
+from kubernetes.client.exceptions import ApiException
+
+from modal_operator.sharding import DeployLockHeld, DeployLocks, HashRing, ShardCoordinator
+
+
+class FakeCoordinationApi:
+    def __init__(self):
+        self.leases = {}
+        self._version = 0
+
+    def _store(self, name, body):
+        self._version += 1
+        body = copy.deepcopy(body)
+        body.metadata.name = name
+        body.metadata.resource_version = str(self._version)
+        self.leases[name] = body
+        return copy.deepcopy(body)
+
+    async def read_namespaced_lease(self, name, namespace):
+        if name not in self.leases:
+            raise ApiException(status=404)
+        return copy.deepcopy(self.leases[name])
+
+    async def create_namespaced_lease(self, namespace, body):
+        if body.metadata.name in self.leases:
+            raise ApiException(status=409)
+        return self._store(body.metadata.name, body)
+
+    async def replace_namespaced_lease(self, name, namespace, body):
+        if name not in self.leases:
+            raise ApiException(status=404)
+        version = body.metadata.resource_version
+        if version is not None and version != self.leases[name].metadata.resource_version:
+            raise ApiException(status=409)
+        return self._store(name, body)
+
+    async def delete_namespaced_lease(self, name, namespace, body=None):
+        if self.leases.pop(name, None) is None:
+            raise ApiException(status=404)
+
+    async def list_namespaced_lease(self, namespace, label_selector):
+        key, value = label_selector.split("=")
+        items = [lease for lease in self.leases.values() if (lease.metadata.labels or {}).get(key) == value]
+        return SimpleNamespace(items=copy.deepcopy(items))
+
+
+def _coordinator(api, identity, **kwargs):
+    return ShardCoordinator(SimpleNamespace(coordination=api), identity, "operators", **kwargs)
+
+
+def test_hash_ring_moves_few_keys_when_a_member_joins():
+    keys = [("ns", f"app-{i}") for i in range(1000)]
+    before = HashRing(["a", "b", "c"])
+    after = HashRing(["a", "b", "c", "d"])
+
+    moved = [key for key in keys if before.owner(key) != after.owner(key)]
+    assert all(after.owner(key) == "d" for key in moved)
+    assert 150 < len(moved) < 350
+    assert HashRing([]).owner(keys[0]) is None
+
+
+async def test_members_share_the_ring_and_rebalance():
+    api = FakeCoordinationApi()
+    rebalances = []
+
+    async def on_rebalance(previous, ring):
+        rebalances.append(sorted(ring.members))
+
+    a = _coordinator(api, "op-0", on_rebalance=on_rebalance)
+    b = _coordinator(api, "op-1")
+    await a._heartbeat()
+    await b._heartbeat()
+    await a._heartbeat()
+    await a._handover
+    assert a.ring.members == b.ring.members == {"op-0", "op-1"}
+    assert rebalances == [["op-0", "op-1"]]
+
+    keys = [("ns", f"app-{i}") for i in range(50)]
+    assert all(a.owns(*key) != b.owns(*key) for key in keys)
+
+    await b.stop()
+    await a._heartbeat()
+    await a._handover
+    assert rebalances[-1] == ["op-0"]
+    assert all(a.owns(*key) for key in keys)
+
+
+async def test_failed_rebalance_is_retried_for_the_latest_ring():
+    api = FakeCoordinationApi()
+    calls = []
+
+    async def on_rebalance(previous, ring):
+        calls.append((sorted(previous.members), sorted(ring.members)))
+        if len(calls) == 1:
+            await _coordinator(api, "op-2")._heartbeat()
+            raise RuntimeError("api down")
+
+    a = _coordinator(api, "op-0", lease_duration=0.3, on_rebalance=on_rebalance)
+    await _coordinator(api, "op-1")._heartbeat()
+    await a._heartbeat()
+    while not calls:
+        await asyncio.sleep(0)
+    await a._heartbeat()
+    await a._handover
+    assert calls == [
+        ([], ["op-0", "op-1"]),
+        ([], ["op-0", "op-1", "op-2"]),
+    ]
+
+
+async def test_a_lone_replica_takes_over_its_share_on_startup():
+    rebalances = []
+
+    async def on_rebalance(previous, ring):
+        rebalances.append((sorted(previous.members), sorted(ring.members)))
+
+    a = _coordinator(FakeCoordinationApi(), "op-0", on_rebalance=on_rebalance)
+    await a._heartbeat()
+    await a._handover
+    await a._heartbeat()
+    assert rebalances == [([], ["op-0"])]
+
+
+def _locks(api, identity, **kwargs):
+    return DeployLocks(SimpleNamespace(coordination=api), identity, "operators", **kwargs)
+
+
+async def test_deploy_lock_blocks_other_replicas_until_released():
+    api = FakeCoordinationApi()
+    a, b = _locks(api, "op-0"), _locks(api, "op-1")
+
+    async with a.hold("ns", "app"):
+        with pytest.raises(DeployLockHeld) as held:
+            async with b.hold("ns", "app"):
+                pass
+        assert held.value.holder == "op-0"
+
+    async with b.hold("ns", "app"):
+        pass
+    assert api.leases == {}
+
+
+async def test_expired_deploy_lock_is_taken_over():
+    api = FakeCoordinationApi()
+    a, b = _locks(api, "op-0", lock_duration=60), _locks(api, "op-1")
+    lock = a._lock_name("ns", "app")
+    await a._acquire(lock)
+    now = [0.0]
+    b._leases.clock = lambda: now[0]
+
+    with pytest.raises(DeployLockHeld):
+        await b._acquire(lock)
+    now[0] = 61.0
+    await b._acquire(lock)
+    assert api.leases[lock].spec.holder_identity == "op-1"
+
+
+async def test_lease_expiry_ignores_the_holders_clock():
+    api = FakeCoordinationApi()
+    now = [0.0]
+    a, b = _coordinator(api, "op-0"), _coordinator(api, "op-1")
+    b._leases.clock = lambda: now[0]
+    await a._renew_member_lease()
+    # op-0's clock runs two minutes behind, yet its lease was just renewed.
+    api.leases[a._member_lease].spec.renew_time = datetime.now(timezone.utc) - timedelta(minutes=2)
+    assert await b._live_members() == {"op-0"}
+
+    now[0] = 10.0
+    assert await b._live_members() == {"op-0"}
+    now[0] = 16.0
+    assert await b._live_members() == set()
@@ -0,0 +1,52 @@
+import asyncio
+
+import pytest
+
+from modal_operator.status import StatusWriter
+
+KEY = ("ns", "app")
+
+
+def _writer(window=0.01, fail=False):
+    writes = []
+
+    async def write(namespace, name, body):
+        if fail:
+            raise RuntimeError("conflict")
+        writes.append((namespace, name, body))
+
+    return StatusWriter(write, window=window), writes
+
+
+async def test_drops_fields_and_patches_that_match_known_status():
+    writer, writes = _writer()
+    writer.observe(KEY, {"phase": "Running", "url": "https://a"})
+
+    assert not await writer.update(KEY, {"phase": "Running"})
+    assert await writer.update(KEY, {"phase": "Running", "url": "https://b"})
+    assert not await writer.update(KEY, {"url": "https://b"})
+    assert writes == [("ns", "app", {"url": "https://b"})]
+
+
+async def test_merges_updates_within_window_into_one_write():
+    writer, writes = _writer()
+
+    results = await asyncio.gather(
+        writer.update(KEY, {"phase": "Deploying", "message": "a"}),
+        writer.update(KEY, {"phase": "Running"}),
+        writer.update(("ns", "other"), {"phase": "Running"}),
+    )
+
+    assert results == [True, True, True]
+    assert writes == [
+        ("ns", "app", {"phase": "Running", "message": "a"}),
+        ("ns", "other", {"phase": "Running"}),
+    ]
+
+
+async def test_failed_write_is_raised_and_not_remembered():
+    writer, _ = _writer(fail=True)
+
+    with pytest.raises(RuntimeError):
+        await writer.update(KEY, {"phase": "Failed"})
+    assert writer._diff(KEY, {"phase": "Failed"}) == {"phase": "Failed"}
@@ -0,0 +1,85 @@
+import asyncio
+import os
+import time
+
+import pytest
+
+from modal_operator.workers import WorkerCrashed, WorkerError, WorkerPool, _Worker
+
+
+@pytest.fixture
+def pool():
+    pool = WorkerPool(size=2, max_jobs=3)
+    yield pool
+    pool.close()
+
+
+async def test_runs_jobs_out_of_process(pool):
+    pid = await pool.run(os.getpid)
+    assert pid != os.getpid()
+
+
+async def test_job_errors_keep_worker(pool):
+    with pytest.raises(WorkerError, match="ValueError"):
+        await pool.run(int, "not a number")
+    pids = {await pool.run(os.getpid) for _ in range(2)}
+    assert len(pids) <= 2
+
+
+async def test_crash_is_isolated(pool):
+    with pytest.raises(WorkerCrashed):
+        await pool.run(os._exit, 3)
+    assert await pool.run(sum, [1, 2, 3]) == 6
+
+
+async def test_timeout_replaces_worker(pool):
+    start = time.monotonic()
+    with pytest.raises(asyncio.TimeoutError):
+        await pool.run(time.sleep, 10, timeout=0.5)
+    assert time.monotonic() - start < 5
+    assert len(pool._workers) == 2
+    assert all(w.process.is_alive() for w in pool._workers)
+
+
+async def test_recycles_after_max_jobs():
+    pool = WorkerPool(size=1, max_jobs=2)
+    try:
+        pids = [await pool.run(os.getpid) for _ in range(4)]
+    finally:
+        pool.close()
+    assert pids[0] == pids[1]
+    assert pids[2] == pids[3]
+    assert pids[1] != pids[2]
+
+
+async def test_recycles_on_memory_growth():
+    pool = WorkerPool(size=1, max_rss_bytes=1)
+    try:
+        first = await pool.run(os.getpid)
+        second = await pool.run(os.getpid)
+    finally:
+        pool.close()
+    assert first != second
+
+
+async def test_recycling_keeps_the_event_loop_free(monkeypatch):
+    def slow_stop(worker, timeout=5.0):
+        time.sleep(0.5)
+        worker.kill()
+
+    monkeypatch.setattr(_Worker, "stop", slow_stop)
+    pool = WorkerPool(size=1, max_jobs=1)
+    ticks = []
+
+    async def tick():
+        while True:
+            ticks.append(time.monotonic())
+            await asyncio.sleep(0.01)
+
+    ticker = asyncio.create_task(tick())
+    try:
+        await pool.run(os.getpid)
+    finally:
+        ticker.cancel()
+        pool.close()
+    assert max(b - a for a, b in zip(ticks, ticks[1:])) < 0.25